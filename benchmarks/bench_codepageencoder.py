@@ -0,0 +1,57 @@
+"""
+Compare escpos's MagicEncode with the precomputed PlannedMagicEncode on the sample zines.
+
+Usage: python benchmarks/bench_codepageencoder.py [DIR...]
+"""
+import glob
+import os
+import sys
+import timeit
+
+from escpos.printer import Dummy
+from escpos.constants import CODEPAGE_CHANGE
+from zinemachine.codepageencoder import PlannedMagicEncode
+from zinemachine.profile import LMP201
+
+
+def loadTexts(directories):
+    texts = []
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, '**', '*.zine'), recursive=True)):
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+    return texts
+
+
+def encodeAll(texts, planned):
+    printer = Dummy(profile=LMP201())
+    if planned:
+        printer.magic = PlannedMagicEncode(printer)
+    for text in texts:
+        # zines are printed one wrapped line at a time
+        for line in text.splitlines(keepends=True):
+            printer.text(line)
+    return printer.output
+
+
+def main():
+    directories = sys.argv[1:] or ['zines', 'test-zines']
+    corpora = {
+        'sample zines': loadTexts(directories),
+        'non-ascii': ['Ça démarre: “¿Qué pasó?” — naïve façade, Œuvre № 5 £10 • 30° ½ ▓░ Ωmega αβ\n' * 2000],
+    }
+
+    for name, texts in corpora.items():
+        characters = sum(len(t) for t in texts)
+        escposOutput = encodeAll(texts, planned=False)
+        plannedOutput = encodeAll(texts, planned=True)
+        escposTime = min(timeit.repeat(lambda: encodeAll(texts, planned=False), number=1, repeat=3))
+        plannedTime = min(timeit.repeat(lambda: encodeAll(texts, planned=True), number=1, repeat=3))
+
+        print(f"{name}: {len(texts)} files, {characters} characters")
+        print(f"   escpos:  {escposTime*1000:8.1f}ms {len(escposOutput)} bytes, {escposOutput.count(CODEPAGE_CHANGE)} codepage switches")
+        print(f"   planned: {plannedTime*1000:8.1f}ms {len(plannedOutput)} bytes, {plannedOutput.count(CODEPAGE_CHANGE)} codepage switches ({escposTime/plannedTime:.1f}x faster, identical output: {escposOutput == plannedOutput})")
+
+
+if __name__ == '__main__':
+    main()
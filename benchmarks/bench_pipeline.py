@@ -0,0 +1,243 @@
+"""
+Benchmark suite for the zine pipeline, from loading a library to the ESC/POS bytes: Zine.loadMetadata, ZineMachine.initIndex, Parser.feed, Zine.initMarkup (parse and wrap), Zine.printMarkup into a JobRecorder,
+header and footer rendering, image conversion (printImage) and ZineValidator.validateDirectory.
+
+Usage: python benchmarks/bench_pipeline.py [DIR...] [--synthetic N] [--case NAME] [--repeat N] [--save PATH] [--compare PATH] [--threshold FRACTION]
+
+Every case is run on every directory (default: zines and test-zines, or any other library, e.g. one made by generate-corpus), and the best of --repeat runs is reported.
+--synthetic generates a library of N zines with the default corpus settings, so libraries of 10k-100k zines can be benchmarked without keeping them around. It is named synthetic-N in the results.
+--save writes the results to a JSON baseline. --compare reads a baseline and reports the change of every case, and exits with 1 if any case got slower by more than --threshold (default 0.1, 10%).
+Changes smaller than --min-seconds are never regressions, since they are within the noise. Baselines are only comparable on the same machine.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+
+from escpos.printer import Dummy
+from zinemachine.consoleprintermanager import ConsolePrinterManager
+from zinemachine.corpus import CorpusGenerator
+from zinemachine.imageprep import ImagePreparer
+from zinemachine.markup import Parser
+from zinemachine.printjob import JobRecorder
+from zinemachine.profile import LMP201
+from zinemachine.raster import printImage
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+from zinemachine.zinevalidator import ZineValidator
+
+RED = '\033[91m'
+GREEN = "\033[0;32m"
+BOLD = '\033[1m'
+ENDC = '\033[0m'
+
+
+class Corpus(object):
+    """the zines of a library directory, loaded once so every case only measures its own stage"""
+
+    def __init__(self, directory, name=None):
+        self.directory = directory
+        self.name = name if name is not None else directory
+        self.paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if not d[0] == '.')
+            self.paths += [os.path.join(root, f) for f in sorted(files) if not f[0] == '.' and os.path.splitext(f)[1] in ['.zine', '.txt']]
+        self.bytes = sum(os.path.getsize(path) for path in self.paths)
+
+        self.zines = []
+        """zines that load without errors, with their markup"""
+        with quiet():
+            for path in self.paths:
+                zine = Zine(path, os.path.basename(os.path.dirname(path)))
+                try:
+                    zine.loadMetadata()
+                    zine.initMarkup()
+                except Exception:
+                    continue
+                self.zines.append(zine)
+
+        self.texts = [zineText(zine.path) for zine in self.zines]
+        self.images = list(ImagePreparer().findImages(directory).keys())
+
+
+def zineText(path):
+    """the text of a zine, after the header"""
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    if len(lines) > 0 and lines[0].strip() == '-----':
+        for i in range(1, len(lines)):
+            if lines[i].strip() == '-----':
+                return ''.join(lines[i + 1:])
+    return ''.join(lines)
+
+
+@contextlib.contextmanager
+def quiet():
+    # the pipeline reports progress and warnings, which would be most of the time of the smaller cases
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def loadMetadata(corpus):
+    def run():
+        for path in corpus.paths:
+            Zine(path, 'benchmark').loadMetadata()
+    return run
+
+
+def initIndex(corpus):
+    def run():
+        ZineMachine(ConsolePrinterManager()).initIndex(corpus.directory)
+    return run
+
+
+def parse(corpus):
+    transliterate = Zine(corpus.paths[0] if len(corpus.paths) > 0 else '', 'benchmark').transliterator.transliterate
+
+    def run():
+        for text in corpus.texts:
+            Parser(transliterate=transliterate).feed(text)
+    return run
+
+
+def initMarkup(corpus):
+    def run():
+        for zine in corpus.zines:
+            Zine(zine.path, zine.category).initMarkup()
+    return run
+
+
+def printMarkup(corpus):
+    profile = LMP201()
+
+    def run():
+        for zine in corpus.zines:
+            Zine.printMarkup(zine.markup, JobRecorder(profile=profile), path=zine.path, baseStyles=Zine.defaultStyles)
+    return run
+
+
+def headerFooter(corpus):
+    profile = LMP201()
+
+    def run():
+        for zine in corpus.zines:
+            printer = JobRecorder(profile=profile)
+            Zine.printHeader(zine.metadata, zine.category, printer)
+            Zine.printFooter(printer, zine.metadata)
+    return run
+
+
+def images(corpus):
+    profile = LMP201()
+
+    def run():
+        for path in corpus.images:
+            if os.path.exists(path):
+                printImage(Dummy(profile=profile), path, **Zine.defaultImageOptions)
+    return run
+
+
+def validate(corpus):
+    profile = LMP201()
+
+    def run():
+        # a new validator for each run, like the validate command, so its image cache starts empty
+        ZineValidator(profile=profile).validateDirectory(corpus.directory)
+    return run
+
+
+cases = {
+    'loadMetadata': loadMetadata,
+    'initIndex': initIndex,
+    'Parser.feed': parse,
+    'initMarkup': initMarkup,
+    'printMarkup': printMarkup,
+    'header+footer': headerFooter,
+    'images': images,
+    'validateDirectory': validate,
+}
+"""name: setup(corpus), which returns the function to time"""
+
+
+def measure(run, repeat):
+    with quiet():
+        # the first run warms up caches (e.g. the codepage plan), like a long running serve process
+        run()
+        times = timeit.repeat(run, number=1, repeat=repeat)
+    return {'seconds': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+def compare(results, baseline, threshold, minSeconds):
+    """print the change of every case since the baseline. returns the names of the cases that regressed"""
+    regressions = []
+    print(f"{BOLD}{'case':<40} {'baseline':>10} {'now':>10} {'change':>8}{ENDC}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<40} {'-':>10} {result['seconds']*1000:>8.1f}ms")
+            continue
+
+        before = baseline[name]['seconds']
+        after = result['seconds']
+        change = (after - before) / before if before > 0 else 0.0
+        regressed = change > threshold and after - before > minSeconds
+        color = RED if regressed else GREEN if change < -threshold else ''
+        print(f"{color}{name:<40} {before*1000:>8.1f}ms {after*1000:>8.1f}ms {change:>+8.1%}{ENDC if color else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the zine pipeline')
+    parser.add_argument('directories', nargs='*', metavar='DIR', help='Zine libraries to benchmark (default: zines test-zines)')
+    parser.add_argument('--synthetic', action='append', type=int, metavar='N', help='Also benchmark a generated library of N zines. Provide multiple times to benchmark several sizes')
+    parser.add_argument('--case', action='append', choices=list(cases.keys()), help='Case to run. Provide multiple times to run several (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each case. The fastest is reported (default: %(default)s)')
+    parser.add_argument('--save', metavar='PATH', help='Save the results to a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare the results to a JSON baseline, and exit with 1 if any case regressed')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Slowdown that counts as a regression, as a fraction (default: %(default)s)')
+    parser.add_argument('--min-seconds', type=float, default=0.002, help='Slowdowns smaller than this many seconds are never regressions (default: %(default)s)')
+    args = parser.parse_args()
+
+    results = {}
+    corpora = {}
+    with tempfile.TemporaryDirectory() as syntheticDirectory:
+        libraries = [(directory, directory) for directory in args.directories or ([] if args.synthetic else ['zines', 'test-zines'])]
+        for count in args.synthetic or []:
+            directory = os.path.join(syntheticDirectory, str(count))
+            print(f"Generating {count} zines...")
+            CorpusGenerator(zines=count).generate(directory)
+            libraries.append((directory, f"synthetic-{count}"))
+
+        for directory, libraryName in libraries:
+            corpus = Corpus(directory, libraryName)
+            corpora[corpus.name] = {'zines': len(corpus.paths), 'bytes': corpus.bytes, 'images': len(corpus.images)}
+            print(f"{BOLD}{corpus.name}{ENDC}: {len(corpus.paths)} zines, {corpus.bytes / 1024:.0f}KiB, {len(corpus.images)} images")
+            for name in args.case or cases.keys():
+                result = measure(cases[name](corpus), args.repeat)
+                results[f"{corpus.name}:{name}"] = result
+                print(f"   {name:>18}: {result['seconds']*1000:8.1f}ms (median {result['median']*1000:.1f}ms)")
+
+    if args.save is not None:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'corpora': corpora, 'results': results}, f, indent=2)
+        print(f"Saved baseline to '{args.save}'")
+
+    if args.compare is not None:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline['results'], args.threshold, args.min_seconds)
+        if len(regressions) > 0:
+            print(f"{RED}{len(regressions)} regressions above {args.threshold:.0%}: {regressions}{ENDC}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
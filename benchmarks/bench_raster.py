@@ -0,0 +1,73 @@
+"""
+Compare converting images to ESC/POS raster with escpos (EscposImage) against the numpy RasterImage engine, and against sending prepared images as is.
+Then report how many bytes compact printing (blank rows as paper feeds, trimmed columns) saves for each image, how long those bytes take to send at the profile's baud rate, and how long the print takes on a PrinterEmulator.
+
+Usage: python benchmarks/bench_raster.py [IMAGE...]
+
+Defaults to the sample images in test-zines/.test/image-test and their .orig originals, from 100x146 to 1535x2244. The printer is given a media width wide enough for every image.
+"""
+import glob
+import os
+import sys
+import timeit
+
+from PIL import Image
+from escpos.printer import Dummy
+from zinemachine.emulatedprinter import emulatePrint
+from zinemachine.profile import LMP201
+from zinemachine.raster import RasterImage, printRaster, ditherMethods, transmitSeconds
+
+
+def widePrinter(width):
+    profile = LMP201()
+    profile.profile_data = dict(profile.profile_data, media={'width': {'mm': 72, 'pixels': width}})
+    return Dummy(profile=profile)
+
+
+def main():
+    # the .orig files are the full size originals of the images that were resized for the printer
+    paths = sys.argv[1:] or glob.glob(os.path.join('test-zines', '.test', 'image-test', '*.png')) + glob.glob(os.path.join('test-zines', '.test', 'image-test', '*.png.orig'))
+    images = []
+    for path in paths:
+        with Image.open(path) as image:
+            image.load()
+            images.append((path, image))
+
+    for path, image in sorted(images, key=lambda item: item[1].width * item[1].height):
+        width = image.width
+
+        def escpos():
+            widePrinter(width).image(image, fragment_height=960, center=True)
+
+        def engine(dither):
+            RasterImage.fromImage(image, dither=dither, width=width).print(widePrinter(width), fragmentHeight=960)
+
+        prepared = RasterImage.fromImage(image, width=width).toImage()
+
+        def preparedImage():
+            printRaster(widePrinter(width), prepared, fragmentHeight=960)
+
+        escposTime = min(timeit.repeat(escpos, number=3, repeat=3)) / 3
+        print(f"{os.path.basename(path)} ({image.width}x{image.height} {image.mode})")
+        print(f"   {'escpos':>16}: {escposTime*1000:8.1f}ms")
+        for dither in ditherMethods:
+            engineTime = min(timeit.repeat(lambda: engine(dither), number=3, repeat=3)) / 3
+            print(f"   {'numpy ' + dither:>16}: {engineTime*1000:8.1f}ms ({escposTime/engineTime:.1f}x)")
+        preparedTime = min(timeit.repeat(preparedImage, number=3, repeat=3)) / 3
+        print(f"   {'prepared':>16}: {preparedTime*1000:8.1f}ms ({escposTime/preparedTime:.1f}x)")
+
+        printer = widePrinter(width)
+        stats = printRaster(printer, prepared, fragmentHeight=960)
+        saved = stats['rasterBytes'] - stats['bytes']
+        print(f"   {'compact':>16}: {stats['rasterBytes']}B -> {stats['bytes']}B ({saved / stats['rasterBytes']:.0%} smaller, "
+              f"{transmitSeconds(stats['rasterBytes'], printer.profile):.1f}s -> {transmitSeconds(stats['bytes'], printer.profile):.1f}s at {printer.profile.profile_data['serial']['baudrate']} baud)")
+
+        plainPrinter = widePrinter(width)
+        printRaster(plainPrinter, prepared, fragmentHeight=960, compact=False)
+        plainTime = emulatePrint(plainPrinter.output, plainPrinter.profile).now
+        compactTime = emulatePrint(printer.output, printer.profile).now
+        print(f"   {'emulated print':>16}: {plainTime:.1f}s -> {compactTime:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measure how many bytes compact print jobs (JobRecorder compact=True: no trailing spaces, blank lines sent as ESC d) save, for every zine in the sample library, and check that every compact job renders the same receipt as the plain job.
+
+Usage: python benchmarks/bench_textcompaction.py [DIR...]
+
+Defaults to zines and test-zines. Images are included in the jobs, so the totals are for the whole print. The print times are simulated with PrinterEmulator at the profile's baud rate.
+"""
+import contextlib
+import io
+import os
+import sys
+
+from zinemachine.emulatedprinter import emulatePrint
+from zinemachine.printjob import PrintJob
+from zinemachine.profile import LMP201
+from zinemachine.raster import transmitSeconds
+from zinemachine.zine import Zine
+
+
+def zinePaths(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d[0] == '.')
+        for f in sorted(files):
+            if not f[0] == '.' and os.path.splitext(f)[1] in ['.zine', '.txt']:
+                yield os.path.join(root, f)
+
+
+def emulate(data, profile):
+    """the receipt data prints, and how long it takes"""
+    emulator = emulatePrint(data, profile, baudrate=profile.profile_data['serial']['baudrate'])
+    renderer = emulator.renderer
+    return (renderer.lines, renderer.y, renderer.toImage().tobytes()), emulator.now
+
+
+def main():
+    profile = LMP201()
+    totalPlain = 0
+    totalCompact = 0
+    plainSeconds = 0.0
+    compactSeconds = 0.0
+    mismatches = []
+    for directory in sys.argv[1:] or ['zines', 'test-zines']:
+        for path in zinePaths(directory):
+            zine = Zine(path, 'benchmark')
+            with contextlib.redirect_stdout(io.StringIO()):
+                plain = PrintJob.render(zine.printZine, profile, compact=False)
+                compact = PrintJob.render(zine.printZine, profile)
+
+            plainReceipt, plainTime = emulate(plain.data, profile)
+            compactReceipt, compactTime = emulate(compact.data, profile)
+            if plainReceipt != compactReceipt:
+                mismatches.append(path)
+
+            totalPlain += len(plain.data)
+            totalCompact += len(compact.data)
+            plainSeconds += plainTime
+            compactSeconds += compactTime
+            print(f"{path}: {len(plain.data)}B -> {len(compact.data)}B ({len(plain.data) - len(compact.data)}B saved), printed in {plainTime:.1f}s -> {compactTime:.1f}s")
+
+    saved = totalPlain - totalCompact
+    print(f"total: {totalPlain}B -> {totalCompact}B ({saved}B, {saved / max(1, totalPlain):.2%} saved, {transmitSeconds(saved, profile):.1f}s at {profile.profile_data['serial']['baudrate']} baud)")
+    print(f"emulated print time: {plainSeconds:.1f}s -> {compactSeconds:.1f}s")
+    if len(mismatches) > 0:
+        print(f"compact jobs render differently: {mismatches}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
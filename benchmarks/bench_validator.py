@@ -0,0 +1,67 @@
+"""
+Compare validating images with a header-only probe (ZineValidator.imageSize) against fully decoding them with EscposImage, as the validator used to.
+
+Usage: python benchmarks/bench_validator.py [DIR...]
+
+Bytes read are taken from /proc/self/io (rchar), so they're only reported on Linux.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+from escpos.image import EscposImage
+from zinemachine.zinevalidator import ZineValidator
+
+
+class DecodingZineValidator(ZineValidator):
+    """validator that decodes and converts every image to check its size"""
+    def imageSize(self, imagePath):
+        image = EscposImage(imagePath)
+        return (image.width, image.height)
+
+
+def bytesRead():
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(validator, directories, repeat=3):
+    """(best wall time, best cpu time, bytes read) for validating every directory"""
+    best = None
+    for _ in range(repeat):
+        startRead = bytesRead()
+        startTime = time.perf_counter()
+        startCpu = time.process_time()
+        # the diagnostics aren't interesting here
+        with contextlib.redirect_stdout(io.StringIO()):
+            for directory in directories:
+                validator.validateDirectory(directory)
+        result = (time.perf_counter() - startTime, time.process_time() - startCpu, bytesRead() - startRead if startRead is not None else None)
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def main():
+    directories = sys.argv[1:] or [os.path.join('test-zines', '.test', 'image-test')]
+    results = {
+        'decode (EscposImage)': measure(DecodingZineValidator(), directories),
+        'probe (header only)': measure(ZineValidator(), directories),
+    }
+
+    baseline = results['decode (EscposImage)']
+    for name, (wallTime, cpuTime, read) in results.items():
+        readText = f"{read / 1024:8.0f}KiB read" if read is not None else "bytes read unavailable"
+        print(f"{name:>22}: {wallTime*1000:8.1f}ms wall {cpuTime*1000:8.1f}ms cpu {readText} ({baseline[0]/wallTime:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
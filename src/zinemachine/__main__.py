@@ -1,15 +1,27 @@
+import atexit
+import logging
 import os
 import sys
 import argparse
+import random
 import signal
-from .zinemachine import ZineMachine
-from .profile import LMP201
+from .zinemachine import ZineMachine, findZines, categoryOf
+from .profile import loadProfile, saveProfileSettings, defaultSerialSettings
 from .consoleprintermanager import ConsolePrinterManager
 from .bluetoothprintermanager import BluetoothPrinterManager
+from .networkprintermanager import NetworkPrinterManager
+from .emulatedprinter import EmulatedPrinterManager, EmulatedLinkBenchmark
 from .zinevalidator import ZineValidator
+from .imagecache import ImageProbeCache
+from .imageprep import ImagePreparer, ditherMethods
+from .raster import mediaWidth
+from .nvgraphics import NVGraphicsTable, supportsNVGraphics, deleteAllGraphicsCommand, footerEmblemKey
 from .zine import Zine
-
-from pathlib import PurePath
+from .linkbenchmark import LinkBenchmark, flowControlSettings
+from .corpus import CorpusGenerator, malformations
+from .printmetrics import MetricsLog, loadMetrics, summarize, stageNames
+from .profiling import Profiler
+from .logsetup import setupLogging, stopLogging, logFormats
 
 
 BUTTON_BLUE_PIN = 16
@@ -22,48 +34,276 @@ YELLOW = '\033[93m'
 BOLD = '\033[1m'
 ENDC = '\033[0m'
 
+DEFAULT_PROFILE_PATH = 'printer-profile.json'
+DEFAULT_METRICS_PATH = 'print-metrics.jsonl'
+
+logger = logging.getLogger('zinemachine.serve')
+
+def initProfile(args):
+    """load the printer profile overrides from --profile, or from $PWD/printer-profile.json if it exists"""
+    if args.profile is not None:
+        return loadProfile(args.profile)
+    if os.path.exists(DEFAULT_PROFILE_PATH):
+        return loadProfile(DEFAULT_PROFILE_PATH)
+    return loadProfile()
+
+def initMetricsLog(args):
+    if args.metrics is None and args.metrics_textfile is None:
+        return None
+    return MetricsLog(jsonPath=args.metrics, textfilePath=args.metrics_textfile)
+
 def initZineMachine(args):
-    if args.stdio:
+    zineMachine = initPrinterZineMachine(args)
+    zineMachine.metricsLog = initMetricsLog(args)
+    zineMachine.maxFileSizeKb = args.max_size_kb if args.max_size_kb > 0 else None
+    Zine.streamAboveKb = args.stream_above_kb if args.stream_above_kb >= 0 else None
+    return zineMachine
+
+def initPrinterManager(args, kind, profile):
+    """the printer manager for --printer KIND: bluetooth, a serial device (e.g. /dev/rfcomm1), emulated, or HOST[:PORT] of a network printer"""
+    if kind == 'bluetooth':
+        return BluetoothPrinterManager(profile)
+    elif kind.startswith('/dev/'):
+        return BluetoothPrinterManager(profile, devfile=kind)
+    elif kind == 'emulated':
+        return EmulatedPrinterManager(profile, timeScale=args.emulate if args.emulate is not None else 0.0)
+
+    host, separator, port = kind.partition(':')
+    if len(host) == 0 or (separator and not port.isdigit()):
+        print(f"{RED}Unknown printer '{kind}'. Use bluetooth, a serial device, emulated, or HOST[:PORT]{ENDC}")
+        sys.exit(1)
+    return NetworkPrinterManager(profile, host, int(port) if separator else 9100)
+
+def receiptPath(path, index):
+    """the receipt of the first emulated printer is saved to path, and the receipts of the others next to it, e.g. receipt-printer-2.png"""
+    if index == 0:
+        return path
+    base, extension = os.path.splitext(path)
+    return f"{base}-printer-{index + 1}{extension}"
+
+def initPrinterZineMachine(args):
+    if args.printer is not None:
+        # every printer shares the profile, so a zine rendered for one is sent to the others from the render cache
+        profile = initProfile(args)
+        # emulated prints block for as long as they take, so only real printers need an estimate
+        estimate = {'secondsPerCharacter': 0.0, 'basePrintTime': 0.0} if all(kind == 'emulated' for kind, *_ in args.printer) else {}
+        zineMachine = None
+        for i, (kind, *categories) in enumerate(args.printer):
+            printerManager = initPrinterManager(args, kind, profile)
+            if isinstance(printerManager, EmulatedPrinterManager) and args.receipt is not None:
+                atexit.register(printerManager.saveReceipt, receiptPath(args.receipt, i))
+            if zineMachine is None:
+                zineMachine = ZineMachine(printerManager, **estimate)
+                zineMachine.workers[0].categories = set(categories)
+            else:
+                zineMachine.addPrinter(printerManager, categories)
+        return zineMachine
+    elif args.stdio:
         zineMachine = ZineMachine(ConsolePrinterManager(), secondsPerCharacter=0.0, basePrintTime=0.0)
         return zineMachine
+    elif args.emulate is not None:
+        printerManager = EmulatedPrinterManager(initProfile(args), timeScale=args.emulate)
+        if args.receipt is not None:
+            # the receipt is the whole roll printed while running, so it is saved once on exit
+            atexit.register(printerManager.saveReceipt, args.receipt)
+        # the emulated print blocks for as long as it takes, so there is no need for an estimate
+        zineMachine = ZineMachine(printerManager, secondsPerCharacter=0.0, basePrintTime=0.0)
+        return zineMachine
     else:
-        zineMachine = ZineMachine(BluetoothPrinterManager(LMP201()))
+        zineMachine = ZineMachine(BluetoothPrinterManager(initProfile(args)))
         return zineMachine
 
 
 def validateZines(args):
-    validator = ZineValidator() if args.resize is None else ZineValidator(resizeImages=True, maxImageWidth=args.resize)
+    validatorArgs = {'fixCharacters': args.fix_chars, 'profile': initProfile(args), 'imageCache': ImageProbeCache(args.image_cache)}
+    if args.resize is not None:
+        validatorArgs.update({'resizeImages': True, 'maxImageWidth': args.resize})
+    validator = ZineValidator(**validatorArgs)
     diagnostics = validator.validateDirectory(args.file)
     if len(diagnostics[0]) > 0:
         sys.exit(1)
     elif len(diagnostics[1]) > 0:
         sys.exit(2)
 
+def prepareImages(args):
+    width = args.width if args.width is not None else mediaWidth(initProfile(args))
+    preparer = ImagePreparer(width=width, dither=args.dither, workers=args.workers, imageCache=ImageProbeCache(args.image_cache))
+    results = preparer.prepareDirectory(args.file)
+    if any(r['error'] is not None for r in results):
+        sys.exit(1)
+
+def benchLink(args):
+    # the profile is created by the benchmark if it doesn't exist yet
+    profilePath = args.profile if args.profile is not None else DEFAULT_PROFILE_PATH
+    profile = loadProfile(profilePath if os.path.exists(profilePath) else None)
+    serialSettings = {**defaultSerialSettings, **profile.profile_data.get('serial', {})}
+
+    payload = bytes(args.bytes)
+    if args.print_test:
+        line = b'Zine Machine link benchmark\n'
+        payload = (line * (args.bytes // len(line) + 1))[:args.bytes]
+
+    benchmarkClass = EmulatedLinkBenchmark if args.emulate else LinkBenchmark
+    benchmark = benchmarkClass(
+        devfile=args.device if args.device is not None else serialSettings['devfile'],
+        baudrates=args.baudrate or [9600, 19200, 38400, 57600, 115200],
+        chunkSizes=args.chunk_size or [64, 256, 1024],
+        flowControls=args.flow_control or ['dsrdtr', 'none'],
+        payload=payload,
+        stallTime=args.stall_time,
+        baseSettings=serialSettings)
+
+    print(f"Benchmarking serial link '{benchmark.devfile}'...")
+    results = benchmark.run()
+    print()
+    LinkBenchmark.printResults(results)
+
+    best = LinkBenchmark.bestResult(results)
+    if best is None:
+        print(f"{RED}All configurations failed.{ENDC}")
+        sys.exit(1)
+
+    print(f"Best: {best['settings']} ({best['bytesPerSecond']:.0f} B/s)")
+    if args.dry_run or args.emulate:
+        return
+
+    saveProfileSettings(profilePath, 'serial', best['settings'])
+    print(f"Saved serial settings to '{os.path.abspath(profilePath)}'")
+
+def uploadGraphics(args):
+    # the stored graphics are saved to the profile, like bench-link's serial settings
+    profilePath = args.profile if args.profile is not None else DEFAULT_PROFILE_PATH
+    profile = loadProfile(profilePath if os.path.exists(profilePath) else None)
+    if not supportsNVGraphics(profile):
+        print(f"{RED}The printer profile does not support NV graphics. If the printer supports GS ( L, add {{\"features\": {{\"nvGraphics\": true}}}} to '{profilePath}'{ENDC}")
+        sys.exit(1)
+
+    table = NVGraphicsTable(profile)
+    commands = []
+    if args.clear:
+        table.entries = {}
+        commands.append(deleteAllGraphicsCommand())
+
+    images = list(args.image or [])
+    if args.min_uses > 0:
+        zineImages = ImagePreparer(width=mediaWidth(profile)).findImages(args.zines_dir)
+        images += [path for path, zines in zineImages.items() if len(zines) >= args.min_uses and path not in images]
+
+    uploads = [(path, None) for path in images] + ([(args.emblem, footerEmblemKey)] if args.emblem is not None else [])
+    if len(uploads) == 0:
+        print("No graphics to upload.")
+        return
+
+    for path, key in uploads:
+        key, command = table.add(path, dither=args.dither, key=key)
+        commands.append(command)
+        print(f"{key}: {path} ({table.entries[key]['width']}x{table.entries[key]['height']}, {len(command)}B)")
+
+    if args.dry_run:
+        return
+
+    printerManager = BluetoothPrinterManager(profile)
+    if not printerManager.connect():
+        print(f"{RED}Printer offline.{ENDC}")
+        sys.exit(1)
+
+    print(f"Uploading {len(uploads)} graphics ({sum(len(c) for c in commands)}B)...")
+    for command in commands:
+        printerManager.printer._raw(command)
+    printerManager.printer.device.flush()
+
+    saveProfileSettings(profilePath, 'nvGraphics', table.entries, replace=args.clear)
+    print(f"Saved stored graphics to '{os.path.abspath(profilePath)}'")
+
+def generateCorpus(args):
+    generator = CorpusGenerator(seed=args.seed, categories=args.categories, zines=args.zines, medianSizeKb=args.median_size_kb, maxFileSizeKb=args.max_size_kb,
+                                markupDensity=args.markup_density, nestingDepth=args.nesting_depth, images=args.images, imagesPerZine=args.images_per_zine,
+                                imageWidths=(args.image_width[0], args.image_width[1]), nonAsciiRatio=args.non_ascii, malformedRatio=args.malformed)
+    try:
+        manifest = generator.generate(args.dir)
+    except ValueError as err:
+        print(f"{RED}{err}{ENDC}")
+        sys.exit(1)
+
+    print(f"Generated {manifest['zines']} zines ({manifest['bytes'] / 1024:.0f}KiB) and {args.images} images in '{os.path.abspath(args.dir)}', "
+          f"{len(manifest['malformed'])} malformed ({', '.join(sorted(set(manifest['malformed'].values()))) or 'none'})")
+
 def printZines(args):
+    paths = findZines(args.file)
+    if args.shuffle:
+        random.shuffle(paths)
+    if args.limit is not None:
+        paths = paths[:args.limit]
+    if len(paths) == 0:
+        print(f"{RED}No zines found in {' '.join(args.file)}{ENDC}")
+        sys.exit(1)
+
     zineMachine = initZineMachine(args)
-    pathParts = PurePath(args.file).parts
-    category = pathParts[1] if len(pathParts) >= 2 else pathParts[0] if len(pathParts) >= 1 else None
-    zine = Zine(args.file, category)
-    zineMachine.printZine(zine)
+    if args.printer is not None:
+        # the dispatcher sends zines to the printers that are online
+        zineMachine.initPrinter(supervise=False)
+    zines = [Zine(path, categoryOf(path), maxFileSizeKb=zineMachine.maxFileSizeKb) for path in paths]
+    if len(zines) == 1:
+        zineMachine.printZine(zines[0])
+    else:
+        summary = zineMachine.printBatch(zines)
+        seconds = summary['seconds']
+        print(f"Printed {summary['zines']} zines ({summary['failed']} failed) in {seconds:.1f}s: "
+              f"{summary['zines'] * 60 / seconds:.1f} zines/min, {summary['bytes'] / seconds:.0f}B/s")
+
+    for worker in zineMachine.workers:
+        if not isinstance(worker.printerManager, EmulatedPrinterManager):
+            continue
+        emulator = worker.printerManager.emulator
+        printedTime = emulator.waitUntilPrinted()
+        stats = emulator.stats
+        name = f" ({worker.name})" if len(zineMachine.workers) > 1 else ''
+        print(f"Emulated print{name}: {stats['bytes']}B sent in {stats['transmitSeconds']:.1f}s ({stats['stalls']} stalls, {stats['stallSeconds']:.1f}s), "
+              f"printed in {printedTime:.1f}s ({stats['printSeconds']:.1f}s printing), {stats['droppedBytes']}B dropped")
+        for error in emulator.errors:
+            print(f"{YELLOW}Emulated printer could not parse: {error}{ENDC}")
+
+def printStats(args):
+    if not os.path.exists(args.file):
+        print(f"{RED}No print metrics in '{args.file}'. Record them with print or serve --metrics{ENDC}")
+        sys.exit(1)
+
+    records = loadMetrics(args.file, last=args.last)
+    summary = summarize(records)
+    print(f"{summary['prints']} prints ({summary['errors']} failed), {summary['bytes'] / 1024:.0f}KiB sent, {summary['images']} images ({summary['imageCacheHits']} from NV memory)")
+    if summary['prints'] == 0:
+        return
+
+    print(f"{BOLD}{'stage':<20} {'count':>6} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}{ENDC}")
+    rows = [(name, summary['stages'][name]) for name in stageNames if name in summary['stages']]
+    if summary['pressToFirstByte'] is not None:
+        rows.append(('press to first byte', summary['pressToFirstByte']))
+    for name, distribution in rows:
+        print(f"{name:<20} {distribution['count']:>6} " +  ' '.join(f"{distribution[q] * 1000:>8.1f}ms" for q in [0.5, 0.9, 0.99, 'max']))
+
+def initProfiler(args):
+    if not args.profile_cpu and not args.profile_mem:
+        return None
+    return Profiler(args.profile_dir, cpu=args.profile_cpu, mem=args.profile_mem)
 
 def serveZines(args):
     zineMachine = initZineMachine(args)
+    zineMachine.initPrinter()
     zineMachine.initIndex(args.zines_dir)
 
-    print('{} zines loaded'.format(sum([len(v) for v in zineMachine.categories.values()])))
+    if len(zineMachine.workers) > 1:
+        for printer in zineMachine.printerStatus()['printers']:
+            logger.info(f"{printer['name']}: {printer['printerType']}, {'online' if printer['online'] else 'offline'}, printing {', '.join(printer['categories']) or 'any category'}",
+                        extra={'printer': printer['name'], 'online': printer['online']})
+
+    logger.info('{} zines loaded'.format(sum([len(v) for v in zineMachine.categories.values()])))
     for k, v in zineMachine.categories.items():
-        print('{}: {}'.format(k, len(v)))
+        logger.info('{}: {}'.format(k, len(v)), extra={'category': k, 'zines': len(v)})
+        if args.quiet:
+            # a large library would log thousands of titles
+            continue
         for p, z in v.items():
-            print('   {}'.format(z.metadata['title']), end="")
-            # print('   path: {}'.format(z.path))
-            # print("   category: {}".format(z.category))
-            # print("   metadata:")
-            # for m, mv in z.metadata.items():
-            #     print("      {}: {}".format(m, mv))
-
-            print()
-
-        print()
+            logger.info('   {}'.format(z.metadata['title']), extra={'zine': p})
 
     import RPi.GPIO as GPIO
     GPIO.setmode(GPIO.BCM)
@@ -88,28 +328,45 @@ def serveZines(args):
         try:
             zineMachine.printText("Resetting. Please wait...\n\n\n")
         except Exception as e:
-            print(e)
-        print("Exiting...")
+            logger.error(e)
+        logger.info("Exiting...")
+        # os._exit skips atexit, so the log queue is written first
+        stopLogging()
         os._exit(0)
 
     def shutdown(chord, holdTime):
         try:
             zineMachine.printText("Shutting down...\n\n\n")
         except Exception as e:
-            print(e)
-        print("Shutting down...")
+            logger.error(e)
+        logger.info("Shutting down...")
         result = os.system("sudo shutdown now")
         if result != 0:
             try:
                 zineMachine.printText("Shutdown failed.\n\n\n")
             except Exception as e:
-                print(e)
-            print("Shutdown failed.")
+                logger.error(e)
+            logger.error("Shutdown failed.")
 
 
     inputManager.addChord(frozenset([BUTTON_YELLOW_PIN, BUTTON_GREEN_PIN, BUTTON_PINK_PIN]), restart, holdTime=5.0)
     inputManager.addChord(frozenset([BUTTON_BLUE_PIN, BUTTON_YELLOW_PIN, BUTTON_GREEN_PIN, BUTTON_PINK_PIN]), shutdown, holdTime=5.0)
 
+    # profile a single print on a running machine: kill -USR1 PID, or hold blue and yellow with --profile-cpu/--profile-mem
+    profiler = initProfiler(args) or Profiler(args.profile_dir, cpu=True, mem=True)
+
+    def profileNextPrint(*_):
+        zineMachine.profileNextPrint(profiler)
+        logger.info(f"Profiling the next print to '{os.path.abspath(args.profile_dir)}'")
+
+    signal.signal(signal.SIGUSR1, profileNextPrint)
+    if args.profile_cpu or args.profile_mem:
+        def profileChord(chord, holdTime):
+            profileNextPrint()
+            zineMachine.printText("Profiling the next print.\n\n\n")
+
+        inputManager.addChord(frozenset([BUTTON_BLUE_PIN, BUTTON_YELLOW_PIN]), profileChord, holdTime=3.0)
+
 
     zineCount = sum([len(v) for v in zineMachine.categories.values()])
     zineMachine.printText(f"{zineCount} zines loaded. Ready to print!\n\n\n\n\n\n")
@@ -127,33 +384,126 @@ if __name__ == "__main__":
 
     subparsers = parser.add_subparsers(title='commands', required=True)
 
+    # logging and profiling options, shared by every command
+    commonParser = argparse.ArgumentParser(add_help=False)
+    commonParser.add_argument('--profile-cpu', action='store_true', help='Profile the command with cProfile. serve only profiles a single print, when it receives SIGUSR1 or blue and yellow are held for 3 seconds')
+    commonParser.add_argument('--profile-mem', action='store_true', help='Trace memory allocations with tracemalloc and report the top allocators. serve only profiles a single print, like --profile-cpu')
+    commonParser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO', help='Least severe messages logged (default: %(default)s)')
+    commonParser.add_argument('--log-format', choices=logFormats, default='text', help='text, or one JSON object per line with the structured fields (zine, category, job, seconds, ...) as keys (default: %(default)s)')
+    commonParser.add_argument('--profile-dir', default='profiles', metavar='DIR', help='Directory profiles are saved to, with timestamped names (default: $PWD/%(default)s)')
+
     # validate
-    validateParser = subparsers.add_parser('validate', help='Validate zines for formatting or printability issues')
+    validateParser = subparsers.add_parser('validate', help='Validate zines for formatting or printability issues', parents=[commonParser])
     validateParser.add_argument('file', nargs='?', default='zines',
         help='File or directory to validate (default: $PWD/%(const)s)')
 
     validateParser.add_argument('--resize', nargs='?', type=int, const=576, metavar='MAXWIDTH_PX',
         help='Automatically resize images that are larger than the provided width. If --resize is provided with no value, defaults to %(const)s). A backup is saved as {FILE}.orig')
 
+    validateParser.add_argument('--profile', help=f'File containing JSON overrides for the printer profile. Printable characters are checked against its codepages (default: $PWD/{DEFAULT_PROFILE_PATH}, if it exists)')
+
+    validateParser.add_argument('--image-cache', metavar='PATH',
+        help='File to keep image sizes in between runs, so unchanged images are not opened again')
+
+    validateParser.add_argument('--fix-chars', action='store_true',
+        help='Rewrite zines, replacing unprintable characters with printable look-alikes (e.g. smart quotes with straight quotes). A backup is saved as {FILE}.orig, unless it already exists')
+
     validateParser.set_defaults(func=validateZines)
 
+    # prepare-images
+    prepareParser = subparsers.add_parser('prepare-images', help='Convert the images used by zines to 1-bit images at the exact printer width, so they print without any conversion', parents=[commonParser])
+    prepareParser.add_argument('file', nargs='?', default='zines',
+        help='File or directory of zines whose images are prepared (default: $PWD/%(default)s)')
+    prepareParser.add_argument('--dither', choices=ditherMethods, default='floyd-steinberg', help='Dithering method (default: %(default)s)')
+    prepareParser.add_argument('--width', type=int, metavar='DOTS', help='Paper width in dots (default: the media width in the printer profile)')
+    prepareParser.add_argument('--workers', type=int, help='Number of images to prepare in parallel (default: number of CPUs)')
+    prepareParser.add_argument('--profile', help=f'File containing JSON overrides for the printer profile (default: $PWD/{DEFAULT_PROFILE_PATH}, if it exists)')
+    prepareParser.add_argument('--image-cache', metavar='PATH', help='File to keep image sizes in between runs, so unchanged images are not opened again')
+    prepareParser.set_defaults(func=prepareImages)
+
     # print
-    printParser = subparsers.add_parser('print', help='Print a single zine and exit')
+    printParser = subparsers.add_parser('print', help='Print zines and exit', parents=[commonParser])
 
-    printParser.add_argument('file', help='The zine to print')
+    printParser.add_argument('file', nargs='+', help='Zines to print: files, directories of zines, or glob patterns (e.g. "zines/**/*.zine"). Several zines are printed in order over one printer connection, each rendered while the one before it prints')
+    printParser.add_argument('--shuffle', action='store_true', help='Print the zines in random order')
+    printParser.add_argument('--limit', type=int, metavar='N', help='Only print the first N zines, after shuffling')
     printParser.add_argument('--stdio', action='store_true', help='Print zine to console stdio instead of a receipt printer')
-    # printParser.add_argument('--profile', help='File containing a JSON profile for the printer model')
+    printParser.add_argument('--emulate', nargs='?', type=float, const=0.0, metavar='TIMESCALE', help='Print to an emulated printer, which captures the exact ESC/POS stream and simulates the serial link and print speed. TIMESCALE 1 takes as long as the real printer (default: as fast as possible)')
+    printParser.add_argument('--receipt', metavar='PATH', help='With --emulate, save everything printed as a PNG on exit. With several --printer emulated, the other printers are saved next to it as {PATH}-printer-N')
+    printParser.add_argument('--profile', help=f'File containing JSON overrides for the printer profile (default: $PWD/{DEFAULT_PROFILE_PATH}, if it exists)')
+    printParser.add_argument('--printer', action='append', nargs='+', metavar=('KIND', 'CATEGORY'), help='Print on this printer: bluetooth, a serial device (e.g. /dev/rfcomm1), emulated (at the --emulate TIMESCALE), or HOST[:PORT] of a network printer (default port 9100). Only zines in the CATEGORIES listed go to the printer, and it prints nothing else, unless every printer lists categories. Provide multiple times to print on several printers: each zine goes to the least busy printer that is online')
+    printParser.add_argument('--metrics', nargs='?', const=DEFAULT_METRICS_PATH, metavar='PATH', help='Append the stage timings of the print to a JSON lines file, for the stats command (default: $PWD/%(const)s)')
+    printParser.add_argument('--metrics-textfile', metavar='PATH', help='Write print metrics in Prometheus text format, e.g. to the node exporter textfile collector directory')
+    printParser.add_argument('--max-size-kb', type=int, default=1024, help='Only print the beginning of zines larger than this. 0 prints all of it (default: %(default)s)')
+    printParser.add_argument('--stream-above-kb', type=int, default=Zine.streamAboveKb, help='Stream zines larger than this: read, parse, wrap and print them a window at a time, so memory use does not depend on their length. -1 never streams (default: %(default)s)')
     printParser.set_defaults(func=printZines)
 
     # serve
-    serveParser = subparsers.add_parser('serve', help='Listen for GPIO button inputs and print zines according to category')
+    serveParser = subparsers.add_parser('serve', help='Listen for GPIO button inputs and print zines according to category', parents=[commonParser])
     serveParser.add_argument('zines_dir', nargs='?', default='zines',
         help='Directory containing zine categories (default: $PWD/%(const)s)')
     serveParser.add_argument('-c', '--category', action='append', nargs='*', help='CATEGORY PIN - bind button PIN to print random zine in CATEGORY')
     serveParser.add_argument('--stdio', action='store_true', help='Print zine to console stdio instead of a receipt printer')
-    # serveParser.add_argument('--profile', help='File containing a JSON profile for the printer model')
+    serveParser.add_argument('--emulate', nargs='?', type=float, const=0.0, metavar='TIMESCALE', help='Print to an emulated printer, which captures the exact ESC/POS stream and simulates the serial link and print speed. TIMESCALE 1 takes as long as the real printer (default: as fast as possible)')
+    serveParser.add_argument('--receipt', metavar='PATH', help='With --emulate, save everything printed as a PNG on exit. With several --printer emulated, the other printers are saved next to it as {PATH}-printer-N')
+    serveParser.add_argument('--profile', help=f'File containing JSON overrides for the printer profile (default: $PWD/{DEFAULT_PROFILE_PATH}, if it exists)')
+    serveParser.add_argument('--printer', action='append', nargs='+', metavar=('KIND', 'CATEGORY'), help='Print on this printer: bluetooth, a serial device (e.g. /dev/rfcomm1), emulated (at the --emulate TIMESCALE), or HOST[:PORT] of a network printer (default port 9100). Only zines in the CATEGORIES listed go to the printer, and it prints nothing else, unless every printer lists categories. Provide multiple times to print on several printers: each zine goes to the least busy printer that is online')
+    serveParser.add_argument('--metrics', nargs='?', const=DEFAULT_METRICS_PATH, metavar='PATH', help='Append the stage timings of every print to a JSON lines file, for the stats command (default: $PWD/%(const)s)')
+    serveParser.add_argument('-q', '--quiet', action='store_true', help='Only log the number of zines in each category on startup, instead of every title')
+    serveParser.add_argument('--metrics-textfile', metavar='PATH', help='Write print metrics in Prometheus text format after every print, e.g. to the node exporter textfile collector directory')
+    serveParser.add_argument('--max-size-kb', type=int, default=1024, help='Only print the beginning of zines larger than this. 0 prints all of it (default: %(default)s)')
+    serveParser.add_argument('--stream-above-kb', type=int, default=Zine.streamAboveKb, help='Stream zines larger than this: read, parse, wrap and print them a window at a time, so memory use does not depend on their length. -1 never streams (default: %(default)s)')
     serveParser.set_defaults(func=serveZines)
 
+    # stats
+    statsParser = subparsers.add_parser('stats', help='Summarize the stage timings of recent prints recorded with --metrics', parents=[commonParser])
+    statsParser.add_argument('file', nargs='?', default=DEFAULT_METRICS_PATH, help='Print metrics file (default: $PWD/%(default)s)')
+    statsParser.add_argument('--last', type=int, default=100, help='Number of recent prints to summarize (default: %(default)s)')
+    statsParser.set_defaults(func=printStats)
+
+    # bench-link
+    benchLinkParser = subparsers.add_parser('bench-link', help='Measure the serial link to the printer and save the fastest settings to the printer profile', parents=[commonParser])
+    benchLinkParser.add_argument('--device', help='Serial device to benchmark, e.g. a pty created with socat (default: devfile from the printer profile)')
+    benchLinkParser.add_argument('--profile', help=f'File to save the best serial settings to (default: $PWD/{DEFAULT_PROFILE_PATH})')
+    benchLinkParser.add_argument('-b', '--baudrate', action='append', type=int, help='Baud rate to test. Provide multiple times to test several (default: 9600 to 115200)')
+    benchLinkParser.add_argument('--chunk-size', action='append', type=int, help='Write size in bytes to test. Provide multiple times to test several (default: 64, 256, 1024)')
+    benchLinkParser.add_argument('--flow-control', action='append', choices=list(flowControlSettings.keys()), help='Flow control to test. Provide multiple times to test several (default: dsrdtr, none)')
+    benchLinkParser.add_argument('--bytes', type=int, default=4096, help='Bytes sent for each configuration (default: %(default)s)')
+    benchLinkParser.add_argument('--stall-time', type=float, default=0.5, help='Writes that block longer than this many seconds are counted as stalls (default: %(default)s)')
+    benchLinkParser.add_argument('--print-test', action='store_true', help='Send printable text instead of NUL bytes, to include the print mechanism in the measurement. Prints a lot of paper!')
+    benchLinkParser.add_argument('--dry-run', action='store_true', help='Only print the results, do not save the best settings')
+    benchLinkParser.add_argument('--emulate', action='store_true', help='Benchmark an emulated printer instead of the serial device, timed by its simulated clock. The results are never saved')
+    benchLinkParser.set_defaults(func=benchLink)
+
+    # upload-graphics
+    uploadGraphicsParser = subparsers.add_parser('upload-graphics', help='Store images used by many zines, and the footer emblem, in the printer\'s NV memory, so they are printed with a short command instead of being sent every time. NV memory wears out, so only upload when the graphics change', parents=[commonParser])
+    uploadGraphicsParser.add_argument('zines_dir', nargs='?', default='zines', help='Directory of zines to find shared images in (default: $PWD/%(default)s)')
+    uploadGraphicsParser.add_argument('--min-uses', type=int, default=2, help='Upload every image used by at least this many zines. 0 to only upload --image and --emblem (default: %(default)s)')
+    uploadGraphicsParser.add_argument('--image', action='append', help='Image to upload. Provide multiple times to upload several')
+    uploadGraphicsParser.add_argument('--emblem', help='Image printed in place of the box-drawing emblem in the footer')
+    uploadGraphicsParser.add_argument('--dither', choices=ditherMethods, default='floyd-steinberg', help='Dithering method (default: %(default)s)')
+    uploadGraphicsParser.add_argument('--clear', action='store_true', help='Delete every graphic stored in the printer first')
+    uploadGraphicsParser.add_argument('--profile', help=f'File to save the stored graphics to (default: $PWD/{DEFAULT_PROFILE_PATH})')
+    uploadGraphicsParser.add_argument('--dry-run', action='store_true', help='Only list the graphics that would be uploaded')
+    uploadGraphicsParser.set_defaults(func=uploadGraphics)
+
+    # generate-corpus
+    generateCorpusParser = subparsers.add_parser('generate-corpus', help='Generate a reproducible library of random zines, to benchmark and test the zine machine at scale', parents=[commonParser])
+    generateCorpusParser.add_argument('dir', help='Directory to generate the library in. Must not exist or be empty')
+    generateCorpusParser.add_argument('--seed', type=int, default=0, help='The same seed and options always generate the same library (default: %(default)s)')
+    generateCorpusParser.add_argument('--zines', type=int, default=100, help='Number of zines (default: %(default)s)')
+    generateCorpusParser.add_argument('--categories', type=int, default=4, help='Number of category directories (default: %(default)s)')
+    generateCorpusParser.add_argument('--median-size-kb', type=float, default=4.0, help='Median zine size. Sizes are log-normally distributed (default: %(default)s)')
+    generateCorpusParser.add_argument('--max-size-kb', type=int, default=1024, help='Largest zine (default: %(default)s, the largest zine that is printed whole)')
+    generateCorpusParser.add_argument('--markup-density', type=float, default=0.1, help='Fraction of sentences wrapped in <b>, <u> or <invert>, and of paragraphs with an <h1> heading (default: %(default)s)')
+    generateCorpusParser.add_argument('--nesting-depth', type=int, default=2, help='Deepest nesting of markup tags (default: %(default)s)')
+    generateCorpusParser.add_argument('--images', type=int, default=8, help='Number of distinct images shared by the zines (default: %(default)s)')
+    generateCorpusParser.add_argument('--images-per-zine', type=float, default=0.5, help='Average number of images in a zine (default: %(default)s)')
+    generateCorpusParser.add_argument('--image-width', type=int, nargs=2, default=[64, 576], metavar=('MIN', 'MAX'), help='Range of image widths in pixels (default: %(default)s)')
+    generateCorpusParser.add_argument('--non-ascii', type=float, default=0.02, help='Fraction of words with accents, smart quotes and other transliterated characters (default: %(default)s)')
+    generateCorpusParser.add_argument('--malformed', type=float, default=0.05, help=f'Fraction of zines broken in one of these ways: {", ".join(malformations)} (default: %(default)s)')
+    generateCorpusParser.set_defaults(func=generateCorpus)
+
 
     if len(sys.argv) < 2:
         parser.print_help()
@@ -161,7 +511,13 @@ if __name__ == "__main__":
 
     args = parser.parse_args(sys.argv)
 
-    args.func(args)
+    setupLogging(args.log_level, args.log_format)
+    profiler = initProfiler(args)
+    if profiler is not None and args.func is not serveZines:
+        with profiler.capture(args.func.__name__):
+            args.func(args)
+    else:
+        args.func(args)
     exit(0)
 
 
@@ -1,33 +1,33 @@
-import sys
+import logging
 import time
-from escpos.printer import Serial
+from threading import RLock
 from serial.serialutil import SerialException
+from .bufferedserial import BufferedSerial
+from .profile import defaultSerialSettings
+
+logger = logging.getLogger(__name__)
 
 class BluetoothPrinterManager:
     """ Implements the PrinterManager interface"""
-    def __init__(self, profile):
+    def __init__(self, profile, devfile=None):
+        """
+        the serial connection is configured by the 'serial' settings in the profile (see profile.defaultSerialSettings). use the bench-link command to find the best settings for a printer
+        devfile -- serial device of the printer, instead of the profile's, e.g. /dev/rfcomm1 for a second printer
+        """
         self.printerType = 'bluetooth-serial'
         self.profile = profile
         self.online = False
-        # 9600 Baud, 8N1, Flow Control Enabled
-        self.printer = Serial(
-            profile=profile,
-            devfile='/dev/rfcomm0',
-            baudrate=9600,
-            bytesize=8,
-            parity='N',
-            stopbits=1,
-            timeout=1,
-            dsrdtr=True)
-
-    def connect(self, retries, timeout):
+        self.deviceLock = RLock()
+        """held while sending data to the printer, so health checks don't interleave with a print"""
+        self.serialSettings = {**defaultSerialSettings, **profile.profile_data.get('serial', {}), **({'devfile': devfile} if devfile is not None else {})}
+        self.printer = BufferedSerial(profile=profile, **self.serialSettings)
+
+    def connect(self, retries=3, timeout=5.0):
         """
         tries to check if the printer is online.
         the printer is considered offline if it is not ready to print or there is no paper.
 
-        this relies on the serial connection already being established. if we can't connect to the printer at all the library throws an exception. then we should crash and let systemd restart the process.
-
-        trying to recreate the serial connection in code is really slow because the library already handles trying to resend the data, so we don't bother
+        this relies on the serial connection already being established. if the connection drops later, the ConnectionSupervisor reopens it with reopen()
 
         retries - number of times to retry connection
         timeout - seconds to wait between retries
@@ -43,11 +43,27 @@ class BluetoothPrinterManager:
                     self.online = True
                     return True
 
-                print("Printer offline. Retrying in {}s... ({}/{})".format(timeout, i, retries))
-                sys.stdout.flush()
+                logger.warning(f"Printer offline. Retrying in {timeout}s... ({i}/{retries})")
                 time.sleep(timeout)
         except SerialException as err:
-            print("Failed to connect to printer via Serial connection: {}".format(str(err)))
+            logger.error(f"Failed to connect to printer via Serial connection: {err}")
 
         self.online = False
         return False
+
+    def checkOnline(self):
+        """cheap health check: a single status query. returns False if the printer doesn't respond or the link is down"""
+        try:
+            self.online = self.printer.is_online()
+        except OSError:
+            self.online = False
+        return self.online
+
+    def reopen(self):
+        """reopen the serial device in place. returns False if the device could not be opened"""
+        try:
+            self.printer.open()
+            return True
+        except (OSError, ValueError) as err:
+            logger.warning(f"Failed to reopen serial device '{self.serialSettings['devfile']}': {err}")
+            return False
@@ -0,0 +1,134 @@
+import time
+from escpos.printer import Serial
+from .codepageencoder import PlannedMagicEncode
+
+
+class SerialWriteBuffer(object):
+    """
+    Wraps a pyserial device and coalesces writes into chunks of chunkSize bytes.
+
+    escpos sends every text run, style change and image fragment as its own small write. Over the bluetooth serial link each write is a syscall and usually its own RFCOMM frame, so the buffer collects commands in a bytearray and only writes to the device when a full chunk is available.
+    Large writes (e.g. raster images) are sent straight from a memoryview of the caller's data in chunkSize slices, without being copied into the buffer.
+
+    Partial chunks are only written at explicit sync points:
+     - flush()
+     - read(), so status queries are sent before we wait for the response
+     - close()
+
+    chunkSize should be small enough that a single write does not block for long when the printer asserts DSR/DTR flow control.
+
+    stats -- bytes and writes sent to the device since the last call to resetStats()
+    """
+
+    def __init__(self, device, chunkSize=256):
+        if chunkSize < 1:
+            raise ValueError(f"chunkSize must be at least 1, got {chunkSize}")
+
+        self.device = device
+        self.chunkSize = chunkSize
+        self.buffer = bytearray()
+        self.resetStats()
+
+    def __getattr__(self, name):
+        # anything we don't buffer is passed through to the serial device (is_open, timeout, in_waiting, etc.)
+        return getattr(self.device, name)
+
+    def write(self, data):
+        view = memoryview(data).cast('B')
+        length = len(view)
+
+        if len(self.buffer) > 0:
+            # top up the pending chunk first
+            fill = self.chunkSize - len(self.buffer)
+            self.buffer += view[:fill]
+            view = view[fill:]
+            if len(self.buffer) < self.chunkSize:
+                return length
+
+            self.writeDevice(self.buffer)
+            self.buffer.clear()
+
+        wholeChunks = len(view) - (len(view) % self.chunkSize)
+        for i in range(0, wholeChunks, self.chunkSize):
+            self.writeDevice(view[i:i + self.chunkSize])
+
+        self.buffer += view[wholeChunks:]
+        return length
+
+    def writeDevice(self, data):
+        startTime = time.perf_counter()
+        self.device.write(data)
+        self.stats['writeTime'] += time.perf_counter() - startTime
+        self.stats['bytes'] += len(data)
+        self.stats['writes'] += 1
+
+    def flush(self):
+        """write any partial chunk and wait for the device to finish transmitting"""
+        if len(self.buffer) > 0:
+            self.writeDevice(self.buffer)
+            self.buffer.clear()
+
+        startTime = time.perf_counter()
+        self.device.flush()
+        self.stats['writeTime'] += time.perf_counter() - startTime
+        self.stats['flushes'] += 1
+
+    def discard(self):
+        """drop anything that hasn't been written to the device yet. returns the number of bytes discarded"""
+        discarded = len(self.buffer)
+        self.buffer.clear()
+        return discarded
+
+    def read(self, size=1):
+        self.flush()
+        return self.device.read(size)
+
+    def close(self):
+        if self.device.is_open:
+            self.flush()
+        self.device.close()
+
+    def resetStats(self):
+        self.stats = {
+            'bytes': 0,
+            'writes': 0,
+            'flushes': 0,
+            'writeTime': 0.0,
+        }
+
+    def bytesPerSecond(self):
+        """average throughput of the device while we were blocked on writes or flushes"""
+        if self.stats['writeTime'] == 0.0:
+            return 0.0
+        return self.stats['bytes'] / self.stats['writeTime']
+
+
+class BufferedSerial(Serial):
+    """
+    escpos Serial printer that sends all commands through a SerialWriteBuffer, and encodes text with a precomputed CodepagePlan.
+    Call printer.device.flush() to send everything that has been buffered.
+    """
+
+    def __init__(self, *args, chunkSize=256, **kwargs):
+        self.chunkSize = chunkSize
+        super().__init__(*args, **kwargs)
+        self.magic = PlannedMagicEncode(self)
+
+    def open(self):
+        """open the serial device. if it is already open (e.g. reconnecting after the link dropped), anything still buffered for the old connection is discarded"""
+        if self.device is not None:
+            self.device.discard()
+            try:
+                self.device.close()
+            except OSError:
+                pass
+            self.device = None
+
+        super().open()
+        self.device = SerialWriteBuffer(self.device, self.chunkSize)
+
+    def query_status(self, mode):
+        # the status request must go out immediately, and the response is a single byte, so we return as soon as it arrives instead of sleeping for the full timeout
+        self._raw(mode)
+        self.device.flush()
+        return self.device.read(1)
@@ -0,0 +1,131 @@
+import re
+from typing import Dict, List, Tuple
+from escpos.magicencode import MagicEncode, Encoder
+from escpos.constants import CODEPAGE_CHANGE
+
+
+class CodepagePlan(object):
+    """
+    Encoding tables compiled once from a printer profile's codepages.
+
+    escpos's MagicEncode checks every character against every codepage as it is printed. With a plan, that work is done up front:
+     - tables -- {codepage: str.translate table}, maps each encodable non-ASCII character to its byte in the codepage
+     - runPatterns -- {codepage: regex}, matches the longest run of characters the codepage can encode
+     - unencodablePattern -- matches any character no codepage can encode
+
+    Use CodepagePlan.fromProfile to share one plan between all printers with the same codepages.
+    """
+
+    cache: Dict[Tuple, 'CodepagePlan'] = {}
+
+    def __init__(self, codepages: Dict[str, str]):
+        """codepages -- {name: slot}, as returned by profile.get_code_pages()"""
+        self.codepages = {}
+        self.tables = {}
+        self.runPatterns = {}
+        self.characters = {}
+
+        allCharacters = set()
+        for name, slot in codepages.items():
+            try:
+                charList = Encoder._get_codepage_char_list(name)
+            except LookupError:
+                # escpos doesn't know the characters in this codepage, so it can't use it either
+                continue
+
+            table = {}
+            for i, char in enumerate(charList):
+                # ASCII is always encoded as itself. like escpos, if a character appears twice the last byte wins
+                if ord(char) < 128:
+                    continue
+                table[ord(char)] = i + 128
+
+            self.codepages[name] = slot
+            self.tables[name] = table
+            self.characters[name] = frozenset(chr(c) for c in table.keys())
+            self.runPatterns[name] = re.compile('[\\x00-\\x7f' + CodepagePlan.charClass(self.characters[name]) + ']+')
+            allCharacters |= self.characters[name]
+
+        self.printableCharacters = frozenset(allCharacters)
+        self.unencodablePattern = re.compile('[^\\x00-\\x7f' + CodepagePlan.charClass(allCharacters) + ']')
+
+    @staticmethod
+    def charClass(characters):
+        return ''.join(re.escape(c) for c in sorted(characters))
+
+    @staticmethod
+    def fromProfile(profile):
+        codepages = profile.get_code_pages()
+        key = tuple(sorted(codepages.items()))
+        plan = CodepagePlan.cache.get(key)
+        if plan is None:
+            plan = CodepagePlan(codepages)
+            CodepagePlan.cache[key] = plan
+        return plan
+
+    def runLength(self, encoding, text, pos):
+        """length of the run starting at pos that can be encoded with encoding"""
+        match = self.runPatterns[encoding].match(text, pos)
+        return match.end() - pos if match else 0
+
+    def encode(self, encoding, text) -> bytes:
+        """encode text that is entirely encodable with encoding"""
+        return text.translate(self.tables[encoding]).encode('latin-1')
+
+    def segment(self, text, encoding=None, usedEncodings=None) -> List[Tuple[str, str]]:
+        """
+        split text into (encoding, run) segments, starting with the given current encoding.
+        stays in the current codepage for as long as possible, and when a switch is needed, picks the codepage that encodes the longest run from that point, which minimizes the number of switches.
+        ties are broken in the same order as escpos (unused codepages first, then by slot), so text escpos encodes without a choice (e.g. anything CP437 can print) produces identical output.
+        characters that can't be encoded in any codepage must be replaced first (see unencodablePattern)
+        """
+        if usedEncodings is None:
+            usedEncodings = set()
+
+        segments = []
+        pos = 0
+        while pos < len(text):
+            length = self.runLength(encoding, text, pos) if encoding is not None else 0
+            if length == 0:
+                candidates = sorted(self.codepages.items(), key=lambda item: (item[0] in usedEncodings, item[1]))
+                bestLength = 0
+                for name, _ in candidates:
+                    candidateLength = self.runLength(name, text, pos)
+                    if candidateLength > bestLength:
+                        encoding = name
+                        bestLength = candidateLength
+
+                if bestLength == 0:
+                    raise ValueError(f"Character '{text[pos]}' can't be encoded by any codepage")
+
+                usedEncodings.add(encoding)
+                length = bestLength
+
+            segments.append((encoding, text[pos:pos + length]))
+            pos += length
+
+        return segments
+
+
+class PlannedMagicEncode(MagicEncode):
+    """
+    Drop-in replacement for escpos's MagicEncode (printer.magic) that encodes with a precomputed CodepagePlan.
+    Text is split into codepage runs with a few regex matches, and each run is encoded with a single str.translate, instead of checking every character against every codepage.
+    """
+
+    def __init__(self, driver, plan=None, **kwargs):
+        super().__init__(driver, **kwargs)
+        self.plan = plan if plan is not None else CodepagePlan.fromProfile(driver.profile)
+
+    def write(self, text):
+        if self.disabled:
+            super().write(text)
+            return
+
+        text = self.plan.unencodablePattern.sub(self.defaultsymbol, str(text))
+        for encoding, run in self.plan.segment(text, self.encoding, self.encoder.used_encodings):
+            if encoding != self.encoding:
+                self.encoding = encoding
+                self.driver._raw(CODEPAGE_CHANGE + bytes([self.encoder.get_sequence(encoding)]))
+
+            self.driver._raw(self.plan.encode(encoding, run))
@@ -0,0 +1,143 @@
+import logging
+import time
+from threading import Thread, Event, Lock
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionSupervisor(object):
+    """
+    Monitors the printer connection on a background thread, and reopens the serial device in place when the link drops.
+
+    While the printer is online, a cheap health check (a single status query, see PrinterManager.checkOnline) runs every checkInterval seconds. Checks are skipped while a print job holds the printerManager's deviceLock--if the link drops mid-print, the job calls reportOffline itself.
+    While the printer is offline, we try to reopen the device, waiting reconnectInterval seconds between attempts, doubling up to maxReconnectInterval.
+    Print jobs call waitUntilOnline to hold until the link returns.
+
+    The printerManager must implement:
+        deviceLock -- lock held while sending data to the printer
+        checkOnline() -> bool
+        reopen() -> bool
+
+    metrics:
+        checks -- number of health checks
+        checkFailures -- health checks that found the printer offline
+        disconnects -- number of times the printer went offline
+        reconnects -- number of times the printer came back online
+        reconnectFailures -- failed reconnect attempts
+        lastReconnectSeconds -- how long the printer was offline the last time it reconnected
+        totalDowntimeSeconds -- total time spent offline, not including the current outage
+    """
+
+    def __init__(self, printerManager, checkInterval=10.0, reconnectInterval=1.0, maxReconnectInterval=30.0):
+        self.printerManager = printerManager
+        self.checkInterval = checkInterval
+        self.reconnectInterval = reconnectInterval
+        self.maxReconnectInterval = maxReconnectInterval
+
+        self.onlineEvent = Event()
+        if printerManager.online:
+            self.onlineEvent.set()
+
+        self.stopEvent = Event()
+        self.thread = None
+        self.offlineSince = None if printerManager.online else time.monotonic()
+        self.metricsLock = Lock()
+        self.metrics = {
+            'checks': 0,
+            'checkFailures': 0,
+            'disconnects': 0,
+            'reconnects': 0,
+            'reconnectFailures': 0,
+            'lastReconnectSeconds': None,
+            'totalDowntimeSeconds': 0.0,
+        }
+
+    def start(self):
+        self.stopEvent.clear()
+        self.thread = Thread(target=self.run, name='ConnectionSupervisor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            if self.onlineEvent.is_set():
+                if self.stopEvent.wait(self.checkInterval):
+                    return
+                self.check()
+            else:
+                self.reconnect()
+
+    @property
+    def online(self):
+        return self.onlineEvent.is_set()
+
+    def waitUntilOnline(self, timeout=None):
+        """block until the printer is online. returns False if the timeout expired first"""
+        return self.onlineEvent.wait(timeout)
+
+    def check(self):
+        if not self.printerManager.deviceLock.acquire(blocking=False):
+            # a print job is using the printer
+            return
+
+        try:
+            online = self.printerManager.checkOnline()
+        finally:
+            self.printerManager.deviceLock.release()
+
+        with self.metricsLock:
+            self.metrics['checks'] += 1
+            if not online:
+                self.metrics['checkFailures'] += 1
+
+        if not online:
+            self.reportOffline()
+
+    def reportOffline(self, reason=None):
+        """mark the printer offline and start reconnecting. called by the health check, or by a print job that lost the connection"""
+        with self.metricsLock:
+            if not self.onlineEvent.is_set():
+                return
+
+            self.onlineEvent.clear()
+            self.offlineSince = time.monotonic()
+            self.metrics['disconnects'] += 1
+
+        logger.warning(f"Printer offline{': ' + str(reason) if reason else ''}. Reconnecting...")
+
+    def reconnect(self):
+        interval = self.reconnectInterval
+        while not self.stopEvent.is_set():
+            with self.printerManager.deviceLock:
+                online = self.printerManager.reopen() and self.printerManager.checkOnline()
+
+            if online:
+                with self.metricsLock:
+                    downtime = time.monotonic() - self.offlineSince if self.offlineSince is not None else 0.0
+                    self.metrics['reconnects'] += 1
+                    self.metrics['lastReconnectSeconds'] = downtime
+                    self.metrics['totalDowntimeSeconds'] += downtime
+                    self.offlineSince = None
+                    self.onlineEvent.set()
+
+                logger.info(f"Printer reconnected after {downtime:.1f}s", extra={'seconds': downtime})
+                return
+
+            with self.metricsLock:
+                self.metrics['reconnectFailures'] += 1
+
+            if self.stopEvent.wait(interval):
+                return
+            interval = min(interval * 2, self.maxReconnectInterval)
+
+    def getMetrics(self):
+        with self.metricsLock:
+            metrics = dict(self.metrics)
+            metrics['online'] = self.onlineEvent.is_set()
+            metrics['currentDowntimeSeconds'] = time.monotonic() - self.offlineSince if self.offlineSince is not None else 0.0
+            return metrics
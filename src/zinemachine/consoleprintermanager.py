@@ -1,3 +1,4 @@
+from threading import RLock
 from .consoleprinter import ConsolePrinter
 
 class ConsolePrinterManager(object):
@@ -6,6 +7,13 @@ class ConsolePrinterManager(object):
         self.printerType = 'console'
         self.printer = ConsolePrinter()
         self.online = True
+        self.deviceLock = RLock()
 
-    def connect(self):
+    def connect(self, retries=0, timeout=0.0):
+        return True
+
+    def checkOnline(self):
+        return True
+
+    def reopen(self):
         return True
@@ -0,0 +1,245 @@
+import json
+import math
+import os
+import random
+from typing import Dict, Optional
+
+from PIL import Image, ImageDraw
+
+words = (
+    "the a and of to in is it that for on with as was at by from this be are or not but have an they which you one all were we there "
+    "when can more what about out their if who so up said some would them into time will other no like then these do its two been "
+    "zine print paper press machine receipt page story letter ink hand cut paste fold copy share free read write street city people "
+    "community mutual aid garden seed water bread soil repair mend tool bike fire river winter summer night morning together power "
+    "collective house kitchen food market book library school work rest song dance friend neighbor struggle change future history"
+).split()
+"""plain ASCII vocabulary of the generated text"""
+
+nonAsciiWords = (
+    "café naïve façade jalapeño Größe coöperate “quoted” ‘single’ em—dash en–dash wait… œuvre Ærø smörgåsbord ½ ± 20°C £5 ¿qué? ¡olé! "
+    "résumé déjà señor Ñandú Übermut Ångström Mañana"
+).split()
+"""words the printer can print, or that are transliterated to printable text"""
+
+unprintableWords = "漢字 ひらがな 한국어 🙂 🖨️ ☃".split()
+"""words with characters that have no printable replacement"""
+
+markupTags = ['b', 'u', 'invert']
+"""inline tags used for markup. headings use h1"""
+
+malformations = ['mismatched-tag', 'unknown-tag', 'stray-closing-tag', 'image-without-src', 'missing-image', 'bad-header', 'unprintable', 'oversized']
+"""
+ways a generated zine can be broken. every kind but oversized is reported as an error by the validator.
+oversized zines are larger than maxFileSizeKb, so only the beginning of them is printed
+"""
+
+
+class CorpusGenerator(object):
+    """
+    Generates reproducible zine libraries of any size, for benchmarks and scale tests.
+    The same settings and seed always generate the same files. Each zine is generated from its own seed, so adding zines keeps the zines that were already generated.
+
+    The library has the layout the zine machine expects: category directories of .zine files. Images are shared by every zine, from the hidden .images directory.
+    A manifest of the settings and every malformed zine is saved to .corpus.json. Hidden files are ignored by the zine machine.
+
+    seed -- seed for everything generated
+    categories -- number of category directories
+    zines -- number of zines, spread evenly over the categories
+    medianSizeKb -- median size of a zine's text. sizes are log-normally distributed, like a real library, and never larger than maxFileSizeKb
+    maxFileSizeKb -- largest zine, see Zine.maxFileSizeKb
+    markupDensity -- fraction of sentences that are wrapped in a markup tag (<b>, <u>, <invert>). paragraphs start with an <h1> heading at the same rate
+    nestingDepth -- deepest nesting of markup tags. each wrapped sentence may wrap part of itself in another tag, up to this depth
+    images -- number of distinct images
+    imagesPerZine -- average number of images in a zine
+    imageWidths -- (smallest, largest) image width in pixels. images wider than the printer (576) are reported by the validator
+    nonAsciiRatio -- fraction of words with characters outside ASCII, which are printable or transliterated (accents, smart quotes, dashes, ...)
+    malformedRatio -- fraction of zines that are broken in one of the malformations
+    """
+
+    def __init__(self, seed=0, categories=4, zines=100, medianSizeKb=4.0, maxFileSizeKb=1024, markupDensity=0.1, nestingDepth=2,
+                 images=8, imagesPerZine=0.5, imageWidths=(64, 576), nonAsciiRatio=0.02, malformedRatio=0.05):
+        if categories < 1:
+            raise ValueError(f"categories must be at least 1, got {categories}")
+        if medianSizeKb <= 0 or maxFileSizeKb <= 0:
+            raise ValueError("medianSizeKb and maxFileSizeKb must be positive")
+
+        self.seed = seed
+        self.categories = categories
+        self.zines = zines
+        self.medianSizeKb = medianSizeKb
+        self.maxFileSizeKb = maxFileSizeKb
+        self.markupDensity = markupDensity
+        self.nestingDepth = nestingDepth
+        self.images = images
+        self.imagesPerZine = imagesPerZine
+        self.imageWidths = imageWidths
+        self.nonAsciiRatio = nonAsciiRatio
+        self.malformedRatio = malformedRatio
+
+    def settings(self) -> dict:
+        return {
+            'seed': self.seed,
+            'categories': self.categories,
+            'zines': self.zines,
+            'medianSizeKb': self.medianSizeKb,
+            'maxFileSizeKb': self.maxFileSizeKb,
+            'markupDensity': self.markupDensity,
+            'nestingDepth': self.nestingDepth,
+            'images': self.images,
+            'imagesPerZine': self.imagesPerZine,
+            'imageWidths': list(self.imageWidths),
+            'nonAsciiRatio': self.nonAsciiRatio,
+            'malformedRatio': self.malformedRatio,
+        }
+
+    def generate(self, path) -> dict:
+        """
+        generate the library in path, which must not exist or be empty. returns the manifest saved to .corpus.json:
+            settings -- the generator settings
+            zines, bytes -- number and total size of the zines
+            malformed -- {zine path: malformation}, relative to path
+        """
+        if os.path.exists(path) and len(os.listdir(path)) > 0:
+            raise ValueError(f"'{path}' is not empty. Corpora are only generated into a new directory")
+
+        imageDir = os.path.join(path, '.images')
+        os.makedirs(imageDir, exist_ok=True)
+        imageNames = []
+        for i in range(self.images):
+            name = f"image-{i}.png"
+            self.image(random.Random(f"{self.seed}:image:{i}")).save(os.path.join(imageDir, name))
+            imageNames.append(name)
+
+        categoryNames = [f"category-{i}" for i in range(self.categories)]
+        for category in categoryNames:
+            os.makedirs(os.path.join(path, category), exist_ok=True)
+
+        manifest = {'settings': self.settings(), 'zines': self.zines, 'bytes': 0, 'malformed': {}}
+        for i in range(self.zines):
+            rng = random.Random(f"{self.seed}:zine:{i}")
+            relativePath = os.path.join(categoryNames[i % self.categories], f"zine-{i}.zine")
+            malformation = rng.choice(malformations) if rng.random() < self.malformedRatio else None
+            text = self.zine(rng, i, imageNames, malformation)
+            with open(os.path.join(path, relativePath), 'w', encoding='utf-8') as f:
+                f.write(text)
+
+            manifest['bytes'] += len(text.encode('utf-8'))
+            if malformation is not None:
+                manifest['malformed'][relativePath] = malformation
+
+        with open(os.path.join(path, '.corpus.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def zine(self, rng, index, imageNames, malformation: Optional[str]=None) -> str:
+        """the text of a zine file, header included"""
+        header = ['-----']
+        if malformation != 'bad-header':
+            header.append(f"Title: {self.sentence(rng, 2, 6).rstrip('.')}")
+        else:
+            header.append(f"Title {self.sentence(rng, 2, 6).rstrip('.')}")
+        header += [
+            f"Author: {' '.join(rng.choices(words, k=2)).title()}",
+            f"Description: {self.sentence(rng, 5, 12)}",
+            f"Date Published: {2000 + rng.randrange(25)}-{1 + rng.randrange(12):02}-{1 + rng.randrange(28):02}",
+            f"URL: https://example.com/zines/{index}",
+            '-----',
+        ]
+
+        # log-normal sizes: most zines are small, a few are much larger
+        size = min(self.maxFileSizeKb * 1000, max(200, int(rng.lognormvariate(math.log(self.medianSizeKb * 1000), 1.0))))
+        if malformation == 'oversized':
+            size = self.maxFileSizeKb * 1000 + 1000
+
+        imageCount = self.imageCount(rng) if len(imageNames) > 0 else 0
+        imagePositions = sorted(rng.random() for _ in range(imageCount))
+
+        paragraphs = []
+        length = 0
+        while length < size:
+            if len(imagePositions) > 0 and imagePositions[0] <= length / size:
+                imagePositions.pop(0)
+                paragraph = f'<img src="../.images/{rng.choice(imageNames)}">{self.sentence(rng, 2, 8)}</img>'
+            else:
+                paragraph = self.paragraph(rng)
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+
+        if malformation is not None and malformation != 'oversized':
+            position = rng.randrange(len(paragraphs))
+            paragraphs[position] = self.malformed(rng, malformation, paragraphs[position])
+
+        return '\n'.join(header) + '\n' + '\n\n'.join(paragraphs) + '\n'
+
+    def imageCount(self, rng) -> int:
+        # poisson distributed, so most zines have none or a few
+        count = 0
+        threshold = math.exp(-self.imagesPerZine)
+        p = rng.random()
+        while p > threshold:
+            count += 1
+            p *= rng.random()
+        return count
+
+    def paragraph(self, rng) -> str:
+        sentences = [self.markupSentence(rng, 0) for _ in range(rng.randint(2, 8))]
+        paragraph = ' '.join(sentences)
+        if rng.random() < self.markupDensity:
+            paragraph = f"<h1>{self.sentence(rng, 1, 4).rstrip('.')}</h1>\n" + paragraph
+        return paragraph
+
+    def markupSentence(self, rng, depth) -> str:
+        sentence = self.sentence(rng, 4, 18)
+        if depth >= self.nestingDepth or rng.random() >= self.markupDensity:
+            return sentence
+
+        tag = rng.choice(markupTags)
+        # nest another tag around part of the sentence
+        inner = self.markupSentence(rng, depth + 1) if depth + 1 < self.nestingDepth and rng.random() < 0.5 else ''
+        return f"<{tag}>{sentence}{' ' + inner if inner else ''}</{tag}>"
+
+    def sentence(self, rng, minWords, maxWords) -> str:
+        chosen = rng.choices(words, k=rng.randint(minWords, maxWords))
+        if self.nonAsciiRatio > 0:
+            for i in range(len(chosen)):
+                if rng.random() < self.nonAsciiRatio:
+                    chosen[i] = rng.choice(nonAsciiWords)
+        return ' '.join(chosen).capitalize() + '.'
+
+    def malformed(self, rng, malformation, paragraph) -> str:
+        """break a paragraph"""
+        sentence = self.sentence(rng, 3, 8)
+        if malformation == 'mismatched-tag':
+            return paragraph + f" <b>{sentence} <u>{sentence}</b> {sentence}</u>"
+        if malformation == 'unknown-tag':
+            return paragraph + f" <blink>{sentence}</blink>"
+        if malformation == 'stray-closing-tag':
+            return paragraph + f" {sentence}</u>"
+        if malformation == 'image-without-src':
+            return paragraph + f"\n<img>{sentence}</img>"
+        if malformation == 'missing-image':
+            return paragraph + f'\n<img src="../.images/missing.png">{sentence}</img>'
+        if malformation == 'unprintable':
+            return paragraph + f" {rng.choice(unprintableWords)} {sentence}"
+        return paragraph
+
+    def image(self, rng) -> Image.Image:
+        """a greyscale image of gradients and shapes, so it dithers like a photo"""
+        width = rng.randint(*self.imageWidths)
+        height = max(1, int(width * rng.uniform(0.5, 1.5)))
+        image = Image.linear_gradient('L').resize((width, height)).rotate(rng.choice([0, 90, 180, 270]), expand=False)
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(2, 8)):
+            x, y = rng.randrange(width), rng.randrange(height)
+            radius = rng.randint(4, max(5, width // 4))
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=rng.randrange(256))
+        return image
+
+
+def loadManifest(path) -> Optional[Dict]:
+    """the manifest of a generated corpus, or None if path isn't one"""
+    try:
+        with open(os.path.join(path, '.corpus.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,158 @@
+import logging
+import queue
+import time
+from threading import Condition, Thread
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PrinterWorker(object):
+    """
+    One printer of a ZineMachine with several printers. Print jobs are queued and printed one at a time, in order, on the worker's thread.
+
+    name -- the printer's name in logs, e.g. 'printer-2'
+    printerManager -- see PrinterManager, e.g. BluetoothPrinterManager, EmulatedPrinterManager or NetworkPrinterManager
+    categories -- categories pinned to this printer, see Dispatcher. empty if the printer prints any category
+    supervisor -- ConnectionSupervisor of the printer, started by ZineMachine.initPrinter
+    pending -- jobs queued or printing
+    idleSince -- time.monotonic() when the printer last finished a job
+    jobs, failed -- jobs printed, and jobs that raised an exception
+    """
+
+    def __init__(self, name, printerManager, categories: Iterable[str]=()):
+        self.name = name
+        self.printerManager = printerManager
+        self.categories = set(categories)
+        self.supervisor = None
+        self.condition = Condition()
+        self.queue = queue.Queue()
+        self.thread = None
+        self.pending = 0
+        self.idleSince = time.monotonic()
+        self.jobs = 0
+        self.failed = 0
+
+    @property
+    def online(self):
+        return self.supervisor.online if self.supervisor is not None else self.printerManager.online
+
+    def submit(self, job: Callable[['PrinterWorker'], None]):
+        """queue job(worker) to be printed after the jobs already queued. starts the worker's thread if it isn't running"""
+        with self.condition:
+            self.pending += 1
+        if self.thread is None:
+            self.start()
+        self.queue.put(job)
+
+    def start(self):
+        self.thread = Thread(target=self.run, name=f"PrinterWorker-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stop the thread after the queued jobs are printed"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+
+            try:
+                job(self)
+                self.jobs += 1
+            except Exception as err:
+                # the job logs its own errors
+                logger.debug(f"Job failed on printer '{self.name}': {err}", extra={'printer': self.name})
+                self.failed += 1
+            finally:
+                with self.condition:
+                    self.pending -= 1
+                    self.idleSince = time.monotonic()
+                    self.condition.notify_all()
+
+    def getMetrics(self):
+        metrics = {
+            'name': self.name,
+            'printerType': self.printerManager.printerType,
+            'categories': sorted(self.categories),
+            'online': self.online,
+            'pending': self.pending,
+            'jobs': self.jobs,
+            'failed': self.failed,
+        }
+        if self.supervisor is not None:
+            metrics['supervisor'] = self.supervisor.getMetrics()
+        return metrics
+
+
+class Dispatcher(object):
+    """
+    Routes print jobs to the printers of a ZineMachine.
+
+    A job goes to the online printer with the fewest jobs pending, then to the printer that has been idle the longest, so the printers wear evenly.
+    Categories can be pinned to printers (see PrinterWorker.categories): a job in a pinned category only goes to the printers it is pinned to, and a printer with pinned categories only prints those,
+    unless every printer has pinned categories.
+
+    workers -- the printers, see PrinterWorker
+    maxPending -- jobs a printer can have pending. a job is rejected when every printer that could print it is full, so button presses don't pile up
+    """
+
+    def __init__(self, workers: Optional[List[PrinterWorker]]=None, maxPending=2):
+        self.workers = workers if workers is not None else []
+        self.maxPending = maxPending
+        self.condition = Condition()
+
+    def add(self, worker: PrinterWorker):
+        # every worker notifies the dispatcher's condition, so dispatch(wait=True) wakes up when any printer finishes a job
+        worker.condition = self.condition
+        self.workers.append(worker)
+
+    def candidates(self, category=None) -> List[PrinterWorker]:
+        """the printers that can print a job in category"""
+        pinned = [worker for worker in self.workers if category in worker.categories]
+        if len(pinned) > 0:
+            return pinned
+        unpinned = [worker for worker in self.workers if len(worker.categories) == 0]
+        return unpinned if len(unpinned) > 0 else list(self.workers)
+
+    def choose(self, category=None, maxPending=None) -> Optional[PrinterWorker]:
+        """the printer the next job in category goes to, or None if every candidate has maxPending jobs pending"""
+        candidates = self.candidates(category)
+        # an offline printer holds its jobs until it reconnects, so it only gets jobs when none of the printers that could print them are online
+        online = [worker for worker in candidates if worker.online]
+        available = [worker for worker in (online if len(online) > 0 else candidates) if maxPending is None or worker.pending < maxPending]
+        if len(available) == 0:
+            return None
+        return min(available, key=lambda worker: (worker.pending, worker.idleSince))
+
+    def dispatch(self, category=None, job=None, wait=False) -> Optional[PrinterWorker]:
+        """
+        queue job(worker) on the printer chosen for category. returns the printer, or None if the job was rejected because every printer that could print it is full
+        wait -- wait until a printer can take the job instead of rejecting it
+        without a job, the chosen printer is returned for the caller to submit to while it holds condition
+        """
+        with self.condition:
+            worker = self.choose(category, self.maxPending)
+            while worker is None and wait:
+                self.condition.wait()
+                worker = self.choose(category, self.maxPending)
+            if worker is None:
+                return None
+            if job is not None:
+                worker.submit(job)
+            return worker
+
+    def join(self):
+        """wait until every printer has printed all of its jobs"""
+        with self.condition:
+            while any(worker.pending > 0 for worker in self.workers):
+                self.condition.wait()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
@@ -0,0 +1,345 @@
+import math
+import time
+from collections import deque
+from threading import RLock
+from typing import Optional
+
+from escpos.escpos import Escpos
+from serial.serialutil import SerialException
+
+from .bufferedserial import SerialWriteBuffer
+from .codepageencoder import PlannedMagicEncode
+from .linkbenchmark import LinkBenchmark, flowControlSettings
+from .profile import LMP201, defaultSerialSettings
+from .raster import mediaWidth
+from .receiptrenderer import ReceiptRenderer
+
+defaultEmulatorSettings = {
+    'bufferSize': 4096,
+    'printSpeed': 60.0,
+    'dotsPerMm': 8,
+    'timeScale': 0.0,
+}
+"""
+print mechanism of the emulated printer: a 4KB receive buffer and 60mm/s at 8 dots/mm, a guess for a cheap bluetooth receipt printer.
+timeScale is how fast the emulator runs against the wall clock: 0 runs as fast as possible, 1 takes as long as the printer would
+"""
+
+
+class PrinterEmulator(object):
+    """
+    Stands in for the printer's serial device (a pyserial Serial), to measure and check what we send without the printer.
+
+    The emulator keeps a simulated clock, so its timings are the same on any machine:
+     - every byte takes 10 bits at baudrate to transmit (8N1)
+     - received bytes wait in a buffer of bufferSize bytes until the print mechanism gets to them
+     - the mechanism prints at printSpeed mm/s: it takes as long as the paper it advances. Commands that don't advance the paper take no time
+     - with DSR/DTR (or XON/XOFF) flow control, writes stall while the buffer is full. Without flow control, bytes that don't fit are dropped, like a real printer would
+     - status requests (DLE EOT n) are answered when the mechanism reaches them, so the answer comes after everything sent before it is printed. Real-time commands are only recognized between commands, never inside e.g. image data
+
+    Everything the mechanism prints is rendered by a ReceiptRenderer, see saveReceipt.
+
+    received -- every byte that was accepted, the exact ESC/POS stream
+    now -- the simulated time in seconds since the emulator was created
+    online, paper -- what status requests report. paper is 'ok', 'low' or 'out'
+    errors -- commands the renderer couldn't parse. the bytes after them are skipped until the next write
+    stats -- see resetStats
+    """
+
+    sliceSize = 64
+    """bytes transmitted, or printed, in one step of the simulation"""
+
+    def __init__(self, profile=None, baudrate=9600, dsrdtr=True, xonxoff=False, timeout=1.0, bufferSize=defaultEmulatorSettings['bufferSize'],
+                 printSpeed=defaultEmulatorSettings['printSpeed'], dotsPerMm=defaultEmulatorSettings['dotsPerMm'], timeScale=defaultEmulatorSettings['timeScale']):
+        if bufferSize < self.sliceSize:
+            raise ValueError(f"bufferSize must be at least {self.sliceSize}, got {bufferSize}")
+
+        profile = profile if profile is not None else LMP201()
+        self.baudrate = baudrate
+        self.dsrdtr = dsrdtr
+        self.xonxoff = xonxoff
+        self.timeout = timeout
+        self.bufferSize = bufferSize
+        self.dotsPerSecond = printSpeed * dotsPerMm
+        self.timeScale = timeScale
+        self.renderer = ReceiptRenderer(width=mediaWidth(profile) or 576, codepages={int(slot): name for slot, name in profile.profile_data['codePages'].items()})
+
+        self.is_open = True
+        self.online = True
+        self.paper = 'ok'
+        self.received = bytearray()
+        self.errors = []
+        self.now = 0.0
+        self.wallStart = time.perf_counter()
+        self.queue = deque()
+        """(arrival time, bytes) received and waiting for the mechanism"""
+        self.buffered = 0
+        self.working = None
+        """(done time, bytes) the mechanism is printing. they stay in the buffer until they are printed"""
+        self.mechanismTime = 0.0
+        self.replies = deque()
+        """(time, bytes) responses to status requests"""
+        self.resetStats()
+
+    def resetStats(self):
+        """
+        bytes -- bytes accepted
+        transmitSeconds -- time spent sending bytes over the link
+        stallSeconds, stalls -- time and number of times writes waited for the buffer to have room
+        printSeconds -- time the mechanism spent advancing the paper
+        droppedBytes -- bytes that didn't fit in the buffer, without flow control
+        statusQueries -- status requests answered
+        """
+        self.stats = {
+            'bytes': 0,
+            'transmitSeconds': 0.0,
+            'stallSeconds': 0.0,
+            'stalls': 0,
+            'printSeconds': 0.0,
+            'droppedBytes': 0,
+            'statusQueries': 0,
+        }
+
+    @property
+    def flowControl(self):
+        return self.dsrdtr or self.xonxoff
+
+    @property
+    def in_waiting(self):
+        self.advance(self.now)
+        return sum(len(reply) for replyTime, reply in self.replies if replyTime <= self.now)
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+
+        view = memoryview(data).cast('B')
+        for i in range(0, len(view), self.sliceSize):
+            self.receive(view[i:i + self.sliceSize])
+        self.pace()
+        return len(view)
+
+    def receive(self, data):
+        if self.flowControl:
+            stallStart = self.now
+            self.advance(self.now)
+            while self.buffered + len(data) > self.bufferSize and self.working is not None:
+                # the printer holds DSR low until the mechanism frees some of the buffer
+                self.now = max(self.now, self.working[0])
+                self.advance(self.now)
+            if self.now > stallStart:
+                self.stats['stallSeconds'] += self.now - stallStart
+                self.stats['stalls'] += 1
+
+        transmitTime = len(data) * 10 / self.baudrate
+        self.now += transmitTime
+        self.stats['transmitSeconds'] += transmitTime
+        self.advance(self.now)
+
+        accepted = data[:max(0, self.bufferSize - self.buffered)]
+        self.stats['droppedBytes'] += len(data) - len(accepted)
+        if len(accepted) > 0:
+            self.received += accepted
+            self.queue.append((self.now, bytes(accepted)))
+            self.buffered += len(accepted)
+            self.stats['bytes'] += len(accepted)
+            self.advance(self.now)
+
+    def advance(self, untilTime):
+        """run the print mechanism until untilTime"""
+        while True:
+            if self.working is not None:
+                doneTime, size = self.working
+                if doneTime > untilTime:
+                    return
+                self.buffered -= size
+                self.working = None
+
+            if len(self.queue) == 0 or self.queue[0][0] > untilTime:
+                return
+
+            arrivalTime, data = self.queue.popleft()
+            startTime = max(self.mechanismTime, arrivalTime)
+            y = self.renderer.y
+            self.render(data)
+            printTime = (self.renderer.y - y) / self.dotsPerSecond
+            self.mechanismTime = startTime + printTime
+            self.stats['printSeconds'] += printTime
+            self.working = (self.mechanismTime, len(data))
+
+            for command in self.renderer.realtimeCommands:
+                if command[1] == 0x04:
+                    self.replies.append((self.mechanismTime, bytes([self.status(command[2])])))
+                    self.stats['statusQueries'] += 1
+            self.renderer.realtimeCommands.clear()
+
+    def render(self, data):
+        try:
+            self.renderer.feed(data)
+        except ValueError as err:
+            self.errors.append(str(err))
+            self.renderer.pending.clear()
+
+    def status(self, n) -> int:
+        """the response to DLE EOT n, see RT_MASK_ONLINE and RT_MASK_PAPER"""
+        if n == 1:
+            return 0x12 if self.online and self.paper != 'out' else 0x1a
+        if n == 2:
+            return 0x12 if self.paper != 'out' else 0x32
+        if n == 4:
+            return {'ok': 0x12, 'low': 0x1e, 'out': 0x72}[self.paper]
+        return 0x12
+
+    def read(self, size=1):
+        """wait for up to size response bytes, until timeout"""
+        response = bytearray()
+        deadline = self.now + self.timeout if self.timeout is not None else math.inf
+        while True:
+            self.advance(self.now)
+            while len(response) < size and len(self.replies) > 0 and self.replies[0][0] <= self.now:
+                response += self.replies.popleft()[1]
+            if len(response) >= size:
+                break
+
+            events = ([self.replies[0][0]] if len(self.replies) > 0 else []) + ([self.working[0]] if self.working is not None else [])
+            if len(events) == 0 or min(events) > deadline:
+                # nothing more is coming before the timeout
+                self.now = max(self.now, deadline) if deadline != math.inf else self.now
+                break
+            self.now = max(self.now, min(events))
+
+        self.pace()
+        return bytes(response)
+
+    def flush(self):
+        # writes are transmitted as they are made, so there is nothing left to wait for
+        self.advance(self.now)
+        self.pace()
+
+    def reset_input_buffer(self):
+        self.advance(self.now)
+        while len(self.replies) > 0 and self.replies[0][0] <= self.now:
+            self.replies.popleft()
+
+    def reset_output_buffer(self):
+        pass
+
+    def waitUntilPrinted(self) -> float:
+        """wait for the mechanism to print everything in the buffer. returns the simulated time it finished"""
+        while self.working is not None or len(self.queue) > 0:
+            self.now = max(self.now, self.working[0] if self.working is not None else self.queue[0][0])
+            self.advance(self.now)
+        self.pace()
+        return self.now
+
+    def pace(self):
+        """with a timeScale, sleep until the wall clock catches up with the simulated time"""
+        if self.timeScale > 0:
+            delay = self.wallStart + self.now * self.timeScale - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def clock(self) -> float:
+        return self.now
+
+    def saveReceipt(self, path):
+        """save everything printed so far as a PNG. nothing is saved if nothing has been printed, e.g. on one of several printers"""
+        if self.renderer.y > 0:
+            self.renderer.toImage().save(path)
+
+
+class EmulatedPrinter(Escpos):
+    """
+    escpos printer connected to a PrinterEmulator through a SerialWriteBuffer, the same way BufferedSerial is connected to the printer.
+    Call printer.device.flush() to send everything that has been buffered.
+    """
+
+    def __init__(self, emulator, chunkSize=256, **kwargs):
+        super().__init__(**kwargs)
+        self.emulator = emulator
+        self.chunkSize = chunkSize
+        self.magic = PlannedMagicEncode(self)
+        self.open()
+
+    def open(self):
+        if self.device is not None:
+            self.device.discard()
+        self.emulator.open()
+        self.device = SerialWriteBuffer(self.emulator, self.chunkSize)
+
+    def _raw(self, msg):
+        self.device.write(msg)
+
+    def query_status(self, mode):
+        # see BufferedSerial.query_status
+        self._raw(mode)
+        self.device.flush()
+        return self.device.read(1)
+
+    def close(self):
+        if self.device is not None:
+            self.device.close()
+            self.device = None
+
+
+class EmulatedPrinterManager(object):
+    """ Implements the PrinterManager interface"""
+    def __init__(self, profile, **emulatorSettings):
+        """
+        the printer is emulated with the 'serial' settings of the profile (baudrate, flow control, chunkSize), see PrinterEmulator for emulatorSettings
+        """
+        self.printerType = 'emulated'
+        self.profile = profile
+        self.online = False
+        self.deviceLock = RLock()
+        serialSettings = {**defaultSerialSettings, **profile.profile_data.get('serial', {})}
+        self.emulator = PrinterEmulator(profile, baudrate=serialSettings['baudrate'], dsrdtr=serialSettings['dsrdtr'], xonxoff=serialSettings['xonxoff'],
+                                        timeout=serialSettings['timeout'], **emulatorSettings)
+        self.printer = EmulatedPrinter(self.emulator, chunkSize=serialSettings['chunkSize'], profile=profile)
+
+    def connect(self, retries=0, timeout=0.0):
+        # the emulator doesn't change its status by itself, so there is no point waiting to retry
+        return self.checkOnline()
+
+    def checkOnline(self):
+        self.online = self.printer.is_online()
+        return self.online
+
+    def reopen(self):
+        self.printer.open()
+        return True
+
+    def saveReceipt(self, path):
+        with self.deviceLock:
+            self.printer.device.flush()
+            self.emulator.saveReceipt(path)
+
+
+class EmulatedLinkBenchmark(LinkBenchmark):
+    """LinkBenchmark against a PrinterEmulator, timed with the emulator's simulated clock. emulatorSettings -- see PrinterEmulator"""
+
+    def __init__(self, emulatorSettings: Optional[dict]=None, **kwargs):
+        super().__init__(**kwargs)
+        self.devfile = 'emulator'
+        self.emulatorSettings = emulatorSettings if emulatorSettings is not None else {}
+
+    def openDevice(self, baudrate, flowControl):
+        device = PrinterEmulator(baudrate=baudrate, timeout=self.timeout, **{**flowControlSettings[flowControl], **self.emulatorSettings})
+        self.clock = device.clock
+        return device
+
+
+def emulatePrint(data: bytes, profile=None, chunkSize=256, **emulatorSettings) -> PrinterEmulator:
+    """send data to a new PrinterEmulator in chunkSize writes, and wait until it is printed. the emulator's now is the time the print took"""
+    emulator = PrinterEmulator(profile, **emulatorSettings)
+    device = SerialWriteBuffer(emulator, chunkSize)
+    device.write(data)
+    device.flush()
+    emulator.waitUntilPrinted()
+    return emulator
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from threading import Lock
+from typing import Dict, Optional
+
+from PIL import Image
+
+
+class ImageProbeCache(object):
+    """
+    Facts about image files, probed once per version of each file and shared by everything that checks images during a run (e.g. the validator's size checks and resize step).
+
+    Entries are keyed by absolute path, and are only reused while the file's mtime and size are unchanged, so an image that is rewritten (e.g. resized) is probed again.
+    With a path, the cache is loaded from and saved to a JSON file, so unchanged images aren't opened at all on the next run.
+
+    Each entry is a dict:
+        mtime -- st_mtime_ns of the file when it was probed
+        size -- file size in bytes
+        width, height -- image dimensions in pixels
+        mode -- PIL image mode, e.g. '1', 'L', 'RGB'
+        format -- PIL image format, e.g. 'PNG', 'JPEG'
+        hash -- sha256 of the file contents, or None until contentHash is called
+
+    stats:
+        hits -- probes answered from the cache
+        misses -- probes that opened the image
+    """
+
+    def __init__(self, path: Optional[str]=None):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.lock = Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+        self.dirty = False
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except ValueError:
+            # a corrupt cache is rebuilt from scratch
+            self.entries = {}
+
+    def save(self):
+        """save the cache to its path, if it has one and anything changed"""
+        if self.path is None or not self.dirty:
+            return
+
+        with self.lock:
+            entries = dict(self.entries)
+            self.dirty = False
+
+        with open(self.path, 'w', encoding="utf-8") as f:
+            json.dump(entries, f, indent=4)
+
+    def lookup(self, imagePath) -> Optional[dict]:
+        """the current entry for an image, or None if it hasn't been probed since it last changed. raises OSError if the file doesn't exist"""
+        key = os.path.abspath(imagePath)
+        stat = os.stat(key)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                return entry
+        return None
+
+    def probe(self, imagePath) -> dict:
+        """the entry for an image. images are opened lazily, so a miss only reads the file header"""
+        entry = self.lookup(imagePath)
+        if entry is not None:
+            with self.lock:
+                self.stats['hits'] += 1
+            return entry
+
+        key = os.path.abspath(imagePath)
+        stat = os.stat(key)
+        with Image.open(key) as image:
+            entry = {
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'width': image.width,
+                'height': image.height,
+                'mode': image.mode,
+                'format': image.format,
+                'hash': None,
+            }
+
+        with self.lock:
+            self.stats['misses'] += 1
+            self.entries[key] = entry
+            self.dirty = True
+        return entry
+
+    def contentHash(self, imagePath) -> str:
+        """sha256 of the image file. the file is only read the first time"""
+        entry = self.probe(imagePath)
+        if entry['hash'] is None:
+            digest = hashlib.sha256()
+            with open(imagePath, 'rb') as f:
+                for block in iter(lambda: f.read(65536), b''):
+                    digest.update(block)
+            with self.lock:
+                entry['hash'] = digest.hexdigest()
+                self.dirty = True
+        return entry['hash']
+
+    def printerReady(self, imagePath, maxWidth) -> bool:
+        """True if the image can be printed without any conversion: 1-bit, and no wider than the printer"""
+        entry = self.probe(imagePath)
+        return entry['mode'] == '1' and entry['width'] <= maxWidth
+
+    def invalidate(self, imagePath):
+        with self.lock:
+            if self.entries.pop(os.path.abspath(imagePath), None) is not None:
+                self.dirty = True
@@ -0,0 +1,220 @@
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageChops
+
+from .markup import Parser, MarkupGroup, MarkupText, MarkupImage
+from .imagecache import ImageProbeCache
+from .raster import ditherMethods, bayerMatrix, greyscale
+
+RED = '\033[91m'
+GREEN = "\033[0;32m"
+ENDC = '\033[0m'
+
+losslessFormats = ['PNG', 'GIF', 'BMP', 'TIFF']
+"""formats that can store a 1-bit image exactly. prepared images in any other format (e.g. JPEG) are saved as PNG"""
+
+
+class ImagePreparer(object):
+    """
+    Converts the images referenced by zines into the printer's final form ahead of time, so printing doesn't have to.
+    A prepared image is 1-bit and exactly as wide as the paper: wider images are downscaled, narrower images are centered on a white background, the same as printer.image(center=True). raster.printImage recognizes prepared images and sends them without any conversion.
+
+    The original image is saved as {FILE}.orig, unless it already exists. Images in formats that can't store a 1-bit image exactly (e.g. JPEG) are left in place, and the prepared image is saved as {FILE}.png, and the zines that reference it are updated.
+    Large JPEGs are downscaled while decoding with draft(), and other large images are box-reduced by a whole factor before the final resize.
+
+    width -- paper width in dots
+    dither -- one of ditherMethods
+    workers -- number of images prepared in parallel. defaults to the number of CPUs
+    """
+
+    def __init__(self, width=576, dither='floyd-steinberg', workers=None, imageCache: Optional[ImageProbeCache]=None, resizeFilter=Image.Resampling.LANCZOS):
+        if dither not in ditherMethods:
+            raise ValueError(f"Unknown dither method '{dither}'. Expected one of {ditherMethods}")
+
+        self.width = width
+        self.dither = dither
+        self.workers = workers
+        self.imageCache = imageCache if imageCache is not None else ImageProbeCache()
+        self.resizeFilter = resizeFilter
+
+    def findImages(self, path) -> Dict[str, List[str]]:
+        """{image path: [zine paths]} for every image referenced by the zines in a directory or single file"""
+        zinePaths = []
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                # ignore hidden directories and files
+                dirs[:] = [d for d in dirs if not d[0] == '.']
+                zinePaths += [os.path.join(root, f) for f in sorted(files) if not f[0] == '.' and os.path.splitext(f)[1] in ['.zine', '.txt']]
+        else:
+            zinePaths.append(path)
+
+        images = {}
+        for zinePath in zinePaths:
+            with open(zinePath, encoding="utf-8") as f:
+                parser = Parser()
+                parser.feed(f.read())
+            for src in ImagePreparer.imageSources(MarkupGroup(parser.stack)):
+                imagePath = os.path.normpath(os.path.join(os.path.dirname(zinePath), src))
+                images.setdefault(imagePath, [])
+                if zinePath not in images[imagePath]:
+                    images[imagePath].append(zinePath)
+
+        return images
+
+    @staticmethod
+    def imageSources(markup):
+        if isinstance(markup, MarkupGroup):
+            for child in markup.children:
+                yield from ImagePreparer.imageSources(child)
+        elif isinstance(markup, MarkupText):
+            for subtext in markup.text:
+                yield from ImagePreparer.imageSources(subtext)
+        elif isinstance(markup, MarkupImage):
+            yield markup.src
+
+    def prepareDirectory(self, path) -> List[dict]:
+        """prepare every image referenced by the zines in a directory or single file, in parallel. returns a result for each image, see prepareImage"""
+        images = self.findImages(path)
+        print(f"Preparing {len(images)} images for {self.width} dot paper ({self.dither} dithering)...")
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ImagePreparer') as executor:
+            results = list(executor.map(self.prepareImage, images.keys()))
+
+        for result in results:
+            if result['preparedPath'] is not None and result['preparedPath'] != result['path']:
+                # zines are only rewritten here, on a single thread, since several images may be referenced by the same zine
+                for zinePath in images[result['path']]:
+                    self.updateSource(zinePath, result['path'], result['preparedPath'])
+
+        ImagePreparer.printResults(results)
+        self.imageCache.save()
+        return results
+
+    def prepareImage(self, imagePath) -> dict:
+        """
+        prepare a single image. returns a result dict:
+            path -- the image path
+            preparedPath -- where the prepared image was saved, or None if the image was already prepared or failed
+            originalSize, preparedSize -- (width, height) in pixels
+            originalBytes, preparedBytes -- file sizes
+            seconds -- time spent preparing
+            error -- error message, or None
+        """
+        result = {
+            'path': imagePath,
+            'preparedPath': None,
+            'originalSize': None,
+            'preparedSize': None,
+            'originalBytes': None,
+            'preparedBytes': None,
+            'seconds': 0.0,
+            'error': None,
+        }
+
+        startTime = time.perf_counter()
+        try:
+            info = self.imageCache.probe(imagePath)
+            result['originalSize'] = (info['width'], info['height'])
+            result['originalBytes'] = info['size']
+            if info['mode'] == '1' and info['width'] == self.width:
+                return result
+
+            with Image.open(imagePath) as image:
+                imageFormat = image.format
+                prepared = self.convert(image)
+
+            if imageFormat in losslessFormats:
+                preparedPath = imagePath
+                if not os.path.exists(imagePath + '.orig'):
+                    # an existing backup is the true original, e.g. from validate --resize or an earlier prepare at another width
+                    shutil.copyfile(imagePath, imagePath + '.orig')
+            else:
+                imageFormat = 'PNG'
+                preparedPath = imagePath + '.png'
+
+            prepared.save(preparedPath, format=imageFormat)
+            self.imageCache.invalidate(preparedPath)
+
+            result['preparedPath'] = preparedPath
+            result['preparedSize'] = prepared.size
+            result['preparedBytes'] = os.path.getsize(preparedPath)
+        except Exception as err:
+            result['error'] = str(err)
+        finally:
+            result['seconds'] = time.perf_counter() - startTime
+
+        return result
+
+    def convert(self, image: Image.Image) -> Image.Image:
+        """convert an image to the printer's final form: greyscale over a white background, scaled down to the paper width, dithered to 1-bit and centered"""
+        if image.width > self.width:
+            targetHeight = max(1, round(image.height * self.width / image.width))
+            # JPEG only: decode at a reduced scale that is still at least the target size
+            image.draft('L', (self.width, targetHeight))
+
+        grey = greyscale(image)
+
+        if grey.width > self.width:
+            factor = grey.width // self.width
+            if factor >= 2:
+                grey = grey.reduce(factor)
+            targetHeight = max(1, round(grey.height * self.width / grey.width))
+            grey = grey.resize((self.width, targetHeight), resample=self.resizeFilter)
+
+        dithered = ImagePreparer.ditherImage(grey, self.dither)
+        if dithered.width == self.width:
+            return dithered
+
+        centered = Image.new('1', (self.width, dithered.height), 255)
+        centered.paste(dithered, (int((self.width - dithered.width) / 2), 0))
+        return centered
+
+    @staticmethod
+    def ditherImage(image: Image.Image, method) -> Image.Image:
+        """convert a greyscale image to 1-bit"""
+        if method == 'floyd-steinberg':
+            # dither the inverted image, like EscposImage, so the prepared image has the same dots printer.image would print
+            return ImageChops.invert(ImageChops.invert(image).convert('1', dither=Image.Dither.FLOYDSTEINBERG))
+        if method == 'threshold':
+            return image.convert('1', dither=Image.Dither.NONE)
+
+        # ordered: white wherever the pixel is brighter than the tiled threshold map
+        rows = [bytes(bayerMatrix[y][x % 8] * 4 + 2 for x in range(image.width)) for y in range(8)]
+        thresholds = Image.frombytes('L', image.size, b''.join(rows[y % 8] for y in range(image.height)))
+        return ImageChops.subtract(image, thresholds).point(lambda v: 255 if v > 0 else 0).convert('1', dither=Image.Dither.NONE)
+
+    def updateSource(self, zinePath, imagePath, preparedPath):
+        """point the <img> tags in a zine that reference imagePath to preparedPath instead"""
+        with open(zinePath, encoding="utf-8") as f:
+            text = f.read()
+
+        def replaceSource(match):
+            src = match.group(2)
+            if os.path.normpath(os.path.join(os.path.dirname(zinePath), src)) != os.path.normpath(imagePath):
+                return match.group(0)
+            # preparedPath is always imagePath with an extra extension
+            return match.group(1) + src + preparedPath[len(imagePath):] + match.group(3)
+
+        updated = re.sub(r'''(<img\b[^>]*\bsrc\s*=\s*["'])([^"']*)(["'])''', replaceSource, text)
+        if updated != text:
+            with open(zinePath, 'w', encoding="utf-8") as f:
+                f.write(updated)
+
+    @staticmethod
+    def printResults(results):
+        prepared = [r for r in results if r['preparedPath'] is not None]
+        skipped = [r for r in results if r['preparedPath'] is None and r['error'] is None]
+        failed = [r for r in results if r['error'] is not None]
+
+        for r in prepared:
+            print(f"{r['path']}: {r['originalSize'][0]}x{r['originalSize'][1]} {r['originalBytes']}B -> {r['preparedPath']}: {r['preparedSize'][0]}x{r['preparedSize'][1]} {r['preparedBytes']}B ({r['seconds']*1000:.0f}ms)")
+        for r in failed:
+            print(f"{r['path']}: {RED}{r['error']}{ENDC}")
+
+        color = RED if len(failed) > 0 else GREEN
+        print(f"{color}Prepared {len(prepared)} images. {len(skipped)} already prepared. {len(failed)} failed.{ENDC}")
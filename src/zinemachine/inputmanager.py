@@ -1,8 +1,12 @@
+import logging
 from typing import Dict, List, Set, FrozenSet, Callable, Tuple
 from threading import Timer, Lock
+from concurrent.futures import ThreadPoolExecutor
 import RPi.GPIO as GPIO
 from .button import Button
 
+logger = logging.getLogger(__name__)
+
 
 class InputManager(object):
     """
@@ -19,6 +23,9 @@ class InputManager(object):
     Multiple commands can be bound to the same chord with different nonzero holdTimes. In this case, each command will be executed when its holdTime expires, unless any keys are pressed or released.
 
     if any number of pressHold commands were executed, pressRelease commands will be blocked until all buttons are released
+
+    Commands are dispatched to a pool of worker threads, so input state is only locked while it is being updated, never while a command is running.
+    A long command (e.g. printing a zine) does not delay press and release handling, and a pressHold command can still fire while a pressRelease command is running.
     """
     buttons: Dict[int, Button]
     pressed: Set[int]
@@ -29,7 +36,7 @@ class InputManager(object):
     """
     commands: Dict[FrozenSet, Dict[float, Callable]]
 
-    def __init__(self, waitTime=0.25):
+    def __init__(self, waitTime=0.25, maxCommandWorkers=4):
         self.buttons = dict()
         self.pressed = set()
         self.currentChord = set()
@@ -41,6 +48,7 @@ class InputManager(object):
         self.blockPressRelease = False
 
         self.inputLock = Lock()
+        self.commandExecutor = ThreadPoolExecutor(max_workers=maxCommandWorkers, thread_name_prefix='InputManager')
 
     def addButton(self, pin, name):
         self.buttons[pin] = Button(
@@ -50,7 +58,7 @@ class InputManager(object):
             onReleased=self.onReleased
         )
 
-        print(f"Regsiter pin {pin} to button '{name}'")
+        logger.debug(f"Register pin {pin} to button '{name}'")
 
     def addChord(self, pins: FrozenSet[int], callback: Callable, holdTime:float=0.0):
         # holdTime is rounded to 6 digits to ensure reliable hashing
@@ -59,10 +67,10 @@ class InputManager(object):
             self.commands[pins] = dict()
 
         if holdTime in self.commands[pins]:
-            print(f"Warning: chord already exists: {pins} ({holdTime}). Overwriting previous command...")
+            logger.warning(f"Chord already exists: {pins} ({holdTime}). Overwriting previous command...")
         self.commands[pins][holdTime] = callback
 
-        print(f"Register command: {pins} ({holdTime})")
+        logger.debug(f"Register command: {pins} ({holdTime})")
 
     def onPressed(self, button):
         with self.inputLock:
@@ -73,18 +81,16 @@ class InputManager(object):
             self.startHoldTimers()
 
     def onReleased(self, button):
-        try:
-            # manually handle lock so we can unlock before we execute the requested command, which may take awhile
-            # we don't need to do this for pressHold commands becauase they are automatically put on their own thread via the hold Timer
-            self.inputLock.acquire()
+        with self.inputLock:
             self.resetHoldTimers()
             self.pressed.remove(button.pin)
 
             # check for pressRelease commands
             if len(self.pressed) == 0:
                 if self.blockPressRelease:
+                    # the chord was consumed by a pressHold command
                     self.blockPressRelease = False
-                    self.inputLock.release()
+                    self.resetInput()
                     return
 
                 frozenChord = frozenset(self.currentChord)
@@ -93,9 +99,7 @@ class InputManager(object):
                     if 0.0 in chordCommands:
                         # pressRelease
                         self.resetInput()
-                        # release lock before executing the command
-                        self.inputLock.release()
-                        chordCommands[0.0](frozenChord, 0.0)
+                        self.dispatchCommand(chordCommands[0.0], frozenChord, 0.0)
                         return
 
             else:
@@ -110,12 +114,6 @@ class InputManager(object):
             timer = Timer(self.waitTime, onWait)
             self.waitTimers.append(timer)
             timer.start()
-            self.inputLock.release()
-
-        except Exception as e:
-            self.inputLock.release()
-            raise e
-
 
     def startHoldTimers(self):
         """hold timers are always based on pressed, not currentChord
@@ -127,15 +125,29 @@ class InputManager(object):
                 if holdTime == 0.0:
                     continue
 
-                def onHold(pins, hold):
+                def onHold(pins, hold, command=command):
                     with self.inputLock:
-                        command(pins, hold)
+                        # the timer may have fired while a press or release was resetting it. only run the command if the chord is still held
+                        if frozenset(self.pressed) != pins:
+                            return
                         self.blockPressRelease = True
+                        self.dispatchCommand(command, pins, hold)
 
                 timer = Timer(holdTime, onHold, args=[frozenChord, holdTime])
                 self.holdTimers.append(timer)
                 timer.start()
 
+    def dispatchCommand(self, command: Callable, pins: FrozenSet[int], holdTime: float):
+        """run the command on a worker thread. commands are submitted in the order the input was received, and never block input handling while they run
+        """
+        def onDone(future):
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Command {set(pins)} ({holdTime}) failed: {error}", exc_info=error)
+
+        future = self.commandExecutor.submit(command, pins, holdTime)
+        future.add_done_callback(onDone)
+        return future
 
     def resetHoldTimers(self):
         for timer in self.holdTimers:
@@ -149,3 +161,10 @@ class InputManager(object):
 
         self.waitTimers.clear()
 
+    def shutdown(self, wait=True):
+        """cancel all timers and stop accepting commands. if wait is True, block until running commands are complete
+        """
+        with self.inputLock:
+            self.resetHoldTimers()
+            self.resetInput()
+        self.commandExecutor.shutdown(wait=wait)
@@ -0,0 +1,168 @@
+import itertools
+import time
+import serial
+from serial.serialutil import SerialException
+
+from .profile import defaultSerialSettings
+
+YELLOW = '\033[93m'
+GREEN = "\033[0;32m"
+BOLD = '\033[1m'
+ENDC = '\033[0m'
+
+flowControlSettings = {
+    'dsrdtr': {'dsrdtr': True, 'xonxoff': False},
+    'xonxoff': {'dsrdtr': False, 'xonxoff': True},
+    'none': {'dsrdtr': False, 'xonxoff': False},
+}
+"""serial settings for each flow control mode that can be benchmarked"""
+
+RT_STATUS_ONLINE = b'\x10\x04\x01'
+"""DLE EOT 1: real-time printer status request. the printer responds with a single status byte"""
+
+
+class LinkBenchmark(object):
+    """
+    Measures throughput, latency and stalls of the serial link to the printer for every combination of baud rate, write size and flow control.
+    Works with the real printer (/dev/rfcomm0) or a pty stand-in, e.g. one end of `socat -d -d pty,raw,echo=0 pty,raw,echo=0`.
+
+    For each configuration:
+     - idle latency: time until the printer responds to a status query, before any data is sent
+     - throughput: payload bytes / time to write and drain the payload
+     - stalls: number of writes that blocked longer than stallTime (e.g. the printer asserted flow control because its buffer was full)
+     - drain latency: time until the printer responds to a status query sent right after the payload. includes the time the printer needs to work through its buffer
+
+    payload -- bytes sent for each configuration. the default is NUL, which ESC/POS printers ignore, so only the link is measured. send printable text to include the print mechanism in the measurement.
+    """
+
+    def __init__(self, devfile=defaultSerialSettings['devfile'], baudrates=(9600,), chunkSizes=(256,), flowControls=('dsrdtr',),
+                 payload=bytes(4096), stallTime=0.5, timeout=1.0, baseSettings=defaultSerialSettings):
+        for flowControl in flowControls:
+            if flowControl not in flowControlSettings:
+                raise ValueError(f"Unknown flow control '{flowControl}'. Expected one of {list(flowControlSettings.keys())}")
+
+        self.devfile = devfile
+        self.baudrates = baudrates
+        self.chunkSizes = chunkSizes
+        self.flowControls = flowControls
+        self.payload = payload
+        self.stallTime = stallTime
+        self.timeout = timeout
+        self.baseSettings = baseSettings
+        self.clock = time.perf_counter
+        """timer for the measurements. a stand-in device can replace it with its own clock, see openDevice"""
+
+    def run(self):
+        """benchmark every configuration. returns a list of results, see benchmarkConfiguration"""
+        results = []
+        for baudrate, chunkSize, flowControl in itertools.product(self.baudrates, self.chunkSizes, self.flowControls):
+            print(f"{baudrate} baud, {chunkSize} byte writes, {flowControl} flow control... ", end="", flush=True)
+            result = self.benchmarkConfiguration(baudrate, chunkSize, flowControl)
+            results.append(result)
+            if result['error'] is not None:
+                print(f"{YELLOW}failed: {result['error']}{ENDC}")
+            else:
+                print(f"{result['bytesPerSecond']:.0f} B/s, {result['stalls']} stalls")
+
+        return results
+
+    def benchmarkConfiguration(self, baudrate, chunkSize, flowControl):
+        result = {
+            'settings': {'baudrate': baudrate, 'chunkSize': chunkSize, **flowControlSettings[flowControl]},
+            'flowControl': flowControl,
+            'bytes': 0,
+            'seconds': None,
+            'bytesPerSecond': 0.0,
+            'writes': 0,
+            'stalls': 0,
+            'maxWriteTime': 0.0,
+            'idleLatency': None,
+            'drainLatency': None,
+            'error': None,
+        }
+
+        try:
+            device = self.openDevice(baudrate, flowControl)
+        except (SerialException, ValueError) as err:
+            result['error'] = str(err)
+            return result
+
+        try:
+            device.reset_input_buffer()
+            result['idleLatency'] = self.queryLatency(device)
+
+            view = memoryview(self.payload)
+            startTime = self.clock()
+            for i in range(0, len(view), chunkSize):
+                writeStartTime = self.clock()
+                device.write(view[i:i + chunkSize])
+                writeTime = self.clock() - writeStartTime
+
+                result['writes'] += 1
+                result['maxWriteTime'] = max(result['maxWriteTime'], writeTime)
+                if writeTime > self.stallTime:
+                    result['stalls'] += 1
+
+            device.flush()
+            result['seconds'] = self.clock() - startTime
+            result['bytes'] = len(view)
+            result['bytesPerSecond'] = len(view) / result['seconds'] if result['seconds'] > 0 else 0.0
+
+            result['drainLatency'] = self.queryLatency(device)
+        except SerialException as err:
+            result['error'] = str(err)
+        finally:
+            device.close()
+
+        return result
+
+    def openDevice(self, baudrate, flowControl):
+        return serial.Serial(
+            port=self.devfile,
+            baudrate=baudrate,
+            bytesize=self.baseSettings['bytesize'],
+            parity=self.baseSettings['parity'],
+            stopbits=self.baseSettings['stopbits'],
+            timeout=self.timeout,
+            write_timeout=self.timeout * 10,
+            **flowControlSettings[flowControl])
+
+    def queryLatency(self, device):
+        """seconds until the printer responds to a status query, or None if it didn't respond before the timeout"""
+        startTime = self.clock()
+        device.write(RT_STATUS_ONLINE)
+        device.flush()
+        response = device.read(1)
+        if len(response) == 0:
+            return None
+        return self.clock() - startTime
+
+    @staticmethod
+    def bestResult(results):
+        """
+        the configuration with the highest throughput that completed without errors.
+        if the printer responded to status queries in any configuration, only those configurations are considered, since a link that sends data the printer never acknowledges is no good
+        returns None if every configuration failed
+        """
+        candidates = [r for r in results if r['error'] is None]
+        responding = [r for r in candidates if r['idleLatency'] is not None and r['drainLatency'] is not None]
+        if len(responding) > 0:
+            candidates = responding
+
+        if len(candidates) == 0:
+            return None
+
+        return max(candidates, key=lambda r: (r['bytesPerSecond'], -r['stalls']))
+
+    @staticmethod
+    def printResults(results):
+        def formatLatency(latency):
+            return f"{latency*1000:.0f}ms" if latency is not None else "-"
+
+        print(f"{BOLD}{'baud':>8} {'chunk':>6} {'flow':>8} {'B/s':>9} {'writes':>7} {'stalls':>7} {'max write':>10} {'idle':>8} {'drain':>8}{ENDC}")
+        for r in results:
+            if r['error'] is not None:
+                print(f"{r['settings']['baudrate']:>8} {r['settings']['chunkSize']:>6} {r['flowControl']:>8} {YELLOW}{r['error']}{ENDC}")
+                continue
+
+            print(f"{r['settings']['baudrate']:>8} {r['settings']['chunkSize']:>6} {r['flowControl']:>8} {r['bytesPerSecond']:>9.0f} {r['writes']:>7} {r['stalls']:>7} {r['maxWriteTime']*1000:>8.0f}ms {formatLatency(r['idleLatency']):>8} {formatLatency(r['drainLatency']):>8}")
@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+RED = '\033[91m'
+YELLOW = '\033[93m'
+ENDC = '\033[0m'
+
+logFormats = ['text', 'json']
+
+listener: Optional[logging.handlers.QueueListener] = None
+"""writes the queued records, see setupLogging"""
+
+standardAttributes = set(logging.LogRecord('', logging.INFO, '', 0, '', (), None).__dict__.keys()) | {'message', 'asctime', 'taskName'}
+"""attributes every LogRecord has. any other attribute was passed in extra, and is a structured field"""
+
+
+def structuredFields(record: logging.LogRecord) -> dict:
+    """the extra fields of a record, e.g. {'zine': path, 'job': 3, 'seconds': 1.2}"""
+    return {k: v for k, v in record.__dict__.items() if k not in standardAttributes}
+
+
+class TextFormatter(logging.Formatter):
+    """
+    one line per record: 'LEVEL logger: message key=value ...'.
+    color -- color warnings and errors. off when the output isn't a terminal (e.g. journald), so the log has no escape codes
+    timestamps -- prefix the time. journald adds its own
+    """
+
+    def __init__(self, color=False, timestamps=True):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s' if timestamps else '%(levelname)s %(name)s: %(message)s')
+        self.color = color
+
+    def format(self, record):
+        line = super().format(record)
+        fields = structuredFields(record)
+        if len(fields) > 0:
+            line += ' ' + ' '.join(f"{k}={formatValue(v)}" for k, v in fields.items())
+        if self.color and record.levelno >= logging.WARNING:
+            line = f"{RED if record.levelno >= logging.ERROR else YELLOW}{line}{ENDC}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """one JSON object per record, with the structured fields as keys"""
+
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **structuredFields(record),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class JobLogger(logging.LoggerAdapter):
+    """adds the fields of a job (e.g. zine, category, job id) to every record, merged with the extra fields of each call"""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
+
+
+def formatValue(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    text = str(value)
+    return json.dumps(text) if ' ' in text or text == '' else text
+
+
+def setupLogging(level='INFO', logFormat='text', stream=None) -> logging.handlers.QueueListener:
+    """
+    log everything from the zinemachine package through a queue: callers only put the record in the queue, and a background thread formats and writes it,
+    so a slow terminal or journald never blocks a print. the queue is flushed on exit.
+    returns the QueueListener that writes the records
+    """
+    global listener
+    stopLogging()
+    stream = stream if stream is not None else sys.stderr
+    handler = logging.StreamHandler(stream)
+    if logFormat == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        # systemd sets JOURNAL_STREAM for services logging to the journal, which timestamps every line itself
+        journal = 'JOURNAL_STREAM' in os.environ
+        handler.setFormatter(TextFormatter(color=hasattr(stream, 'isatty') and stream.isatty(), timestamps=not journal))
+
+    logQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(logQueue, handler)
+
+    logger = logging.getLogger('zinemachine')
+    for oldHandler in list(logger.handlers):
+        logger.removeHandler(oldHandler)
+    logger.addHandler(logging.handlers.QueueHandler(logQueue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+    listener.start()
+    return listener
+
+
+@atexit.register
+def stopLogging():
+    """write the records left in the queue and stop the listener thread. called on exit, and must be called before os._exit"""
+    global listener
+    if listener is not None:
+        # the listener may have been stopped directly. stopping it twice fails
+        if listener._thread is not None:
+            listener.stop()
+        listener = None
@@ -5,7 +5,7 @@ TODO: unexpected behavior after parser.close() with malformed markup
     add sensible fallbacks for malformed markup in general
 """
 
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Callable
 from html.parser import HTMLParser
 
 Position = tuple[int, int]
@@ -152,6 +152,29 @@ class MarkupImage:
 
 AstNode = Union[StartTag, MarkupText, MarkupImage, 'MarkupGroup']
 
+textFormattingTags = {
+    'u': {'underline': 1},
+    'u2': {'underline': 2},
+    'b': {'bold': True},
+    'h1': {'double_width': True, 'double_height': True, 'align': 'center'},
+    'invert': {'invert': True},
+    'flip': {'flip': True},
+}
+"""tag: styles of the text in the tag"""
+
+
+def plainText(node) -> str:
+    """the text of a node and its children, without markup"""
+    if isinstance(node, StrToken):
+        return node.text
+    if isinstance(node, MarkupText):
+        return ''.join(plainText(t) for t in node.text)
+    if isinstance(node, MarkupImage):
+        return plainText(node.caption) if node.caption is not None else ''
+    if isinstance(node, MarkupGroup):
+        return ''.join(plainText(c) for c in node.children)
+    return ''
+
 
 class MarkupGroup:
     """ Zine Markup AST Node - generic group containing zero or more children nodes
@@ -180,6 +203,7 @@ class Parser(HTMLParser):
 
     stack -- list of markup objects to be printed
     text -- contains the full plaintext of the zine with all markup removed
+    transliterate -- optional function applied to all text (not tags or attributes), e.g. Transliterator.transliterate
 
     Zine Markup tags:
         <u>Underlined</u>
@@ -189,21 +213,26 @@ class Parser(HTMLParser):
         parser = Parser()
         parser.feed('hello <b>world</b>')
         # parser.stack == [MarkupText('hello'), MarkupText('world', {'bold':True})]
+
+    The markup can be fed in pieces. takeComplete removes the nodes that are complete so far, so a long zine can be parsed in windows without keeping all of it
     """
     stack: List[AstNode]
     text: str
     errors: List[MarkupError]
 
-    def __init__(self):
+    def __init__(self, transliterate: Optional[Callable[[str], str]]=None):
         super().__init__()
         self.stack = []
         self.text = ''
         self.errors = []
+        self.transliterate = transliterate
 
     def handle_starttag(self, tag, attrs):
         self.stack.append(StartTag(tag, dict(attrs), pos=self.getpos()))
 
     def handle_data(self, data):
+        if self.transliterate is not None:
+            data = self.transliterate(data)
         self.text += data
         plaintext = StrToken(data, pos=self.getpos())
         if len(self.stack) > 0:
@@ -231,16 +260,8 @@ class Parser(HTMLParser):
             self.stack = self.stack[:i]
 
             # normal formatting tags
-            textFormattingTags = ['u', 'u2', 'b', 'h1', 'invert', 'flip']
             if tag in textFormattingTags:
-                tagStyles = \
-                    {'underline': 1} if tag == 'u' else \
-                    {'underline': 2} if tag == 'u2' else \
-                    {'bold': True} if tag == 'b' else \
-                    {'double_width': True, 'double_height': True, 'align': 'center'} if tag == 'h1' else \
-                    {'invert': True} if tag == 'invert' else \
-                    {'flip': True} if tag == 'flip' else \
-                    {}
+                tagStyles = textFormattingTags[tag]
 
                 if len(subexpressions) == 1 and isinstance(subexpressions[0], MarkupText) and \
                         (len(subexpressions[0].styles) == 0 or subexpressions[0].styles == tagStyles):
@@ -280,3 +301,38 @@ class Parser(HTMLParser):
                 return
 
         self.errors.append(MissingOpeningTagError(tag, pos=self.getpos()))
+
+    def takeComplete(self, lineBoundary=False, end=False) -> List[AstNode]:
+        """
+        remove and return the nodes parsed so far that can be printed, in order, and the plaintext they contain is removed from text.
+        text inside formatting tags that are still open is returned styled by the tags, and the tags are kept open, so text parsed later is styled by them too.
+        an <img> that is still open, and everything after it, is kept until the caption is complete.
+        lineBoundary -- only take nodes if their text ends at the end of a line (or there is no text), so it can be wrapped without the rest of the line. otherwise nothing is taken
+        end -- there is no more markup: everything is taken, and the nodes after a tag that was never closed are taken without it
+        """
+        taken = []
+        openTags = []
+        cut = len(self.stack)
+        for i, node in enumerate(self.stack):
+            if isinstance(node, StartTag):
+                if node.tag not in textFormattingTags:
+                    cut = i
+                    break
+                openTags.append(node)
+                continue
+
+            for tag in reversed(openTags):
+                node = MarkupText(node, textFormattingTags[tag.tag], pos=tag.pos)
+            taken.append(node)
+
+        if end:
+            taken += [node for node in self.stack[cut:] if not isinstance(node, StartTag)]
+            cut = len(self.stack)
+
+        text = ''.join(plainText(node) for node in taken)
+        if lineBoundary and len(text) > 0 and not text.endswith('\n'):
+            return []
+
+        self.stack = openTags + self.stack[cut:]
+        self.text = self.text[len(text):]
+        return taken
@@ -0,0 +1,108 @@
+import logging
+import socket
+import time
+from threading import RLock
+from escpos.escpos import Escpos
+from escpos.printer import Network
+
+logger = logging.getLogger(__name__)
+
+
+class FlushableSocket(socket.socket):
+    """a socket that can be flushed like a serial device. sendall has already sent everything, so there is nothing to flush"""
+
+    def flush(self):
+        pass
+
+
+class NetworkPrinter(Network):
+    """
+    escpos Network printer that connects when it is opened instead of when it is created, so an unreachable printer doesn't fail on startup
+    timeout -- seconds to wait to connect and to send
+    statusTimeout -- seconds to wait for the response to a status query. printers that don't respond to status queries hold every acknowledgement (see PrintJob) this long
+    """
+
+    def __init__(self, host, port=9100, timeout=10.0, statusTimeout=1.0, **kwargs):
+        Escpos.__init__(self, **kwargs)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.statusTimeout = statusTimeout
+        self.device = None
+
+    def open(self):
+        self.close()
+        device = FlushableSocket(socket.AF_INET, socket.SOCK_STREAM)
+        device.settimeout(self.timeout)
+        try:
+            device.connect((self.host, self.port))
+        except OSError:
+            device.close()
+            raise
+        self.device = device
+
+    def query_status(self, mode):
+        # the response is a single byte, so we return as soon as it arrives instead of sleeping for a second like Escpos
+        self._raw(mode)
+        self.device.settimeout(self.statusTimeout)
+        try:
+            return self.device.recv(1)
+        except socket.timeout:
+            return b''
+        finally:
+            self.device.settimeout(self.timeout)
+
+    def close(self):
+        if self.device is not None:
+            try:
+                self.device.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # already disconnected
+                pass
+            self.device.close()
+            self.device = None
+
+
+class NetworkPrinterManager:
+    """ Implements the PrinterManager interface, for a printer on a raw TCP port (e.g. port 9100 of an ethernet printer, or a serial printer shared with socat)"""
+    def __init__(self, profile, host, port=9100, timeout=10.0):
+        self.printerType = 'network'
+        self.profile = profile
+        self.online = False
+        self.deviceLock = RLock()
+        """held while sending data to the printer, so health checks don't interleave with a print"""
+        self.printer = NetworkPrinter(host, port, timeout=timeout, profile=profile)
+
+    def connect(self, retries=3, timeout=5.0):
+        """
+        connect to the printer and check that it is online.
+        retries - number of times to retry connection
+        timeout - seconds to wait between retries
+        @returns True on success, False after all retries fail
+        """
+        for i in range(retries + 1):
+            if self.reopen() and self.checkOnline():
+                return True
+
+            logger.warning(f"Printer {self.printer.host}:{self.printer.port} offline. Retrying in {timeout}s... ({i}/{retries})")
+            time.sleep(timeout)
+
+        self.online = False
+        return False
+
+    def checkOnline(self):
+        """cheap health check: a single status query. returns False if the printer doesn't respond or the connection is down"""
+        try:
+            self.online = self.printer.device is not None and self.printer.is_online()
+        except OSError:
+            self.online = False
+        return self.online
+
+    def reopen(self):
+        """reconnect to the printer. returns False if it can't be reached"""
+        try:
+            self.printer.open()
+            return True
+        except OSError as err:
+            logger.warning(f"Failed to connect to printer {self.printer.host}:{self.printer.port}: {err}")
+            return False
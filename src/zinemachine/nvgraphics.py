@@ -0,0 +1,133 @@
+import os
+from typing import Dict, Optional, Tuple
+
+from escpos.constants import GS
+from escpos.escpos import Escpos
+from PIL import Image
+
+from .imagecache import ImageProbeCache
+from .imageprep import ImagePreparer
+from .raster import mediaWidth, rasterFormat
+
+nvGraphicsFeature = 'nvGraphics'
+"""profile feature flag for printers that can store graphics in NV memory with GS ( L"""
+
+footerEmblemKey = 'ZM'
+"""key of the graphic printed in place of the footer's box-drawing emblem"""
+
+imageKeys = ['G' + c for c in '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ']
+"""keys for uploaded images, in the order they are assigned"""
+
+
+def graphicsCommand(fn, parameters: bytes) -> bytes:
+    """GS ( L function fn. parameters that don't fit the 2 byte length are sent with the extended GS 8 L form"""
+    length = 2 + len(parameters)
+    if length <= 0xffff:
+        return GS + b"(L" + length.to_bytes(2, 'little') + bytes([48, fn]) + parameters
+    return GS + b"8L" + length.to_bytes(4, 'little') + bytes([48, fn]) + parameters
+
+
+def defineGraphicsCommand(key: str, image: Image.Image) -> bytes:
+    """GS ( L fn 67: store a 1-bit image in NV memory under a 2 character key, as raster data in 1 color"""
+    return graphicsCommand(67, bytes([48]) + key.encode('ascii') + bytes([1])
+                           + image.width.to_bytes(2, 'little') + image.height.to_bytes(2, 'little') + bytes([49]) + rasterFormat(image))
+
+
+def printGraphicsCommand(key: str) -> bytes:
+    """GS ( L fn 69: print the NV graphic stored under key at normal size. 11 bytes: GS ( L, pL pH, m fn, kc1 kc2, x y"""
+    return graphicsCommand(69, key.encode('ascii') + bytes([1, 1]))
+
+
+def deleteAllGraphicsCommand() -> bytes:
+    """GS ( L fn 65: delete every NV graphic"""
+    return graphicsCommand(65, b"CLR")
+
+
+def supportsNVGraphics(profile) -> bool:
+    return bool(profile.profile_data.get('features', {}).get(nvGraphicsFeature, False))
+
+
+class NVGraphicsTable(object):
+    """
+    The graphics stored in the printer's NV memory, so images that appear in many zines (and the footer emblem) are sent once by upload-graphics, and printed with an 11 byte command after that.
+
+    The table is saved in the printer profile's nvGraphics section as {key: entry}:
+        name -- path of the uploaded image
+        hash -- content hash of the image file when it was uploaded (see ImageProbeCache.contentHash)
+        dither -- dither method the image was converted with
+        width, height -- size of the stored graphic in dots
+
+    Images are looked up by content, so any copy of an uploaded image prints from NV memory. An image that changed since it was uploaded, or that was uploaded for a different paper width or dither method, isn't found and is printed as a raster image instead.
+    The table is empty unless the profile has the nvGraphics feature, or without a profile (e.g. the console printer).
+    """
+
+    imageCache = ImageProbeCache()
+    """content hashes of the images looked up, shared by every table"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.entries: Dict[str, dict] = dict(profile.profile_data.get('nvGraphics', {})) if profile is not None and supportsNVGraphics(profile) else {}
+
+    @staticmethod
+    def forPrinter(printer) -> 'NVGraphicsTable':
+        return NVGraphicsTable(printer.profile if isinstance(printer, Escpos) else None)
+
+    def imageKey(self, path, dither='floyd-steinberg') -> Optional[str]:
+        """key of the stored graphic with the same dots as the image would print with, or None"""
+        if len(self.entries) == 0 or not os.path.exists(path):
+            return None
+
+        contentHash = NVGraphicsTable.imageCache.contentHash(path)
+        for key, entry in self.entries.items():
+            if key != footerEmblemKey and entry['hash'] == contentHash and entry['dither'] == dither and entry['width'] == mediaWidth(self.profile):
+                return key
+        return None
+
+    def emblemKey(self) -> Optional[str]:
+        return footerEmblemKey if footerEmblemKey in self.entries else None
+
+    def nextKey(self) -> str:
+        for key in imageKeys:
+            if key not in self.entries:
+                return key
+        raise ValueError(f"No free NV graphics keys. At most {len(imageKeys)} images can be uploaded")
+
+    def add(self, path, dither='floyd-steinberg', key=None) -> Tuple[str, bytes]:
+        """
+        add an image to the table, converted to the printer's final form (see ImagePreparer). returns its key, and the command that stores it in the printer.
+        an image that is already in the table keeps its key. key -- e.g. footerEmblemKey. defaults to the next free image key
+        """
+        contentHash = NVGraphicsTable.imageCache.contentHash(path)
+        if key is None:
+            key = self.imageKey(path, dither) or self.nextKey()
+
+        with Image.open(path) as image:
+            prepared = ImagePreparer(width=mediaWidth(self.profile), dither=dither).convert(image)
+
+        self.entries[key] = {
+            'name': path,
+            'hash': contentHash,
+            'dither': dither,
+            'width': prepared.width,
+            'height': prepared.height,
+        }
+        return key, defineGraphicsCommand(key, prepared)
+
+    def printImage(self, printer, path, dither='floyd-steinberg') -> Optional[dict]:
+        """print an image from NV memory if it is stored. returns the bytes sent and the bytes of the raster image it replaces (see RasterImage.print), or None if it isn't stored"""
+        key = self.imageKey(path, dither)
+        if key is None:
+            return None
+
+        command = printGraphicsCommand(key)
+        printer._raw(command)
+        entry = self.entries[key]
+        # the same as one GS v 0 command per 960 row fragment
+        return {'bytes': len(command), 'rasterBytes': (entry['width'] + 7) // 8 * entry['height'] + 8 * -(-entry['height'] // 960)}
+
+    def printEmblem(self, printer) -> bool:
+        """print the footer emblem from NV memory. returns False if it isn't stored"""
+        if self.emblemKey() is None:
+            return False
+        printer._raw(printGraphicsCommand(footerEmblemKey))
+        return True
@@ -0,0 +1,346 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, List, Optional, Tuple
+from escpos.escpos import Escpos
+from escpos.constants import ESC, RT_STATUS_ONLINE, RT_MASK_ONLINE
+from .codepageencoder import PlannedMagicEncode
+
+
+class PrintInterruptedError(Exception):
+    """the printer reported it is offline (e.g. out of paper) partway through a print job"""
+    def __init__(self, message: str, confirmedOffset: int):
+        super().__init__(message)
+        self.confirmedOffset = confirmedOffset
+
+
+def feedLines(lines) -> bytes:
+    """ESC d commands that print the line buffer and feed a number of lines, at most 255 per command"""
+    return b"".join(ESC + b"d" + bytes([min(255, lines - fed)]) for fed in range(0, lines, 255))
+
+
+Checkpoint = Tuple[int, Optional[dict], Optional[str]]
+"""(offset, styles, encoding): a line boundary in the job's ESC/POS stream, with the text styles and codepage that were active at that point"""
+
+
+class JobRecorder(Escpos):
+    """
+    escpos printer that records the ESC/POS stream instead of sending it, for use in a PrintJob.
+    A checkpoint is recorded after every newline printed with text(), since those are the only places we can safely resume a print from.
+
+    compact -- remove text that doesn't change the printout:
+     - trailing spaces are dropped, unless they are underlined or inverted, or the line is centered or right aligned
+     - runs of blank lines are sent as a single ESC d (print and feed n lines) instead of one newline each
+    Spaces and blank lines are held back until we know what follows them, so call flushText() before reading data.
+    """
+
+    def __init__(self, *args, compact=True, **kwargs):
+        Escpos.__init__(self, *args, **kwargs)
+        self.magic = PlannedMagicEncode(self)
+        self.data = bytearray()
+        self.styles = None
+        self.checkpoints: List[Checkpoint] = [(0, None, None)]
+        self.compact = compact
+        self.pendingNewlines = 0
+        self.pendingSpaces = ''
+        # True if the printer's line buffer is known to be empty, so a newline only feeds a blank line
+        self.lineEmpty = False
+        self.writingText = False
+
+    def _raw(self, msg):
+        if not self.writingText:
+            self.flushText()
+            self.lineEmpty = False
+        self.data += msg
+
+    def set(self, **styles):
+        super().set(**styles)
+        self.styles = styles
+
+    def text(self, txt):
+        for line in str(txt).splitlines(keepends=True):
+            if not self.compact or self.spacesPrint():
+                self.flushText()
+                self.writeText(line)
+                self.lineEmpty = False
+                if line.endswith('\n'):
+                    self.checkpoints.append((len(self.data), self.styles, self.magic.encoding))
+                continue
+
+            newline = line.endswith('\n')
+            body = line[:-1] if newline else line
+            content = body.rstrip(' ')
+            if len(content) > 0:
+                self.flushText()
+                self.writeText(content)
+                self.lineEmpty = False
+            self.pendingSpaces += body[len(content):]
+
+            if newline:
+                # the trailing spaces don't print
+                self.pendingSpaces = ''
+                if self.lineEmpty:
+                    self.pendingNewlines += 1
+                else:
+                    self.writeText('\n')
+                    self.lineEmpty = True
+                    self.checkpoints.append((len(self.data), self.styles, self.magic.encoding))
+
+    def spacesPrint(self):
+        """trailing spaces are visible when they are underlined or inverted, and move the text of a centered or right aligned line"""
+        styles = self.styles or {}
+        return styles.get('underline', 0) or styles.get('invert', False) or styles.get('align', 'left') != 'left'
+
+    def writeText(self, txt):
+        self.writingText = True
+        try:
+            super().text(txt)
+        finally:
+            self.writingText = False
+
+    def flushText(self):
+        """record the blank lines and spaces that have been held back"""
+        if self.pendingNewlines > 0:
+            newlines = self.pendingNewlines
+            self.pendingNewlines = 0
+            # ESC d takes 3 bytes, so it only saves anything for 4 or more lines
+            self.data += feedLines(newlines) if newlines > 3 else b'\n' * newlines
+            self.checkpoints.append((len(self.data), self.styles, self.magic.encoding))
+
+        if len(self.pendingSpaces) > 0:
+            spaces = self.pendingSpaces
+            self.pendingSpaces = ''
+            self.writeText(spaces)
+            self.lineEmpty = False
+
+    def close(self):
+        self.flushText()
+
+
+class PrintJob(object):
+    """
+    A print job rendered to a complete ESC/POS byte stream, so it can be resumed if the link drops or the paper runs out partway through.
+
+    The stream is sent one segment at a time, between line boundary checkpoints. After at least ackInterval bytes we query the printer status at the next checkpoint (real-time commands can't be sent in the middle of another command, e.g. image data).
+    Everything before a checkpoint is confirmed once the printer responds that it is online. If the printer doesn't respond to a status query, nothing is confirmed and it isn't queried again for the rest of the job
+    (each query waits for the read timeout), so the job restarts from the beginning if it is interrupted.
+
+    data -- the ESC/POS stream
+    checkpoints -- line boundaries in data, see Checkpoint
+    confirmedOffset -- offset of the last checkpoint the printer acknowledged
+    sentBytes -- bytes of the stream sent to the printer so far, counting the parts sent again when the job is resumed
+    statusSupported -- False once the printer didn't respond to a status query
+    """
+
+    def __init__(self, data: bytes, checkpoints: List[Checkpoint], profile=None):
+        self.data = data
+        self.checkpoints = checkpoints
+        self.profile = profile
+        self.confirmedOffset = 0
+        self.resumes = 0
+        self.sentBytes = 0
+        self.statusSupported = True
+
+    @staticmethod
+    def render(job, profile=None, compact=True):
+        """call job(printer) with a JobRecorder and return the recorded PrintJob. compact -- see JobRecorder"""
+        recorder = JobRecorder(profile=profile, compact=compact)
+        job(recorder)
+        recorder.flushText()
+        if recorder.checkpoints[-1][0] != len(recorder.data):
+            # the end of the job is always safe
+            recorder.checkpoints.append((len(recorder.data), recorder.styles, recorder.magic.encoding))
+        return PrintJob(bytes(recorder.data), recorder.checkpoints, profile=profile)
+
+    def send(self, printer, ackInterval=2048):
+        """
+        send the job from confirmedOffset to the end.
+        raises PrintInterruptedError if the printer reports it is offline, and OSError if the link drops. confirmedOffset is kept up to date so the job can be resumed
+        """
+        view = memoryview(self.data)
+        offset = self.confirmedOffset
+        lastAck = offset
+        for checkpoint in self.checkpoints:
+            checkpointOffset = checkpoint[0]
+            if checkpointOffset <= offset:
+                continue
+
+            printer._raw(view[offset:checkpointOffset])
+            self.sentBytes += checkpointOffset - offset
+            offset = checkpointOffset
+
+            if offset - lastAck >= ackInterval or offset == len(self.data):
+                lastAck = offset
+                self.acknowledge(printer, offset)
+
+        printer.device.flush()
+
+    def acknowledge(self, printer, offset):
+        if not self.statusSupported:
+            return
+
+        status = printer.query_status(RT_STATUS_ONLINE)
+        if len(status) == 0:
+            # the printer doesn't respond to status queries. we can't confirm anything
+            self.statusSupported = False
+            return
+
+        if status[0] & RT_MASK_ONLINE:
+            raise PrintInterruptedError("Printer offline", self.confirmedOffset)
+
+        self.confirmedOffset = offset
+
+    def resume(self, printer, marker='', markerStyles=None, ackInterval=2048):
+        """
+        send the job again from the last confirmed checkpoint. marker is printed at the resume point (with markerStyles), then the styles and codepage that were active at the checkpoint are restored
+        """
+        offset, styles, encoding = self.resumeCheckpoint()
+        if offset > 0:
+            prefix = JobRecorder(profile=self.profile)
+            if len(marker) > 0:
+                if markerStyles is not None:
+                    prefix.set(**markerStyles)
+                prefix.text(marker)
+            prefix.set(**(styles or {}))
+            if encoding is not None:
+                prefix.magic.write_with_encoding(encoding, None)
+            prefix.flushText()
+            printer._raw(bytes(prefix.data))
+
+        self.resumes += 1
+        self.confirmedOffset = offset
+        self.send(printer, ackInterval=ackInterval)
+
+    def resumeCheckpoint(self) -> Checkpoint:
+        """the last checkpoint at or before confirmedOffset"""
+        result = self.checkpoints[0]
+        for checkpoint in self.checkpoints:
+            if checkpoint[0] > self.confirmedOffset:
+                break
+            result = checkpoint
+        return result
+
+
+class StreamingPrintJob(PrintJob):
+    """
+    A print job that is rendered while it is sent, for jobs too long to keep the whole ESC/POS stream in memory (e.g. a streamed zine, see Zine.markupWindows).
+    The job is rendered into a StreamingRecorder, which sends the stream one window of about windowSize bytes at a time, ending at a checkpoint. Checkpoints are acknowledged like a PrintJob's.
+
+    Resuming renders the job again from the beginning and skips the bytes before confirmedOffset, so job must render the same stream every time it is called.
+    Only the first checkpoint and the last confirmed one are kept in checkpoints.
+    """
+
+    def __init__(self, job, profile=None, compact=True, windowSize=16384):
+        super().__init__(b'', [(0, None, None)], profile=profile)
+        self.job = job
+        self.compact = compact
+        self.windowSize = windowSize
+
+    def send(self, printer, ackInterval=2048):
+        """render the job and send it from confirmedOffset to the end. raises like PrintJob.send"""
+        recorder = StreamingRecorder(self, printer, ackInterval, profile=self.profile, compact=self.compact)
+        self.job(recorder)
+        recorder.flushText()
+        recorder.sendWindow(final=True)
+        printer.device.flush()
+
+    def confirm(self, printer, checkpoint: Checkpoint):
+        """acknowledge the stream up to checkpoint, and keep it to resume from"""
+        self.acknowledge(printer, checkpoint[0])
+        if self.confirmedOffset == checkpoint[0]:
+            self.checkpoints = [self.checkpoints[0], checkpoint]
+
+
+class StreamingRecorder(JobRecorder):
+    """
+    JobRecorder for a StreamingPrintJob: once windowSize bytes are recorded, everything up to the last checkpoint is sent to the printer and dropped.
+    base -- offset of data[0] in the job's stream. checkpoints are relative to data
+    skip -- the stream before this offset was already printed and is dropped without sending it
+    """
+
+    def __init__(self, printJob: StreamingPrintJob, printer, ackInterval, **kwargs):
+        JobRecorder.__init__(self, **kwargs)
+        self.printJob = printJob
+        self.printer = printer
+        self.ackInterval = ackInterval
+        self.base = 0
+        self.skip = printJob.confirmedOffset
+        self.lastAck = self.skip
+
+    def _raw(self, msg):
+        super()._raw(msg)
+        if len(self.data) >= self.printJob.windowSize:
+            self.sendWindow()
+
+    def sendWindow(self, final=False):
+        """send the recorded stream up to the last checkpoint. final -- the job is complete, send all of it"""
+        if final and self.checkpoints[-1][0] != len(self.data):
+            # the end of the job is always safe
+            self.checkpoints.append((len(self.data), self.styles, self.magic.encoding))
+
+        offset = 0
+        for checkpoint in self.checkpoints:
+            checkpointOffset = checkpoint[0]
+            if checkpointOffset <= offset:
+                continue
+
+            end = self.base + checkpointOffset
+            if end > self.skip:
+                start = max(offset, self.skip - self.base)
+                self.printer._raw(bytes(self.data[start:checkpointOffset]))
+                self.printJob.sentBytes += checkpointOffset - start
+
+                if end - self.lastAck >= self.ackInterval or (final and checkpointOffset == len(self.data)):
+                    self.lastAck = end
+                    self.printJob.confirm(self.printer, (end,) + checkpoint[1:])
+            offset = checkpointOffset
+
+        del self.data[:offset]
+        self.base += offset
+        self.checkpoints = [(c[0] - offset,) + c[1:] for c in self.checkpoints if c[0] >= offset]
+
+
+class RenderCache(object):
+    """
+    The ESC/POS streams of recently rendered print jobs, so a zine printed again, on any printer with the same profile, is sent without rendering it again.
+    Entries are (data, checkpoints, profile, characters), where characters is the length of the zine's text for the print time estimate.
+    The least recently used entries are dropped when the streams take more than maxBytes. Safe to use from several threads.
+
+    hits, misses -- lookups that found an entry, and that didn't
+    """
+
+    def __init__(self, maxBytes=8 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[PrintJob, int]]:
+        """a new PrintJob with the cached stream, and the characters of the zine, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        data, checkpoints, profile, characters = entry
+        return PrintJob(data, checkpoints, profile=profile), characters
+
+    def put(self, key: Hashable, printJob: PrintJob, characters: int):
+        if len(printJob.data) > self.maxBytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= len(self.entries.pop(key)[0])
+            self.entries[key] = (printJob.data, printJob.checkpoints, printJob.profile, characters)
+            self.bytes += len(printJob.data)
+            while self.bytes > self.maxBytes:
+                self.bytes -= len(self.entries.popitem(last=False)[1][0])
+
+    def getMetrics(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,239 @@
+import contextlib
+import json
+import math
+import os
+import tempfile
+import time
+from collections import deque
+from threading import RLock
+from typing import Dict, List, Optional
+
+stageNames = ['read', 'parse', 'wrap', 'render', 'images', 'transmit', 'offline', 'wait', 'total']
+"""
+stages of a print, in order:
+    read -- reading the zine from disk
+    parse -- parsing the markup
+    wrap -- wrapping the text
+    render -- rendering the ESC/POS stream: header, markup and footer. includes images
+    images -- converting and rendering images
+    transmit -- sending the stream to the printer, including the status checks
+    offline -- waiting for the printer to be online, e.g. after an interrupted print
+    wait -- waiting for the estimated print time to pass, after the stream is sent
+    total -- the whole print
+read, parse and wrap are skipped when the zine's markup is already loaded
+"""
+
+
+class PrintMetrics(object):
+    """
+    Timing and counters of a single print.
+
+    start -- time.perf_counter() when the print was requested, e.g. when the button was pressed
+    stages -- {stage: seconds}, see stageNames. a stage entered several times (e.g. images) is the sum of all of them
+    bytes -- bytes of the ESC/POS stream sent to the printer, including resumed segments
+    images -- images printed
+    imageCacheHits -- images printed from the printer's NV memory instead of being converted and sent
+    pressToFirstByte -- seconds from start until the first byte was sent to the printer
+    resumes -- times the print was resumed after the printer went offline
+    error -- the error that stopped the print, if any
+    """
+
+    def __init__(self, path='', category='', start: Optional[float]=None):
+        self.path = path
+        self.category = category
+        self.start = start if start is not None else time.perf_counter()
+        self.time = time.time()
+        self.stages: Dict[str, float] = {}
+        self.bytes = 0
+        self.images = 0
+        self.imageCacheHits = 0
+        self.pressToFirstByte: Optional[float] = None
+        self.resumes = 0
+        self.error: Optional[str] = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """time the block as stage name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def firstByte(self):
+        """mark that the first byte is being sent to the printer"""
+        if self.pressToFirstByte is None:
+            self.pressToFirstByte = time.perf_counter() - self.start
+
+    def finish(self):
+        self.stages['total'] = time.perf_counter() - self.start
+
+    def toDict(self) -> dict:
+        return {
+            'time': self.time,
+            'path': self.path,
+            'category': self.category,
+            'stages': self.stages,
+            'bytes': self.bytes,
+            'images': self.images,
+            'imageCacheHits': self.imageCacheHits,
+            'pressToFirstByte': self.pressToFirstByte,
+            'resumes': self.resumes,
+            'error': self.error,
+        }
+
+    def __str__(self):
+        stages = ', '.join(f"{name} {self.stages[name]:.2f}s" for name in stageNames if name in self.stages)
+        firstByte = f", first byte after {self.pressToFirstByte:.2f}s" if self.pressToFirstByte is not None else ''
+        return f"{stages}. {self.bytes}B, {self.images} images ({self.imageCacheHits} from NV memory){firstByte}"
+
+
+class MetricsLog(object):
+    """
+    Exports the metrics of every print, for a node exporter or the stats command.
+
+    jsonPath -- every print is appended to this file as a line of JSON (see PrintMetrics.toDict)
+    textfilePath -- Prometheus text format file, rewritten after every print, e.g. in node_exporter's --collector.textfile.directory.
+                    totals count since the zine machine started, and quantiles are over the last history prints
+    record is safe to call from several threads, e.g. the printers of a ZineMachine with several printers
+    """
+
+    def __init__(self, jsonPath: Optional[str]=None, textfilePath: Optional[str]=None, history=100):
+        self.jsonPath = jsonPath
+        self.textfilePath = textfilePath
+        self.recent = deque(maxlen=history)
+        self.prints = 0
+        self.errors = 0
+        self.bytes = 0
+        self.images = 0
+        self.imageCacheHits = 0
+        self.stageSums: Dict[str, float] = {}
+        self.stageCounts: Dict[str, int] = {}
+        self.lock = RLock()
+
+    def record(self, metrics: PrintMetrics):
+        record = metrics.toDict()
+        with self.lock:
+            self.recent.append(record)
+            self.prints += 1
+            self.errors += 1 if metrics.error is not None else 0
+            self.bytes += metrics.bytes
+            self.images += metrics.images
+            self.imageCacheHits += metrics.imageCacheHits
+            for name, seconds in metrics.stages.items():
+                self.stageSums[name] = self.stageSums.get(name, 0.0) + seconds
+                self.stageCounts[name] = self.stageCounts.get(name, 0) + 1
+
+            if self.jsonPath is not None:
+                with open(self.jsonPath, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+
+            if self.textfilePath is not None:
+                self.writeTextfile()
+
+    def writeTextfile(self):
+        # the node exporter may read the file at any time, so it is written to a temporary file next to it and replaced in one step
+        directory, name = os.path.split(os.path.abspath(self.textfilePath))
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix=f".{name}.", suffix='.tmp', delete=False) as f:
+            try:
+                f.write(self.prometheusText())
+            except Exception:
+                f.close()
+                os.remove(f.name)
+                raise
+        # temporary files are only readable by their owner, and the node exporter usually runs as another user
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, self.textfilePath)
+
+    def prometheusText(self) -> str:
+        with self.lock:
+            return self.formatPrometheusText()
+
+    def formatPrometheusText(self) -> str:
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP zinemachine_{name} {description}")
+            lines.append(f"# TYPE zinemachine_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"zinemachine_{name}{suffix}{labels} {value}")
+
+        metric('prints_total', 'counter', 'Zines printed.', [('', '', self.prints)])
+        metric('print_errors_total', 'counter', 'Prints that failed.', [('', '', self.errors)])
+        metric('print_bytes_total', 'counter', 'Bytes sent to the printer.', [('', '', self.bytes)])
+        metric('print_images_total', 'counter', 'Images printed.', [('', '', self.images)])
+        metric('print_image_cache_hits_total', 'counter', 'Images printed from the printer NV memory.', [('', '', self.imageCacheHits)])
+
+        stageSamples = []
+        for name in stageNames:
+            if name not in self.stageCounts:
+                continue
+            values = sorted(r['stages'][name] for r in self.recent if name in r['stages'])
+            for q in [0.5, 0.9, 0.99]:
+                if len(values) > 0:
+                    stageSamples.append(('', f'{{stage="{name}",quantile="{q}"}}', percentile(values, q)))
+            stageSamples.append(('_sum', f'{{stage="{name}"}}', self.stageSums[name]))
+            stageSamples.append(('_count', f'{{stage="{name}"}}', self.stageCounts[name]))
+        metric('print_stage_seconds', 'summary', 'Time spent in each stage of a print. Quantiles are over recent prints.', stageSamples)
+
+        latencies = sorted(r['pressToFirstByte'] for r in self.recent if r['pressToFirstByte'] is not None)
+        metric('press_to_first_byte_seconds', 'summary', 'Time from the print request until the first byte is sent to the printer, over recent prints.',
+               [('', f'{{quantile="{q}"}}', percentile(latencies, q)) for q in [0.5, 0.9, 0.99] if len(latencies) > 0])
+
+        if len(self.recent) > 0:
+            metric('last_print_timestamp_seconds', 'gauge', 'Unix time of the last print.', [('', '', self.recent[-1]['time'])])
+        return '\n'.join(lines) + '\n'
+
+
+def timeStage(metrics: Optional[PrintMetrics], name):
+    """time a block as stage name of metrics. does nothing if metrics is None"""
+    return metrics.stage(name) if metrics is not None else contextlib.nullcontext()
+
+
+def percentile(values: List[float], q) -> float:
+    """nearest rank percentile of sorted values"""
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+
+def loadMetrics(path, last: Optional[int]=None) -> List[dict]:
+    """the last prints recorded in a MetricsLog JSON lines file. lines that aren't valid JSON (e.g. cut off by a power loss) are skipped"""
+    records = deque(maxlen=last)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return list(records)
+
+
+def summarize(records: List[dict], quantiles=(0.5, 0.9, 0.99)) -> dict:
+    """
+    percentiles of every stage over records:
+        stages -- {stage: {'count': int, quantile: seconds, ..., 'max': seconds}}, see stageNames
+        pressToFirstByte -- the same for the latency to the first byte, or None if no print has one
+        prints, errors, bytes, images, imageCacheHits -- totals
+    """
+    def distribution(values):
+        values = sorted(values)
+        result = dict(count=len(values))
+        result.update({q: percentile(values, q) for q in quantiles})
+        result['max'] = values[-1]
+        return result
+
+    stages = {}
+    for name in stageNames:
+        values = [r['stages'][name] for r in records if name in r.get('stages', {})]
+        if len(values) > 0:
+            stages[name] = distribution(values)
+
+    latencies = [r['pressToFirstByte'] for r in records if r.get('pressToFirstByte') is not None]
+    return {
+        'stages': stages,
+        'pressToFirstByte': distribution(latencies) if len(latencies) > 0 else None,
+        'prints': len(records),
+        'errors': sum(1 for r in records if r.get('error') is not None),
+        'bytes': sum(r.get('bytes', 0) for r in records),
+        'images': sum(r.get('images', 0) for r in records),
+        'imageCacheHits': sum(r.get('imageCacheHits', 0) for r in records),
+    }
@@ -1,6 +1,21 @@
+import json
 from escpos import capabilities
 
 
+defaultSerialSettings = {
+    'devfile': '/dev/rfcomm0',
+    'baudrate': 9600,
+    'bytesize': 8,
+    'parity': 'N',
+    'stopbits': 1,
+    'timeout': 1,
+    'xonxoff': False,
+    'dsrdtr': True,
+    'chunkSize': 256,
+}
+"""serial connection settings for the bluetooth printer: 9600 Baud, 8N1, Flow Control Enabled. chunkSize is the size of each write to the serial device (see SerialWriteBuffer)"""
+
+
 class LMP201(capabilities.Profile):
     """ this is a custom profile for the printer we are using. self-test printout reports its model number as LMP201 """
 
@@ -24,3 +39,52 @@ class LMP201(capabilities.Profile):
         self.nonstandardCodepages = ['CP866', 'CP775', 'CP720', 'CP861', 'ISO_8859-15', 'CP862', 'CP855', 'CP1125', 'CP869', 'CP1253', 'CP864', 'ISO_8859-7', 'TCVN-3-1', 'TCVN-3-2', 'CP874', 'CP1250', 'CP1251', 'ISO_8859-2', 'CP1251']
 
         self.profile_data['codePages'] = {i: cp for i, cp in self.profile_data['codePages'].items() if (cp not in self.unsupportedCodepages) and (cp not in self.nonstandardCodepages)}
+
+        self.profile_data['serial'] = dict(defaultSerialSettings)
+
+        # NV graphics (GS ( L) are untested on this printer. enable with {"features": {"nvGraphics": true}} in the profile overrides, then run upload-graphics
+        self.profile_data['features'] = dict(self.profile_data['features'], nvGraphics=False)
+        # graphics stored in the printer by upload-graphics, see NVGraphicsTable
+        self.profile_data['nvGraphics'] = {}
+
+
+def loadProfile(path=None, profile=None):
+    """
+    Create a printer profile (LMP201 by default) and apply the overrides from the JSON file at path.
+    Top level keys of the JSON object replace the profile data. If both values are objects, they are merged instead.
+    e.g. {"serial": {"baudrate": 115200}} only changes the baud rate.
+    """
+    if profile is None:
+        profile = LMP201()
+
+    if path is None:
+        return profile
+
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(profile.profile_data.get(key), dict):
+            profile.profile_data[key] = {**profile.profile_data[key], **value}
+        else:
+            profile.profile_data[key] = value
+
+    return profile
+
+
+def saveProfileSettings(path, key, settings, replace=False):
+    """merge settings into the profile overrides saved in the JSON file at path, creating it if necessary. replace -- replace the settings under key instead of merging them"""
+    overrides = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        pass
+
+    overrides[key] = settings if replace else {**overrides.get(key, {}), **settings}
+
+    with open(path, 'w', encoding="utf-8") as f:
+        json.dump(overrides, f, indent=4)
+        f.write('\n')
+
+    return overrides
@@ -0,0 +1,96 @@
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from typing import List, Optional
+
+
+class Profiler(object):
+    """
+    Profiles CPU time with cProfile and memory with tracemalloc, and saves the results to timestamped files in directory:
+        {label}-{timestamp}-cpu.prof -- cProfile stats, e.g. for python -m pstats or snakeviz
+        {label}-{timestamp}-cpu.txt -- the functions with the most cumulative time
+        {label}-{timestamp}-mem.txt -- the lines that allocated the most memory that is still in use at the end, and the peak memory use. on Python 3.8 and older the peak can't be reset, so if tracing was already running it covers everything since then
+        {label}-{timestamp}-mem.tracemalloc -- the tracemalloc snapshot, for Snapshot.load
+
+    cProfile only profiles the thread that started it, so start and stop the profiler on the thread that does the work (e.g. around a print, see ZineMachine.profileNextPrint).
+    tracemalloc traces every thread.
+
+    cpu, mem -- which profilers to run
+    top -- number of functions and allocators listed in the text reports
+    frames -- stack frames kept for each allocation. more frames show more of the call stack in the snapshot, but use more memory
+    """
+
+    def __init__(self, directory='profiles', cpu=True, mem=False, top=30, frames=10):
+        self.directory = directory
+        self.cpu = cpu
+        self.mem = mem
+        self.top = top
+        self.frames = frames
+        self.profile: Optional[cProfile.Profile] = None
+        self.startedTracing = False
+        self.peakSinceStart = False
+
+    def start(self):
+        if self.mem and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.startedTracing = True
+        if self.mem:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+                self.peakSinceStart = True
+            else:
+                # Python 3.8 and older can't reset the peak, so it covers everything since tracing started
+                self.peakSinceStart = self.startedTracing
+        if self.cpu:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self, label) -> List[str]:
+        """stop profiling and save the results. returns the paths of the saved files"""
+        if self.profile is not None:
+            self.profile.disable()
+
+        # the snapshot is taken before the reports are written, so their allocations aren't in it
+        snapshot = None
+        if self.mem and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self.startedTracing:
+                tracemalloc.stop()
+                self.startedTracing = False
+
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}")
+        paths = []
+        if self.profile is not None:
+            self.profile.dump_stats(prefix + '-cpu.prof')
+            report = io.StringIO()
+            pstats.Stats(self.profile, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            with open(prefix + '-cpu.txt', 'w', encoding='utf-8') as f:
+                f.write(report.getvalue())
+            paths += [prefix + '-cpu.prof', prefix + '-cpu.txt']
+            self.profile = None
+
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            snapshot.dump(prefix + '-mem.tracemalloc')
+            with open(prefix + '-mem.txt', 'w', encoding='utf-8') as f:
+                f.write(f"current {current / 1024:.1f}KiB, peak {peak / 1024:.1f}KiB{'' if self.peakSinceStart else ' (since tracing started)'}\n\n")
+                for stat in snapshot.statistics('lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+            paths += [prefix + '-mem.txt', prefix + '-mem.tracemalloc']
+        return paths
+
+    @contextlib.contextmanager
+    def capture(self, label):
+        """profile the block, and save the results when it ends, even if it raises"""
+        self.start()
+        try:
+            yield
+        finally:
+            for path in self.stop(label):
+                print(f"Saved profile '{path}'")
@@ -0,0 +1,393 @@
+from typing import Iterator, List, Optional
+
+from escpos.constants import ESC, GS, TXT_STYLE
+from escpos.escpos import Escpos
+from escpos.exceptions import ImageWidthError
+from PIL import Image, ImageChops
+
+try:
+    import numpy
+except ImportError:
+    # numpy is optional. without it, images are converted by escpos (see EscposImage)
+    numpy = None
+
+
+ditherMethods = ['floyd-steinberg', 'ordered', 'threshold']
+"""dithering methods for converting images to 1-bit"""
+
+bayerMatrix = [
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+]
+"""8x8 threshold map for ordered dithering. a pixel is white if it is brighter than bayerMatrix[y % 8][x % 8] * 4 + 2"""
+
+
+def mediaWidth(profile) -> Optional[int]:
+    """printable width of the printer profile in dots, or None if the profile doesn't know it"""
+    try:
+        return int(profile.profile_data['media']['width']['pixels'])
+    except (KeyError, ValueError):
+        return None
+
+
+def isPrinterReady(image: Image.Image, width: Optional[int]) -> bool:
+    """True if the image is already in the printer's final form (see ImagePreparer): 1-bit, exactly as wide as the paper"""
+    return image.mode == '1' and width is not None and image.width == width
+
+
+def rasterFormat(image: Image.Image) -> bytes:
+    """ESC/POS raster data for a 1-bit image. PIL stores black as 0, the printer expects black as 1. rows are padded to whole bytes with white"""
+    if numpy is not None:
+        # several times faster than PIL's 1-bit packing
+        return numpy.packbits(~numpy.asarray(image, dtype=bool), axis=1).tobytes()
+    return ImageChops.invert(image).tobytes()
+
+
+def greyscale(image: Image.Image) -> Image.Image:
+    """greyscale copy of an image, with transparent pixels over a white background, the same as EscposImage"""
+    if image.mode in ('RGBA', 'LA', 'PA', 'P') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.split()[3])
+        return flattened.convert('L')
+    return image.convert('L')
+
+
+def rasterHeader(widthBytes, height) -> bytes:
+    """GS v 0 header for a raster image in normal density"""
+    return GS + b"v0" + bytes([0]) + Escpos._int_low_high(widthBytes, 2) + Escpos._int_low_high(height, 2)
+
+
+def feedCommands(dots) -> bytes:
+    """ESC J commands that feed the paper by a number of dots, at most 255 per command"""
+    return b"".join(ESC + b"J" + bytes([min(255, dots - fed)]) for fed in range(0, dots, 255))
+
+
+def transmitSeconds(byteCount, profile) -> float:
+    """time to send a number of bytes over the printer's serial link: 10 bits per byte (8N1) at the profile's baud rate"""
+    return byteCount * 10 / profile.profile_data['serial']['baudrate']
+
+
+class RasterImage(object):
+    """
+    A 1-bit image packed in ESC/POS raster format, converted with numpy.
+
+    rows -- uint8 array with shape (height, widthBytes). each row is packed 8 pixels to a byte, most significant bit first, 1 is black. padding bits at the end of a row are white
+
+    Conversion is vectorized: greyscale and alpha flattening in PIL, thresholding and ordered dithering as numpy comparisons against the greyscale array, centering as padding, and packing with numpy.packbits.
+    Floyd-Steinberg error diffusion is inherently sequential, so it is done by PIL in C, on the inverted image exactly like EscposImage, so the output matches printer.image.
+    Fragments are views of rows, so splitting a tall image doesn't copy it.
+    Images taller than stripAboveRows are converted and sent one fragment at a time instead (see rasterStrips), so the memory used doesn't grow with their height.
+
+    Printing is compact by default (see commands): runs of blank rows are sent as paper feeds, and the empty columns of full width images are trimmed.
+    GS v 0 is kept for the image data itself: the other image commands in the profile (GS ( L graphics and ESC * column images) send the same dots with more framing.
+    """
+
+    stripAboveRows: Optional[int] = 2048
+    """images taller than this are converted a fragment at a time by printImage (see rasterStrips). None to always convert images whole"""
+
+    def __init__(self, rows, width: int):
+        self.rows = rows
+        self.width = width
+
+    @property
+    def height(self):
+        return self.rows.shape[0]
+
+    @property
+    def widthBytes(self):
+        return self.rows.shape[1]
+
+    @staticmethod
+    def fromImage(image: Image.Image, dither='floyd-steinberg', width: Optional[int]=None) -> 'RasterImage':
+        """
+        convert an image with the given dither method (see ditherMethods).
+        width -- if provided, the image is centered on a white background this wide
+        """
+        if numpy is None:
+            raise ImportError("RasterImage requires numpy")
+
+        return RasterImage.fromArray(RasterImage.ditherArray(greyscale(image), dither), width)
+
+    @staticmethod
+    def fromArray(black, width: Optional[int]=None) -> 'RasterImage':
+        """
+        pack a bool array with shape (height, width), True where the dot is black.
+        width -- if provided, the dots are centered on a white background this wide
+        """
+        if width is not None and width > black.shape[1]:
+            left = int((width - black.shape[1]) / 2)
+            black = numpy.pad(black, ((0, 0), (left, width - black.shape[1] - left)))
+
+        return RasterImage(numpy.packbits(black, axis=1), black.shape[1])
+
+    @staticmethod
+    def ditherArray(grey: Image.Image, dither):
+        """bool array with shape (height, width), True where the dot is black"""
+        if dither == 'floyd-steinberg':
+            # dither the inverted image, like EscposImage, so dots land in the same places
+            return numpy.asarray(ImageChops.invert(grey).convert('1'), dtype=bool)
+
+        pixels = numpy.asarray(grey)
+        if dither == 'threshold':
+            return pixels < 128
+        if dither == 'ordered':
+            thresholds = numpy.array(bayerMatrix, dtype=numpy.uint8) * 4 + 2
+            height, width = pixels.shape
+            tiled = numpy.tile(thresholds, ((height + 7) // 8, (width + 7) // 8))[:height, :width]
+            return pixels <= tiled
+
+        raise ValueError(f"Unknown dither method '{dither}'. Expected one of {ditherMethods}")
+
+    def fragments(self, fragmentHeight=960) -> List:
+        """the image split into fragments of at most fragmentHeight rows. each fragment is a view of rows"""
+        return [self.rows[top:top + fragmentHeight] for top in range(0, self.height, fragmentHeight)]
+
+    def toImage(self) -> Image.Image:
+        """1-bit PIL image, e.g. to save or compare the raster"""
+        return ImageChops.invert(Image.frombytes('1', (self.width, self.height), self.rows.tobytes()))
+
+    def commands(self, fragmentHeight=960, paperWidth: Optional[int]=None) -> Iterator:
+        """
+        compact ESC/POS commands for the image, that print the same dots as one GS v 0 command per fragment:
+         - runs of blank rows are replaced with ESC J paper feeds, if the feed is shorter than the rows
+         - if the image is exactly paperWidth wide, empty columns at the edges of each fragment are trimmed to whole bytes.
+           a fragment is either left aligned and trimmed on the right, or centered and trimmed by the same amount on both sides, whichever is smaller.
+           the alignment is set with ESC a before trimmed fragments and is left as is afterwards
+        """
+        blank = ~self.rows.any(axis=1)
+        # rows where blank changes, so [0, *changes, height] are the boundaries of alternating blank and printed runs
+        changes = numpy.flatnonzero(blank[1:] != blank[:-1]) + 1
+        boundaries = [0] + changes.tolist() + [self.height]
+        trim = paperWidth is not None and self.widthBytes * 8 == paperWidth
+        align = None
+
+        top = 0
+        for start, end in zip(boundaries, boundaries[1:]):
+            rows = end - start
+            feed = feedCommands(rows)
+            # skipping rows inside the image costs an extra raster header
+            if not blank[start] or rows * self.widthBytes <= len(feed) + 8:
+                continue
+
+            for command in self.rasterCommands(top, start, fragmentHeight, trim, align):
+                if command[:2] == ESC + b"a":
+                    align = command
+                yield command
+            yield feed
+            top = end
+
+        yield from self.rasterCommands(top, self.height, fragmentHeight, trim, align)
+
+    def rasterCommands(self, top, bottom, fragmentHeight, trim, align) -> Iterator:
+        """GS v 0 commands for rows top to bottom. align is the last ESC a command sent, or None"""
+        for fragmentTop in range(top, bottom, fragmentHeight):
+            fragment = self.rows[fragmentTop:min(bottom, fragmentTop + fragmentHeight)]
+            columns = fragment.any(axis=0)
+            if not columns.any():
+                # short blank runs are printed with the rows around them, but there may be a whole fragment of them
+                yield feedCommands(fragment.shape[0])
+                continue
+
+            if trim:
+                left = int(columns.argmax())
+                right = int(columns[::-1].argmax())
+                if 2 * min(left, right) > right:
+                    fragment = fragment[:, min(left, right):self.widthBytes - min(left, right)]
+                    fragmentAlign = TXT_STYLE['align']['center']
+                elif right > 0:
+                    fragment = fragment[:, :self.widthBytes - right]
+                    fragmentAlign = TXT_STYLE['align']['left']
+                else:
+                    # a full width fragment prints the same with any alignment
+                    fragmentAlign = align
+                if fragmentAlign != align:
+                    align = fragmentAlign
+                    yield align
+
+            yield rasterHeader(fragment.shape[1], fragment.shape[0]) + numpy.ascontiguousarray(fragment).tobytes()
+
+    def print(self, printer, fragmentHeight=960, compact=True) -> dict:
+        """
+        print with GS v 0. returns the number of bytes sent, and the number of bytes one GS v 0 command per fragment would have sent:
+            {'bytes': int, 'rasterBytes': int}
+        compact -- send the compact commands (see commands). otherwise one GS v 0 command per fragment
+        """
+        fragments = self.fragments(fragmentHeight)
+        rasterBytes = self.rows.size + 8 * len(fragments)
+        if not compact:
+            for fragment in fragments:
+                printer._raw(rasterHeader(self.widthBytes, fragment.shape[0]))
+                printer._raw(memoryview(fragment).cast('B'))
+            return {'bytes': rasterBytes, 'rasterBytes': rasterBytes}
+
+        sent = 0
+        for command in self.commands(fragmentHeight, paperWidth=mediaWidth(printer.profile)):
+            printer._raw(command)
+            sent += len(command)
+        return {'bytes': sent, 'rasterBytes': rasterBytes}
+
+
+class StripDitherer(object):
+    """
+    Dithers an image a strip of rows at a time, top to bottom, with the same dots as dithering it whole (see RasterImage.ditherArray).
+
+    method -- see ditherMethods
+    top -- the row the next strip starts at, which selects the rows of bayerMatrix for ordered dithering
+    errors -- for Floyd-Steinberg, the error diffused from the last row dithered into the row below it
+
+    PIL can't continue error diffusion from a previous strip, so Floyd-Steinberg is done here, with the integer arithmetic of PIL's 1-bit conversion, and gives identical dots.
+    Each pixel only depends on the pixels to its left and the three above it, so a block of rows is dithered in anti-diagonal wavefronts, one vectorized step per wavefront.
+    This is still several times slower than PIL, so it is only used for images too tall to convert whole (see RasterImage.stripAboveRows).
+    """
+
+    blockRows = 128
+    """rows dithered together by diffuse. a block takes width + 2 * blockRows steps, and memory proportional to blockRows * (width + 2 * blockRows)"""
+
+    def __init__(self, method='floyd-steinberg', width=0):
+        if method not in ditherMethods:
+            raise ValueError(f"Unknown dither method '{method}'. Expected one of {ditherMethods}")
+        if numpy is None:
+            raise ImportError("StripDitherer requires numpy")
+        self.method = method
+        self.top = 0
+        self.errors = numpy.zeros(width, dtype=numpy.int16)
+
+    def dither(self, grey: Image.Image):
+        """bool array with shape (height, width) for the next strip of a greyscale image, True where the dot is black"""
+        pixels = numpy.asarray(grey)
+        top = self.top
+        self.top += pixels.shape[0]
+        if self.method == 'threshold':
+            return pixels < 128
+        if self.method == 'ordered':
+            thresholds = numpy.array(bayerMatrix, dtype=numpy.uint8) * 4 + 2
+            height, width = pixels.shape
+            return pixels <= thresholds[numpy.arange(top, top + height)[:, None] % 8, numpy.arange(width)[None, :] % 8]
+
+        # dither the inverted image, like RasterImage.ditherArray, so white in the result is a black dot
+        return numpy.concatenate([self.diffuse(255 - pixels[blockTop:blockTop + self.blockRows].astype(numpy.int16)) for blockTop in range(0, pixels.shape[0], self.blockRows)])
+
+    def diffuse(self, pixels):
+        """Floyd-Steinberg for a block of pixels with shape (height, width), continuing from errors. returns True where the result is white, and updates errors"""
+        height, width = pixels.shape
+        # pixel (x, y) is in wavefront x + 2y + 3. the pixels it depends on are 1 to 3 wavefronts before it, and the first 3 hold the row above the block
+        steps = width + 2 * height + 1
+        # errors stay within +-255 and their weighted sum within +-4080, so 16 bits are enough
+        values = numpy.zeros((steps, height), dtype=numpy.int16)
+        inside = numpy.zeros((steps, height), dtype=bool)
+        for y in range(height):
+            values[2 * y + 3:2 * y + 3 + width, y] = pixels[y]
+            inside[2 * y + 3:2 * y + 3 + width, y] = True
+        # errors[t, y + 1] is the error of the pixel of row y in wavefront t. errors[:, 0] is the row above the block, its pixel x is in wavefront x + 1
+        errors = numpy.zeros((steps, height + 1), dtype=numpy.int16)
+        errors[1:width + 1, 0] = self.errors
+        white = numpy.zeros((steps, height), dtype=bool)
+
+        for t in range(3, steps):
+            one, two, three = errors[t - 1], errors[t - 2], errors[t - 3]
+            # 7/16 of the error of the pixel to the left (same row, one wavefront back), 3/16, 5/16 and 1/16 of the pixels above right, above and above left (row above, one to three wavefronts back), summed before dividing
+            level = 7 * one[1:] + 3 * one[:-1] + 5 * two[:-1] + three[:-1]
+            # PIL divides in C, rounding toward zero
+            level += 15 * (level < 0)
+            level >>= 4
+            level += values[t]
+            numpy.clip(level, 0, 255, out=level)
+            white[t] = level > 128
+            level -= 255 * white[t]
+            level *= inside[t]
+            errors[t, 1:] = level
+
+        # the last row of the block is in wavefronts 2 * height + 1 onwards
+        self.errors = errors[2 * height + 1:2 * height + 1 + width, height].copy()
+        result = numpy.empty((height, width), dtype=bool)
+        for y in range(height):
+            result[y] = white[2 * y + 3:2 * y + 3 + width, y]
+        return result
+
+
+def rasterStrips(image: Image.Image, dither='floyd-steinberg', width: Optional[int]=None, stripHeight=960) -> Iterator[RasterImage]:
+    """
+    convert an image to RasterImages of at most stripHeight rows, top to bottom, with the same dots as RasterImage.fromImage.
+    each strip is cropped, flattened, dithered and packed when it is needed, so the memory used besides the decoded image depends on stripHeight and not on the height of the image,
+    and the first strip can be sent before the rest of the image is converted
+    width -- if provided, the image is centered on a white background this wide
+    """
+    ditherer = StripDitherer(dither, image.width)
+    for top in range(0, image.height, stripHeight):
+        strip = image.crop((0, top, image.width, min(image.height, top + stripHeight)))
+        yield RasterImage.fromArray(ditherer.dither(greyscale(strip)), width)
+
+
+def printRasters(printer, rasters, fragmentHeight=960, compact=True) -> dict:
+    """print RasterImages one after the other, e.g. the strips of rasterStrips, each as soon as it is converted. returns the bytes sent, see RasterImage.print"""
+    stats = {'bytes': 0, 'rasterBytes': 0}
+    for raster in rasters:
+        for key, value in raster.print(printer, fragmentHeight=fragmentHeight, compact=compact).items():
+            stats[key] += value
+    return stats
+
+
+def printRaster(printer, image: Image.Image, fragmentHeight=960, compact=True) -> dict:
+    """
+    print a 1-bit image with GS v 0, split into fragments of at most fragmentHeight rows, the same as printer.image(impl='bitImageRaster').
+    returns the bytes sent, see RasterImage.print
+    compact -- with numpy, send compact commands (see RasterImage.commands)
+    """
+    widthBytes = (image.width + 7) >> 3
+    if numpy is not None:
+        def packed(rows: Image.Image):
+            return RasterImage(numpy.frombuffer(rasterFormat(rows), dtype=numpy.uint8).reshape(rows.height, widthBytes), image.width)
+
+        if RasterImage.stripAboveRows is not None and image.height > RasterImage.stripAboveRows:
+            # pack and send a fragment at a time
+            strips = (packed(image.crop((0, top, image.width, min(image.height, top + fragmentHeight)))) for top in range(0, image.height, fragmentHeight))
+            return printRasters(printer, strips, fragmentHeight=fragmentHeight, compact=compact)
+        return packed(image).print(printer, fragmentHeight=fragmentHeight, compact=compact)
+
+    data = rasterFormat(image)
+
+    for top in range(0, image.height, fragmentHeight):
+        height = min(fragmentHeight, image.height - top)
+        printer._raw(rasterHeader(widthBytes, height) + data[top * widthBytes:(top + height) * widthBytes])
+    rasterBytes = len(data) + 8 * len(range(0, image.height, fragmentHeight))
+    return {'bytes': rasterBytes, 'rasterBytes': rasterBytes}
+
+
+def printImage(printer, path, dither='floyd-steinberg', compact=True, **imageOptions) -> Optional[dict]:
+    """
+    print an image, converting it with the fastest method available:
+     - images that have been prepared for this printer (see ImagePreparer) are sent as is without any conversion
+     - with numpy, images are converted by RasterImage. images taller than RasterImage.stripAboveRows are converted and sent a fragment at a time (see rasterStrips)
+     - otherwise, printer.image
+    imageOptions are the options for printer.image. prepared and RasterImage images support fragment_height and center
+    dither -- see ditherMethods. without numpy, images are always dithered with Floyd-Steinberg
+    compact -- with numpy, skip blank rows and trim empty columns (see RasterImage.commands)
+    returns the bytes sent and the bytes of the plain raster image (see RasterImage.print), or None if the image was printed by printer.image
+    """
+    rasterOptions = imageOptions.get('impl', 'bitImageRaster') == 'bitImageRaster' and imageOptions.get('high_density_vertical', True) and imageOptions.get('high_density_horizontal', True)
+    if isinstance(printer, Escpos) and rasterOptions:
+        width = mediaWidth(printer.profile)
+        fragmentHeight = imageOptions.get('fragment_height', 960)
+        with Image.open(path) as image:
+            if isPrinterReady(image, width):
+                return printRaster(printer, image, fragmentHeight=fragmentHeight, compact=compact)
+
+            if numpy is not None:
+                if width is not None and image.width > width:
+                    raise ImageWidthError('{} > {}'.format(image.width, width))
+                centerWidth = width if imageOptions.get('center', False) else None
+                if RasterImage.stripAboveRows is not None and image.height > RasterImage.stripAboveRows:
+                    strips = rasterStrips(image, dither=dither, width=centerWidth, stripHeight=fragmentHeight)
+                    return printRasters(printer, strips, fragmentHeight=fragmentHeight, compact=compact)
+                raster = RasterImage.fromImage(image, dither=dither, width=centerWidth)
+                return raster.print(printer, fragmentHeight=fragmentHeight, compact=compact)
+
+    printer.image(path, **imageOptions)
+    return None
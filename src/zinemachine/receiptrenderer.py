@@ -0,0 +1,356 @@
+from typing import Dict, List, Optional, Tuple
+
+from escpos.magicencode import Encoder
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+DLE = 0x10
+ESC = 0x1b
+GS = 0x1d
+
+escParameterCounts = {
+    b'@': 0, b'!': 1, b'-': 1, b'2': 0, b'3': 1, b'E': 1, b'G': 1, b'J': 1, b'M': 1, b'R': 1,
+    b'V': 1, b'a': 1, b'd': 1, b'p': 3, b't': 1, b'{': 1,
+}
+"""number of parameter bytes of the fixed length ESC commands"""
+
+gsParameterCounts = {
+    b'!': 1, b'B': 1, b'H': 1, b'L': 2, b'P': 2, b'W': 2, b'b': 1, b'f': 1, b'h': 1, b'w': 1, b'|': 1,
+}
+"""number of parameter bytes of the fixed length GS commands"""
+
+dleParameterCounts = {
+    0x04: 1, 0x05: 1, 0x14: 3,
+}
+"""number of parameter bytes of the real-time DLE commands"""
+
+cellWidth = 12
+cellHeight = 24
+"""size of a font A character in dots"""
+
+
+class ReceiptRenderer(object):
+    """
+    Renders a stream of ESC/POS commands to the image of the printed receipt, to check what the printer would print without paper.
+
+    Raster images (GS v 0), NV graphics (GS ( L), paper feeds (ESC J, ESC d, LF) and alignment (ESC a) are rendered exactly.
+    Text is drawn in font A sized cells with a stand-in font, with its size, bold, underline and inverted styles, so it only approximates the printer's glyphs.
+    Each printed line of text is also recorded in lines as (y, alignment, text bytes), to compare what two streams print. Trailing spaces are invisible, so they are left out unless they are underlined or inverted.
+    Other commands are skipped. Unknown commands raise a ValueError, since the rest of the stream can't be parsed reliably.
+
+    The stream can be fed in pieces of any size, the way the printer receives it: an incomplete command waits for the rest of its bytes, and raster images are printed row by row as they arrive, so y is always the length of paper printed so far.
+
+    width -- paper width in dots
+    lineHeight -- default line spacing in dots
+    codepages -- {ESC t slot: codepage name} to decode text with, see profile.get_code_pages. defaults to CP437
+    """
+
+    def __init__(self, width=576, lineHeight=30, codepages: Optional[Dict[int, str]]=None):
+        self.width = width
+        self.lineHeight = lineHeight
+        self.codepages = codepages if codepages is not None else {0: 'CP437'}
+        self.pending = bytearray()
+        self.y = 0
+        self.images: List[Tuple[int, int, Image.Image]] = []
+        self.lines: List[Tuple[int, int, bytes]] = []
+        self.textLines: List[Tuple[int, int, List[tuple]]] = []
+        """(y, alignment, segments) of each printed line of text. a segment is (text, widthScale, heightScale, bold, underline, invert)"""
+        self.cuts: List[int] = []
+        self.realtimeCommands: List[bytes] = []
+        """real-time commands (DLE ...) received, for the printer to answer. cleared by whoever answers them"""
+        self.nvGraphics: Dict[bytes, Image.Image] = {}
+        """NV graphics stored by GS ( L, by key. they are kept across receipts, like the printer's NV memory"""
+        self.raster = None
+        """the raster image being received, as [x, top, widthBytes, height, rows]"""
+        self.reset()
+
+    def reset(self):
+        """ESC @. the print modes are reset, the paper and NV graphics stay"""
+        self.align = 0
+        self.lineSpacing = self.lineHeight
+        self.underline = 0
+        self.invert = 0
+        self.bold = 0
+        self.widthScale = 1
+        self.heightScale = 1
+        self.codepage = 0
+        self.lineBuffer = bytearray()
+        self.segments = []
+
+    def feed(self, data: bytes):
+        self.pending += data
+        i = 0
+        while i < len(self.pending):
+            if self.raster is not None:
+                i = self.rasterRows(i)
+                continue
+
+            byte = self.pending[i]
+            if byte == ESC:
+                end = self.escCommand(i)
+            elif byte == GS:
+                end = self.gsCommand(i)
+            elif byte == DLE:
+                end = self.dleCommand(i)
+            else:
+                end = i + 1
+                if byte == 0x0a:
+                    self.printLine()
+                elif byte == 0x09:
+                    # tab stops are every 8 characters
+                    self.addText(b' ' * (8 - len(self.lineBuffer) % 8))
+                elif byte >= 0x20:
+                    self.addText(bytes([byte]))
+
+            if end is None:
+                # wait for the rest of the command
+                break
+            i = end
+        del self.pending[:i]
+
+    def parameters(self, i, count) -> Optional[bytes]:
+        """the count parameter bytes of the command at i, or None if they haven't arrived yet"""
+        if len(self.pending) < i + 2 + count:
+            return None
+        return bytes(self.pending[i + 2:i + 2 + count])
+
+    def escCommand(self, i) -> Optional[int]:
+        if len(self.pending) < i + 2:
+            return None
+        command = bytes(self.pending[i + 1:i + 2])
+        if command not in escParameterCounts:
+            raise ValueError(f"Unknown command ESC {command!r}")
+
+        parameters = self.parameters(i, escParameterCounts[command])
+        if parameters is None:
+            return None
+
+        if command == b'@':
+            self.flushLine()
+            self.reset()
+        elif command == b'!':
+            self.bold = parameters[0] >> 3 & 1
+            self.heightScale = 2 if parameters[0] & 0x10 else 1
+            self.widthScale = 2 if parameters[0] & 0x20 else 1
+            self.underline = 1 if parameters[0] & 0x80 else 0
+        elif command == b'-':
+            self.underline = parameters[0] % 48
+        elif command == b'E':
+            self.bold = parameters[0] & 1
+        elif command == b'2':
+            self.lineSpacing = self.lineHeight
+        elif command == b'3':
+            self.lineSpacing = parameters[0]
+        elif command == b'a':
+            self.align = parameters[0] % 48
+        elif command == b't':
+            self.codepage = parameters[0]
+        elif command == b'J':
+            self.flushLine(feed=0)
+            self.y += parameters[0]
+        elif command == b'd':
+            self.printLine()
+            self.y += self.lineSpacing * max(0, parameters[0] - 1)
+        return i + 2 + len(parameters)
+
+    def gsCommand(self, i) -> Optional[int]:
+        if len(self.pending) < i + 3:
+            return None
+        command = bytes(self.pending[i + 1:i + 2])
+        if command == b'v':
+            # GS v 0 m xL xH yL yH d1...dk. the rows are printed as they arrive
+            header = self.parameters(i, 6)
+            if header is None:
+                return None
+            widthBytes = header[2] | header[3] << 8
+            height = header[4] | header[5] << 8
+            # a raster image is printed below the current line, at the start of a new line
+            self.flushLine()
+            self.raster = [self.alignedX(widthBytes * 8), self.y, widthBytes, height, bytearray()]
+            return i + 8
+        if command == b'V':
+            # GS V m, or GS V m n for the function B cuts
+            end = i + (4 if self.pending[i + 2] in (65, 66) else 3)
+            if len(self.pending) < end:
+                return None
+            self.flushLine()
+            self.cuts.append(self.y)
+            return end
+        if command == b'(':
+            # GS ( fn pL pH followed by pL + pH * 256 bytes
+            if len(self.pending) < i + 5:
+                return None
+            end = i + 5 + (self.pending[i + 3] | self.pending[i + 4] << 8)
+            if len(self.pending) < end:
+                return None
+            if self.pending[i + 2:i + 3] == b'L':
+                self.graphicsCommand(bytes(self.pending[i + 5:end]))
+            return end
+        if command == b'8':
+            # GS 8 L p1 p2 p3 p4, the long form of GS ( L
+            if len(self.pending) < i + 7:
+                return None
+            end = i + 7 + int.from_bytes(self.pending[i + 3:i + 7], 'little')
+            if len(self.pending) < end:
+                return None
+            self.graphicsCommand(bytes(self.pending[i + 7:end]))
+            return end
+        if command not in gsParameterCounts:
+            raise ValueError(f"Unknown command GS {command!r}")
+
+        parameters = self.parameters(i, gsParameterCounts[command])
+        if parameters is None:
+            return None
+        if command == b'B':
+            self.invert = parameters[0] & 1
+        elif command == b'!':
+            self.widthScale = (parameters[0] >> 4) + 1
+            self.heightScale = (parameters[0] & 0x0f) + 1
+        return i + 2 + len(parameters)
+
+    def dleCommand(self, i) -> Optional[int]:
+        """real-time commands (e.g. DLE EOT status requests) don't print anything. they are recorded in realtimeCommands"""
+        if len(self.pending) < i + 2:
+            return None
+        command = self.pending[i + 1]
+        if command not in dleParameterCounts:
+            raise ValueError(f"Unknown command DLE {command:#04x}")
+        end = i + 2 + dleParameterCounts[command]
+        if len(self.pending) < end:
+            return None
+        self.realtimeCommands.append(bytes(self.pending[i:end]))
+        return end
+
+    def rasterRows(self, i) -> int:
+        """add the raster rows that have arrived to the image being received. returns the end of the bytes used"""
+        x, top, widthBytes, height, rows = self.raster
+        end = min(len(self.pending), i + widthBytes * height - len(rows))
+        rows += self.pending[i:end]
+        if len(rows) == widthBytes * height:
+            self.raster = None
+            self.y = top + height
+            if widthBytes > 0 and height > 0:
+                self.images.append((x, top, Image.frombytes('1', (widthBytes * 8, height), bytes(rows))))
+        else:
+            self.y = top + len(rows) // widthBytes
+        return end
+
+    def graphicsCommand(self, parameters):
+        """GS ( L. NV graphics are stored by fn 67 (raster, 1 color) and printed by fn 69"""
+        fn = parameters[1]
+        if fn == 67:
+            width = parameters[6] | parameters[7] << 8
+            height = parameters[8] | parameters[9] << 8
+            self.nvGraphics[parameters[3:5]] = Image.frombytes('1', ((width + 7) // 8 * 8, height), parameters[11:])
+        elif fn == 69:
+            self.printImage(self.nvGraphics[parameters[2:4]])
+        elif fn == 65:
+            self.nvGraphics.clear()
+
+    def printImage(self, image: Image.Image):
+        self.flushLine()
+        self.images.append((self.alignedX(image.width), self.y, image))
+        self.y += image.height
+
+    def alignedX(self, width) -> int:
+        if self.align == 1:
+            return (self.width - width) // 2
+        if self.align == 2:
+            return self.width - width
+        return 0
+
+    def addText(self, text: bytes):
+        style = (self.widthScale, self.heightScale, self.bold, self.underline, self.invert)
+        characters = self.decode(text)
+        if len(self.segments) > 0 and self.segments[-1][1:] == style:
+            self.segments[-1] = (self.segments[-1][0] + characters,) + style
+        else:
+            self.segments.append((characters,) + style)
+        self.lineBuffer += text
+
+    def decode(self, text: bytes) -> str:
+        try:
+            characters = Encoder._get_codepage_char_list(self.codepages.get(self.codepage, 'CP437'))
+        except LookupError:
+            characters = None
+        return ''.join(chr(b) if b < 128 or characters is None else characters[b - 128] for b in text)
+
+    def printLine(self, feed=None):
+        """print the line buffer and feed the paper by feed dots. by default a line: the line spacing, or the height of the tallest character"""
+        text = bytes(self.lineBuffer)
+        if not self.underline and not self.invert and self.align == 0:
+            # trailing spaces only print on left aligned lines
+            text = text.rstrip(b' ')
+        if len(text) > 0:
+            self.lines.append((self.y, self.align, text))
+            self.textLines.append((self.y, self.align, self.segments))
+
+        if feed is None:
+            feed = max([cellHeight * s[2] for s in self.segments if len(s[0].strip()) > 0] + [self.lineSpacing])
+        self.lineBuffer = bytearray()
+        self.segments = []
+        self.y += feed
+
+    def flushLine(self, feed=None):
+        """print text waiting in the line buffer, if there is any"""
+        if len(self.lineBuffer) > 0:
+            self.printLine(feed)
+
+    def toImage(self, text=True) -> Image.Image:
+        """the receipt so far as a 1-bit image, black dots are 0 like any other PIL image. text -- draw the printed text"""
+        receipt = Image.new('1', (self.width, self.y), 0)
+        for x, y, image in self.images:
+            receipt.paste(image, (x, y))
+        if text:
+            glyphs = GlyphCache()
+            for y, align, segments in self.textLines:
+                self.drawLine(receipt, glyphs, y, align, segments)
+        return ImageChops.invert(receipt)
+
+    def drawLine(self, receipt, glyphs, y, align, segments):
+        lineWidth = sum(len(s[0]) * cellWidth * s[1] for s in segments)
+        lineHeight = max(cellHeight * s[2] for s in segments)
+        x = 0 if align == 0 else (self.width - lineWidth) // 2 if align == 1 else self.width - lineWidth
+        for characters, widthScale, heightScale, bold, underline, invert in segments:
+            for character in characters:
+                glyph = glyphs.get(character, widthScale, heightScale, bold)
+                # characters of a line share the baseline
+                top = y + lineHeight - glyph.height
+                if invert:
+                    receipt.paste(255, (x, top, x + glyph.width, top + glyph.height))
+                    receipt.paste(0, (x, top), glyph)
+                else:
+                    receipt.paste(255, (x, top), glyph)
+                if underline:
+                    receipt.paste(255, (x, top + glyph.height - underline, x + glyph.width, top + glyph.height))
+                x += glyph.width
+
+
+class GlyphCache(object):
+    """1-bit character cell images for ReceiptRenderer, set where the character is inked. drawn with DejaVu Sans Mono, which has the box-drawing characters, or PIL's default font if it isn't installed"""
+
+    def __init__(self):
+        try:
+            self.font = ImageFont.truetype('DejaVuSansMono.ttf', size=cellHeight - 4)
+        except OSError:
+            self.font = ImageFont.load_default(size=cellHeight - 4)
+        self.glyphs = {}
+
+    def get(self, character, widthScale=1, heightScale=1, bold=0) -> Image.Image:
+        key = (character, widthScale, heightScale, bold)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            glyph = Image.new('1', (cellWidth, cellHeight), 0)
+            draw = ImageDraw.Draw(glyph)
+            for offset in range(1 + bold):
+                draw.text((offset, 0), character, fill=255, font=self.font)
+            if widthScale * heightScale > 1:
+                glyph = glyph.resize((cellWidth * widthScale, cellHeight * heightScale))
+            self.glyphs[key] = glyph
+        return glyph
+
+
+def renderReceipt(data: bytes, width=576, lineHeight=30) -> Image.Image:
+    """render a stream of ESC/POS commands, see ReceiptRenderer"""
+    renderer = ReceiptRenderer(width=width, lineHeight=lineHeight)
+    renderer.feed(data)
+    return renderer.toImage()
@@ -0,0 +1,91 @@
+import re
+import string
+import unicodedata
+from typing import Dict, Optional, Set, Tuple
+
+from .codepageencoder import CodepagePlan
+
+
+class Transliterator(object):
+    """
+    Replaces characters the printer can't print with printable look-alikes, so nothing that reaches the encoder needs a codepage search.
+
+    Each unprintable character is replaced with the first of these that is printable:
+     1. an entry in the curated table (e.g. smart quotes -> straight quotes, ligatures -> letters)
+     2. the NFKD decomposition of the character without combining marks (e.g. 'ṃ' -> 'm', full width 'Ａ' -> 'A')
+     3. the placeholder
+
+    Replacements are cached, and text without any unprintable characters is returned after a single regex search.
+    """
+
+    defaultTable = {
+        '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'",
+        '“': '"', '”': '"', '„': '"', '‟': '"', '″': '"', '«': '"', '»': '"',
+        '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '―': '-', '−': '-',
+        '…': '...', '•': '*', '·': '*', '∙': '*', '‣': '*', '◦': '*',
+        '→': '->', '←': '<-', '↔': '<->', '⇒': '=>', '≠': '!=', '≤': '<=', '≥': '>=', '×': 'x', '÷': '/',
+        'ﬀ': 'ff', 'ﬁ': 'fi', 'ﬂ': 'fl', 'ﬃ': 'ffi', 'ﬄ': 'ffl', 'ﬅ': 'st', 'ﬆ': 'st', 'Œ': 'OE', 'œ': 'oe', 'Æ': 'AE', 'æ': 'ae', 'ß': 'ss',
+        '©': '(c)', '®': '(R)', '™': '(TM)', '№': 'No.', '€': 'EUR',
+        '½': '1/2', '¼': '1/4', '¾': '3/4',
+        '\u00a0': ' ', '\u2002': ' ', '\u2003': ' ', '\u2009': ' ', '\u200a': ' ', '\u202f': ' ',
+        '\u200b': '', '\u200c': '', '\u200d': '', '\u2060': '', '\ufeff': '', '\u00ad': '',
+    }
+    """curated replacements. entries are only used when the original character is unprintable"""
+
+    profileCache: Dict[Tuple, 'Transliterator'] = {}
+    """transliterators shared by the profiles with the same codepages, see fromProfile"""
+
+    def __init__(self, printableCharacters: Set[str], table: Dict[str, str]=defaultTable, placeholder='?'):
+        # ASCII whitespace is always allowed through, even if the printer profile doesn't list it
+        self.printableCharacters = frozenset(printableCharacters) | frozenset(string.printable)
+        self.table = table
+        self.placeholder = placeholder
+        self.cache = {}
+
+        printableClass = ''.join(re.escape(c) for c in sorted(self.printableCharacters))
+        self.unprintablePattern = re.compile('[^' + printableClass + ']')
+
+    def isPrintable(self, text):
+        return all(c in self.printableCharacters for c in text)
+
+    def replacement(self, char) -> Optional[str]:
+        """the printable replacement for an unprintable character, or None if it will be printed as the placeholder"""
+        if char in self.cache:
+            return self.cache[char]
+
+        result = None
+        if char in self.table and self.isPrintable(self.table[char]):
+            result = self.table[char]
+        else:
+            decomposed = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+            # the decomposition may contain characters with their own table entries (e.g. '…' in a compatibility form)
+            decomposed = ''.join(self.table.get(c, c) if c not in self.printableCharacters else c for c in decomposed)
+            if len(decomposed) > 0 and decomposed != char and self.isPrintable(decomposed):
+                result = decomposed
+
+        self.cache[char] = result
+        return result
+
+    def replace(self, char) -> str:
+        result = self.replacement(char)
+        return result if result is not None else self.placeholder
+
+    def transliterate(self, text: str) -> str:
+        if self.unprintablePattern.search(text) is None:
+            return text
+        return self.unprintablePattern.sub(lambda match: self.replace(match.group()), text)
+
+    def transliterateMarkup(self, text: str) -> str:
+        """transliterate zine markup, leaving tags (and their attributes, e.g. image paths) untouched"""
+        parts = re.split('(<[^>]*>)', text)
+        return ''.join(part if i % 2 == 1 else self.transliterate(part) for i, part in enumerate(parts))
+
+    @staticmethod
+    def fromProfile(profile):
+        """transliterator for every character the profile's codepages can encode. shared by every profile with the same codepages"""
+        key = tuple(sorted(profile.get_code_pages().items()))
+        transliterator = Transliterator.profileCache.get(key)
+        if transliterator is None:
+            transliterator = Transliterator(CodepagePlan.fromProfile(profile).printableCharacters)
+            Transliterator.profileCache[key] = transliterator
+        return transliterator
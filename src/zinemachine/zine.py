@@ -1,15 +1,19 @@
+import logging
 import math
 import os
 import pathlib
-import sys
 import textwrap
 from typing import List
 from datetime import date
 
-from .markup import Parser, MarkupImage, MarkupText, StrToken, MarkupGroup
+from .markup import Parser, MarkupImage, MarkupText, StrToken, MarkupGroup, plainText
+from .transliterate import Transliterator
+from .raster import printImage
+from .nvgraphics import NVGraphicsTable
+from .profile import LMP201
+from .printmetrics import timeStage
 
-YELLOW = '\033[93m'
-ENDC = '\033[0m'
+logger = logging.getLogger(__name__)
 
 
 class Zine(object):
@@ -39,7 +43,20 @@ class Zine(object):
         'center': True
     }
 
-    def __init__(self, path, category, maxFileSizeKb=1024):
+    defaultTransliterator = None
+    """shared Transliterator for the LMP201 profile, created on first use"""
+
+    streamAboveKb = 256
+    """zines larger than this are streamed, see markupWindows. None never streams"""
+    streamWindowKb = 64
+    """size of the windows a streamed zine is read in"""
+
+    def __init__(self, path, category, maxFileSizeKb=1024, transliterator=None, streaming=None):
+        """
+        maxFileSizeKb -- only the first maxFileSizeKb of the text is printed, None prints all of it. this is a policy: streamed zines use the same memory however long they are
+        transliterator -- replaces unprintable characters in the text and metadata when the zine is loaded. defaults to a Transliterator for the LMP201 profile
+        streaming -- print the zine a window at a time (see markupWindows) instead of loading all of its markup. defaults to streaming zines larger than streamAboveKb
+        """
         if not isinstance(path, str):
             raise TypeError("expected path to have type 'str' but got '{}'".format(type(path)))
         if not isinstance(category, str):
@@ -48,57 +65,31 @@ class Zine(object):
         self.path = path
         self.category = category
         self.maxFileSizeKb = maxFileSizeKb
+        if transliterator is None:
+            if Zine.defaultTransliterator is None:
+                Zine.defaultTransliterator = Transliterator.fromProfile(LMP201())
+            transliterator = Zine.defaultTransliterator
+        self.transliterator = transliterator
+        self.streaming = streaming
 
         self.metadata = None
         self.markup = None
         self.text = None
 
-    def loadMarkup(self):
+    def loadMarkup(self, metrics=None):
         """Read the zine from disk (skipping header) and parse it as markup, along with a plaintext version that has been textwrapped using self.textwrapOptions
+        Unprintable characters are transliterated as the text is parsed
+        metrics -- PrintMetrics to time the read and parse stages in
         """
-        parser = Parser()
-        text = ''
-        with open(self.path, encoding="utf-8") as f:
-            # skip the header and find the text
-            foundHeader = False
-            foundText = False
-            for line in f:
-                if foundText is False:
-                    # search for header
-                    if line.strip() == "":
-                        continue
-
-                    if foundHeader is False:
-                        if line.strip() == '-----':
-                            foundHeader = True
-                            continue
-                        else:
-                            # there is no header, consider the entire file text
-                            foundText = True
-                    else:
-                        # we are in the header
-                        if line.strip() == '-----':
-                            # found the end of the header
-                            foundText = True
-                            continue
-                        else:
-                            splitIndex = line.find(':')
-                            if splitIndex > -1:
-                                # skip metadata
-                                continue
-                            else:
-                                # the header ended abruptly
-                                foundText = True
-
-                # found the beginning of the text
-                text = line + f.read(self.maxFileSizeKb * 1000)
-
-                if f.read(1) != '':
-                    print(f"Warning: exceeded max file size. only processing the first {self.maxFileSizeKb}Kb/{math.floor(os.fstat(f.fileno()).st_size/1000)}Kb of zine '{self.path}'",
-                          file=sys.stderr)
-                break
-
-        parser.feed(text)
+        parser = Parser(transliterate=self.transliterator.transliterate)
+        with open(self.path, encoding="utf-8") as f, timeStage(metrics, 'read'):
+            text = Zine.skipHeader(f)
+            if text != '':
+                text += f.read(self.maxFileSizeKb * 1000 if self.maxFileSizeKb is not None else -1)
+                self.checkTruncated(f)
+
+        with timeStage(metrics, 'parse'):
+            parser.feed(text)
         if len(parser.errors) > 0:
             raise Exception(f"Zine: Markup parser errors in '{self.path}'", parser.errors)
         self.markup = MarkupGroup(parser.stack)
@@ -106,13 +97,14 @@ class Zine(object):
         return [self.markup, parser.text]
 
     def printZine(self, printer, baseStyles=defaultStyles, textwrapOptions=defaultTextwrapOptions, imageOptions=defaultImageOptions, qrCodeOptions=defaultQrCodeOptions,
-        printHeaderFunc=None, printFooterFunc=None):
+        printHeaderFunc=None, printFooterFunc=None, metrics=None):
+        """metrics -- PrintMetrics to count images in"""
 
         if self.metadata is None:
             self.loadMetadata()
 
-        if self.markup is None:
-            self.initMarkup(textwrapOptions=textwrapOptions)
+        if self.markup is None and not self.isStreamed():
+            self.initMarkup(textwrapOptions=textwrapOptions, metrics=metrics)
 
         if printHeaderFunc is None:
             printHeaderFunc = Zine.printHeader
@@ -122,7 +114,11 @@ class Zine(object):
 
         printer.set(**baseStyles)
         printHeaderFunc(self.metadata, self.category, printer)
-        Zine.printMarkup(self.markup, printer, path=self.path, baseStyles=baseStyles, imageOptions=imageOptions)
+        if self.isStreamed():
+            for markup in self.markupWindows(textwrapOptions=textwrapOptions, metrics=metrics):
+                Zine.printMarkup(markup, printer, path=self.path, baseStyles=baseStyles, imageOptions=imageOptions, metrics=metrics)
+        else:
+            Zine.printMarkup(self.markup, printer, path=self.path, baseStyles=baseStyles, imageOptions=imageOptions, metrics=metrics)
         printer.text('\n')
         printFooterFunc(printer, self.metadata, qrCodeOptions=qrCodeOptions)
 
@@ -131,11 +127,12 @@ class Zine(object):
         self.markup = None
 
     @staticmethod
-    def printMarkup(markup, printer, path='', baseStyles=dict(), imageOptions=defaultImageOptions):
+    def printMarkup(markup, printer, path='', baseStyles=dict(), imageOptions=defaultImageOptions, metrics=None):
+        """metrics -- PrintMetrics to time and count images in"""
         try:
             if isinstance(markup, MarkupGroup):
                 for child in markup.children:
-                    Zine.printMarkup(child, printer, path=path, baseStyles=baseStyles)
+                    Zine.printMarkup(child, printer, path=path, baseStyles=baseStyles, metrics=metrics)
             if isinstance(markup, MarkupText):
                 styles = baseStyles | markup.styles
                 # if styles != baseStyles:
@@ -143,14 +140,23 @@ class Zine(object):
                 printer.set(**styles)
                 # TODO: remember the previous style and don't set unless necessary
                 for subtext in markup.text:
-                    Zine.printMarkup(subtext, printer, path=path, baseStyles=styles)
+                    Zine.printMarkup(subtext, printer, path=path, baseStyles=styles, metrics=metrics)
             elif isinstance(markup, MarkupImage):
-                printer.image(os.path.join(os.path.dirname(path), markup.src), **imageOptions)
-                Zine.printMarkup(markup.caption, printer, path=path, baseStyles=baseStyles)
+                imagePath = os.path.join(os.path.dirname(path), markup.src)
+                with timeStage(metrics, 'images'):
+                    # images stored in the printer's NV memory are centered, like prepared images
+                    nvGraphics = NVGraphicsTable.forPrinter(printer)
+                    stored = imageOptions.get('center', False) and nvGraphics.printImage(printer, imagePath, dither=imageOptions.get('dither', 'floyd-steinberg')) is not None
+                    if not stored:
+                        printImage(printer, imagePath, **imageOptions)
+                if metrics is not None:
+                    metrics.images += 1
+                    metrics.imageCacheHits += 1 if stored else 0
+                Zine.printMarkup(markup.caption, printer, path=path, baseStyles=baseStyles, metrics=metrics)
             elif isinstance(markup, StrToken):
                 printer.text(markup.text)
         except Exception as error:
-            print(f"Zine.printMarkup error ({markup.pos}, {path}) {str(error)}")
+            logger.error(f"Zine.printMarkup error ({markup.pos}, {path}) {str(error)}", extra={'zine': path})
             printer.text(str(error) + "\n")
 
     @staticmethod
@@ -253,23 +259,25 @@ class Zine(object):
             printer.qr(metadata['url'], **qrCodeOptions)
             printer.text(metadata['url'] + "\n")
 
-        doublePadding = ((width//2) - 3) // 2
-        printer.set(double_width=True, double_height=True)
-        printer.text(" " * doublePadding)
-        printer.text("╔╤")
-        printer.set(underline=2, double_width=True, double_height=True)
-        printer.text("▓▓")
-        printer.set(double_width=True, double_height=True)
-        printer.text("╤╗")
-        printer.text("\n")
-
-        printer.text(" " * doublePadding)
-        printer.text("╠╧══╧╣")
-        printer.text("\n")
-
-        printer.text(" " * doublePadding)
-        printer.text("╚════╝")
-        printer.text("\n")
+        # the emblem is a single short command if it has been uploaded to the printer's NV memory (see upload-graphics)
+        if not NVGraphicsTable.forPrinter(printer).printEmblem(printer):
+            doublePadding = ((width//2) - 3) // 2
+            printer.set(double_width=True, double_height=True)
+            printer.text(" " * doublePadding)
+            printer.text("╔╤")
+            printer.set(underline=2, double_width=True, double_height=True)
+            printer.text("▓▓")
+            printer.set(double_width=True, double_height=True)
+            printer.text("╤╗")
+            printer.text("\n")
+
+            printer.text(" " * doublePadding)
+            printer.text("╠╧══╧╣")
+            printer.text("\n")
+
+            printer.text(" " * doublePadding)
+            printer.text("╚════╝")
+            printer.text("\n")
 
         printer.set(**styles)
         printer.text(" - Zine Machine\n")
@@ -402,39 +410,174 @@ class Zine(object):
                     break
 
                 key = "".join(line[:splitIndex].lower().split())
-                value = line[splitIndex + 1:].strip()
+                value = self.transliterator.transliterate(line[splitIndex + 1:].strip())
 
                 if key in self.metadata:
-                    print("{}Warning (Zine.extractMetadata): '{}' contains duplicate metadata field '{}'. overwriting '{}' with '{}' {}".format(YELLOW, self.path, key, self.metadata[key], value, ENDC), file=sys.stderr)
+                    logger.warning(f"'{self.path}' contains duplicate metadata field '{key}'. overwriting '{self.metadata[key]}' with '{value}'", extra={'zine': self.path})
 
                 self.metadata[key] = value
 
         if 'title' not in self.metadata:
             filename = os.path.splitext(os.path.basename(self.path))[0]
-            print(f"{YELLOW}Warning (Zine.extractMetadata): '{self.path}' does not define the required metadata field 'title'. Using '{filename}'{ENDC}", file=sys.stderr)
+            logger.warning(f"'{self.path}' does not define the required metadata field 'title'. Using '{filename}'", extra={'zine': self.path})
             self.metadata['title'] = filename
 
         return self.metadata
 
-    def initMarkup(self, textwrapOptions=defaultTextwrapOptions):
+    def initMarkup(self, textwrapOptions=defaultTextwrapOptions, metrics=None):
         """
         Load markup from disk and wrap text.
+        metrics -- PrintMetrics to time the read, parse and wrap stages in
         """
-        print("Loading zine '{}'...".format(self.path))
-        [markup, text] = self.loadMarkup()
+        logger.debug(f"Loading zine '{self.path}'...", extra={'zine': self.path})
+        [markup, text] = self.loadMarkup(metrics=metrics)
         if textwrapOptions is not None:
-            print("Text wrapping...")
-            # break up the file into a list of seperate lines and feed each line into the textwrapper individually
-            lines = "".join(text).splitlines()
-            wrapped = []
-            for line in lines:
-                sublines = textwrap.wrap(line, **textwrapOptions)
-                if len(sublines) == 0:
-                    # if textwrap returned an empty array, it was given an empty line that we want to preserve in the output
-                    wrapped.append('')
+            logger.debug("Text wrapping...", extra={'zine': self.path})
+            with timeStage(metrics, 'wrap'):
+                Zine.wrapMarkup(markup, Zine.wrapText(text, textwrapOptions), textwrapOptions=textwrapOptions)
+
+    @staticmethod
+    def wrapText(text, textwrapOptions=defaultTextwrapOptions) -> List[str]:
+        """the lines of text, textwrapped using textwrapOptions"""
+        # break up the file into a list of seperate lines and feed each line into the textwrapper individually
+        lines = "".join(text).splitlines()
+        wrapped = []
+        for line in lines:
+            sublines = textwrap.wrap(line, **textwrapOptions)
+            if len(sublines) == 0:
+                # if textwrap returned an empty array, it was given an empty line that we want to preserve in the output
+                wrapped.append('')
+                continue
+            for s in sublines:
+                wrapped.append(s)
+        return wrapped
+
+    def isStreamed(self):
+        """True if the zine is printed a window at a time, see streaming"""
+        if self.streaming is not None:
+            return self.streaming
+        return Zine.streamAboveKb is not None and os.path.getsize(self.path) > Zine.streamAboveKb * 1000
+
+    def markupWindows(self, textwrapOptions=defaultTextwrapOptions, windowKb=None, metrics=None):
+        """
+        Read, parse and wrap the zine's markup a window at a time, so memory use doesn't depend on the length of the zine.
+        Yields a MarkupGroup for each window of about windowKb (default streamWindowKb), wrapped like initMarkup. Tags that are still open at the end of a window style the text in the next ones (see Parser.takeComplete).
+        Windows end at the end of a line, so the text is wrapped the same as if the whole zine was loaded.
+        Markup errors are logged instead of raised, since the beginning of the zine has already been printed when they are found
+        metrics -- PrintMetrics to time the read, parse and wrap stages in
+        """
+        windowSize = int((windowKb if windowKb is not None else Zine.streamWindowKb) * 1000)
+        remaining = self.maxFileSizeKb * 1000 if self.maxFileSizeKb is not None else None
+        parser = Parser(transliterate=self.transliterator.transliterate)
+        reportedErrors = 0
+        # line breaks that go before the text of the next window
+        lineBreaks = ''
+        with open(self.path, encoding="utf-8") as f:
+            with timeStage(metrics, 'read'):
+                window = Zine.skipHeader(f)
+            final = window == ''
+            while not final:
+                with timeStage(metrics, 'read'):
+                    size = windowSize if remaining is None else min(windowSize, remaining)
+                    chunk = f.read(size)
+                    if len(chunk) == size:
+                        # end the window at the end of a line
+                        chunk += f.readline() if remaining is None else f.readline(remaining - size)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    window += chunk
+
+                    # read ahead, so the last window is known to be the last one
+                    lookahead = f.read(1) if remaining is None or remaining > 0 else ''
+                    if remaining is not None:
+                        remaining -= len(lookahead)
+                    final = lookahead == ''
+                    if final:
+                        self.checkTruncated(f)
+
+                with timeStage(metrics, 'parse'):
+                    parser.feed(window)
+                    # only take whole lines of text, unless it is the end of the zine
+                    nodes = parser.takeComplete(lineBoundary=not final, end=final)
+                window = lookahead
+
+                for error in parser.errors[reportedErrors:]:
+                    logger.error(f"Markup error ({error.pos}, {self.path}) {error.message}", extra={'zine': self.path})
+                reportedErrors = len(parser.errors)
+
+                if len(nodes) == 0:
+                    continue
+
+                markup = MarkupGroup(nodes)
+                if textwrapOptions is not None:
+                    with timeStage(metrics, 'wrap'):
+                        wrapped = Zine.wrapText(plainText(markup), textwrapOptions)
+                        if not final:
+                            # wrapMarkup replaces the whitespace at the end of a line with line breaks once it reaches the text of the next line, which is in the next window.
+                            # wrap the window as if it was followed by a line with a single character, and insert the line breaks it gets before the next window's text instead
+                            nextLine = StrToken('\0')
+                            markup.children.append(nextLine)
+                            wrapped.append(nextLine.text)
+                        Zine.wrapMarkup(markup, wrapped, textwrapOptions=textwrapOptions)
+
+                        firstToken = Zine.firstStrToken(markup)
+                        if firstToken is not None:
+                            firstToken.text = lineBreaks + firstToken.text
+                        if not final:
+                            markup.children.pop()
+                            lineBreaks = nextLine.text[:-1]
+
+                if len(markup.children) > 0:
+                    yield markup
+
+    @staticmethod
+    def firstStrToken(markup):
+        """the first StrToken with text in markup, or None"""
+        if isinstance(markup, StrToken):
+            return markup if len(markup.text) > 0 else None
+        children = markup.children if isinstance(markup, MarkupGroup) else \
+            markup.text if isinstance(markup, MarkupText) else \
+            [markup.caption] if isinstance(markup, MarkupImage) and markup.caption is not None else \
+            []
+        for child in children:
+            token = Zine.firstStrToken(child)
+            if token is not None:
+                return token
+        return None
+
+    @staticmethod
+    def skipHeader(f) -> str:
+        """read f up to the end of the header and return the first line of the text, or '' if there is no text"""
+        foundHeader = False
+        for line in f:
+            # search for header
+            if line.strip() == "":
+                continue
+
+            if foundHeader is False:
+                if line.strip() == '-----':
+                    foundHeader = True
                     continue
-                for s in sublines:
-                    wrapped.append(s)
+                # there is no header, consider the entire file text
+                return line
+
+            # we are in the header
+            if line.strip() == '-----':
+                # found the end of the header
+                break
+
+            splitIndex = line.find(':')
+            if splitIndex == -1:
+                # the header ended abruptly
+                return line
+            # skip metadata
+
+        # found the beginning of the text
+        return f.readline()
 
-            Zine.wrapMarkup(markup, wrapped, textwrapOptions=textwrapOptions)
+    def checkTruncated(self, f):
+        """warn if f has text left after reading maxFileSizeKb of it"""
+        if f.read(1) != '':
+            logger.warning(f"Exceeded max file size. Only processing the first {self.maxFileSizeKb}Kb/{math.floor(os.fstat(f.fileno()).st_size/1000)}Kb of zine '{self.path}'",
+                           extra={'zine': self.path})
 
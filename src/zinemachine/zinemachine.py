@@ -1,30 +1,80 @@
+import concurrent.futures
+import glob
+import itertools
+import logging
 import math
 import os
 import pathlib
-import string
 import time
 import random
 import sys
 from datetime import date
 import textwrap
 from escpos.printer import Serial
+from escpos.escpos import Escpos
 from serial.serialutil import SerialException
 from threading import Lock
+from typing import List, Optional, Tuple
 
 from .zine import Zine
 from .markup import Parser
+from .transliterate import Transliterator
+from .connectionsupervisor import ConnectionSupervisor
+from .printjob import PrintJob, StreamingPrintJob, PrintInterruptedError, RenderCache
+from .dispatcher import Dispatcher, PrinterWorker
+from .printmetrics import PrintMetrics, timeStage
+from .logsetup import JobLogger
+
+logger = logging.getLogger(__name__)
+
+zineExtensions = ['.zine', '.txt']
+
+
+def findZines(paths) -> List[str]:
+    """
+    the zine files in paths, in order and without duplicates. each path is a zine file, a directory searched recursively (hidden files and directories are ignored, like initIndex), or a glob pattern, e.g. 'zines/**/*.zine'
+    """
+    found = {}
+    for path in paths:
+        matches = sorted(glob.glob(path, recursive=True)) if glob.escape(path) != path else [path]
+        for match in matches:
+            if not os.path.isdir(match):
+                found[match] = True
+                continue
+
+            for root, dirs, files in os.walk(match):
+                dirs[:] = sorted(d for d in dirs if not d[0] == '.')
+                for f in sorted(files):
+                    if f[0] != '.' and os.path.splitext(f)[1] in zineExtensions:
+                        found[os.path.join(root, f)] = True
+    return list(found.keys())
+
+
+def categoryOf(path) -> Optional[str]:
+    """category of a zine outside of the index, e.g. zines/diy/solder.zine is in diy"""
+    pathParts = pathlib.PurePath(path).parts
+    return pathParts[1] if len(pathParts) >= 2 else pathParts[0] if len(pathParts) >= 1 else None
 
-YELLOW = '\033[93m'
-ENDC = '\033[0m'
 
 class ZineMachine(object):
     """
         categories - {categoryName: {filePath: Zine}}
         randomZines - {categoryName: {index: number, zines: Zine[]}} zines in a category are added to this list and shuffled. the next random zine selected is at the given index, which is incremented after selection
         secondsPerCharacter: estimate for how long it takes to print a single character on the printer. used to block button presses until the print is complete.
+        supervisor: ConnectionSupervisor started by initPrinter. while the printer is offline, print jobs are held until it reconnects
+        ackInterval: while printing, the printer status is checked every ackInterval bytes (at the next line boundary). an interrupted print resumes from the last line the printer acknowledged
+        continuedMarker: printed where an interrupted print resumes
+        metricsLog: MetricsLog the metrics of every zine print are recorded to. lastMetrics is the PrintMetrics of the last print
+        nextPrintProfiler: Profiler the next zine print is profiled with, see profileNextPrint
+        maxFileSizeKb: only the first maxFileSizeKb of each zine in the library is printed. None prints all of it, see Zine.maxFileSizeKb
+        dispatcher: Dispatcher that routes prints to the printers (workers, see addPrinter) when there is more than one. printerManager is the first printer
+        renderCache: RenderCache of the zines printed recently, shared by every printer
     """
 
-    def __init__(self, printerManager, secondsPerCharacter=0.0022, basePrintTime=2.0):
+    continuedMarker = "- continued -\n"
+    continuedMarkerStyles = {**Zine.defaultStyles, 'align': 'center'}
+
+    def __init__(self, printerManager, secondsPerCharacter=0.0022, basePrintTime=2.0, metricsLog=None):
         self.printerManager = printerManager
         self.categories = dict()
         self.secondsPerCharacter = secondsPerCharacter
@@ -34,81 +84,354 @@ class ZineMachine(object):
         """printLock is only used to lock the the printing flag. we don't want to queue up multiple prints"""
 
         self.randomZines = dict()
+        self.supervisor = None
+        self.ackInterval = 2048
+        self.metricsLog = metricsLog
+        self.lastMetrics = None
+        self.nextPrintProfiler = None
+        self.jobIds = itertools.count(1)
+        self.maxFileSizeKb = 1024
+
+        # like a single printer, a button press is ignored when every printer that could print it is busy
+        self.dispatcher = Dispatcher(maxPending=1)
+        self.workers = self.dispatcher.workers
+        self.renderCache = RenderCache()
+        self.renderLock = Lock()
+        """held while a zine's markup is loaded, rendered or cleared, since several printers can print the same zine at once"""
+        self.randomLock = Lock()
+        self.metricsLock = Lock()
+        """held while lastMetrics is set or nextPrintProfiler is taken, since several printers can finish or start a print at once"""
+        self.addPrinter(printerManager)
+
+    def addPrinter(self, printerManager, categories=(), name=None) -> PrinterWorker:
+        """
+        add another printer. while there is more than one printer, random zines and batches are printed on whichever printer the dispatcher chooses, see Dispatcher
+        categories -- categories pinned to the printer, see Dispatcher
+        name -- name of the printer in logs. defaults to printer-1, printer-2...
+        """
+        worker = PrinterWorker(name if name is not None else f"printer-{len(self.workers) + 1}", printerManager, categories)
+        self.dispatcher.add(worker)
+        return worker
+
+    def sendToPrinter(self, job, metrics=None, log=logger, streamed=False, printJob=None, worker=None):
+        """
+        call job(printer) and flush the output to the printer.
+        if the connection to the printer is lost or the printer goes offline (e.g. out of paper), the job is held until the supervisor reconnects.
+        ESC/POS printers resume from the last line the printer acknowledged, other printers start the job over
+        metrics -- PrintMetrics to time the render, transmit and offline stages in
+        log -- logger for the job, e.g. a JobLogger with the zine's fields
+        streamed -- render the job while it is sent instead of rendering all of it first, see StreamingPrintJob. the render stage is then timed as part of the transmit stage
+        printJob -- the job already rendered with PrintJob.render, e.g. by renderZine
+        worker -- PrinterWorker of the printer to print on. defaults to printerManager
+        """
+        printerManager = worker.printerManager if worker is not None else self.printerManager
+        supervisor = worker.supervisor if worker is not None else self.supervisor
+        printer = printerManager.printer
+        if not isinstance(printer, Escpos):
+            printJob = None
+        elif printJob is not None:
+            # rendered ahead
+            pass
+        elif streamed:
+            printJob = StreamingPrintJob(job, printer.profile)
+        else:
+            with timeStage(metrics, 'render'):
+                printJob = PrintJob.render(job, printer.profile)
+        interrupted = False
+        while True:
+            if supervisor is not None:
+                with timeStage(metrics, 'offline'):
+                    supervisor.waitUntilOnline()
+
+            try:
+                with printerManager.deviceLock:
+                    if metrics is not None:
+                        metrics.firstByte()
+                    if printJob is None:
+                        with timeStage(metrics, 'render'):
+                            job(printer)
+                        printer.device.flush()
+                    elif interrupted:
+                        sentBytes = printJob.sentBytes
+                        with timeStage(metrics, 'transmit'):
+                            printJob.resume(printer, self.continuedMarker, self.continuedMarkerStyles, ackInterval=self.ackInterval)
+                        if metrics is not None:
+                            metrics.bytes += printJob.sentBytes - sentBytes
+                            metrics.resumes += 1
+                    else:
+                        with timeStage(metrics, 'transmit'):
+                            printJob.send(printer, ackInterval=self.ackInterval)
+                        if metrics is not None:
+                            metrics.bytes += printJob.sentBytes
+                return
+            except (OSError, PrintInterruptedError) as err:
+                if supervisor is None:
+                    raise err
+
+                interrupted = True
+                resumeOffset = printJob.resumeCheckpoint()[0] if printJob is not None else 0
+                log.warning(f"Print interrupted ({err}). Waiting for printer to resume from byte {resumeOffset}...", extra={'bytes': resumeOffset})
+                supervisor.reportOffline(err)
 
     def printText(self, text, styles=Zine.defaultStyles):
-        """print some text. queues up after the current print is complete with busy waiting"""
-        while self.printing == True:
+        """
+        print some text. queues up after the current print is complete with busy waiting, and returns once the text is printed.
+        with more than one printer, the text goes to the printer the dispatcher chooses, once that printer is free
+        """
+        def job(printer):
+            printer.set(**styles)
+            printer.text(text)
+
+        if len(self.workers) > 1:
+            printed = concurrent.futures.Future()
+
+            def printOn(worker):
+                try:
+                    self.sendToPrinter(job, worker=worker)
+                except Exception as e:
+                    printed.set_exception(e)
+                    raise e
+                printed.set_result(worker)
+
+            self.dispatcher.dispatch(job=printOn, wait=True)
+            printed.result()
+            return
+
+        while True:
+            with self.printLock:
+                if self.printing is False:
+                    self.printing = True
+                    break
             time.sleep(0.5)
 
-        with self.printLock:
-            self.printing = True
-            self.printerManager.printer.set(**styles)
-            self.printerManager.printer.text(text)
-            self.printerManager.printer.device.flush()
-            self.printing = False
+        try:
+            self.sendToPrinter(job)
+        finally:
+            with self.printLock:
+                self.printing = False
 
-    def printZine(self, zine, ignoreLock=False):
-        """ignoreLock - when true, we assert that we have already acquired the print priority and we should skip the locking check (i.e. started the print in printRandomZineFromCategory)"""
+    def renderZine(self, zine, metrics=None, printerManager=None) -> Tuple[Optional[PrintJob], int]:
+        """
+        render a zine into a PrintJob for the printer ahead of sending it, see printZine. returns (printJob, characters), where characters is the length of the zine's text for the print time estimate.
+        the rendered stream is kept in renderCache until the zine's file changes (images the zine includes aren't checked), so printing it again on any printer with the same profile doesn't render it again.
+        printJob is None for zines that are rendered while they are printed: streamed zines (see Zine.isStreamed), and any zine on a printer that isn't an ESC/POS printer, which keeps the zine's markup loaded until it is printed
+        metrics -- PrintMetrics to time the read, parse, wrap and render stages in
+        printerManager -- the printer the zine is printed on. defaults to printerManager
+        """
+        printer = (printerManager if printerManager is not None else self.printerManager).printer
+        if zine.isStreamed():
+            # the markup is loaded a window at a time while printing, so estimate from the size of the file
+            characters = os.path.getsize(zine.path)
+            if zine.maxFileSizeKb is not None:
+                characters = min(characters, zine.maxFileSizeKb * 1000)
+            return None, characters
+
+        with self.renderLock:
+            if not isinstance(printer, Escpos):
+                if zine.markup is None:
+                    zine.initMarkup(metrics=metrics)
+                return None, len(zine.text)
+
+            stat = os.stat(zine.path)
+            key = (os.path.abspath(zine.path), stat.st_mtime_ns, stat.st_size, zine.maxFileSizeKb, printer.profile)
+            cached = self.renderCache.get(key)
+            if cached is not None:
+                return cached
+
+            if zine.markup is None:
+                zine.initMarkup(metrics=metrics)
+            with timeStage(metrics, 'render'):
+                printJob = PrintJob.render(lambda recorder: zine.printZine(recorder, metrics=metrics), printer.profile)
+            characters = len(zine.text)
+            # the rendered stream is all we need to print it
+            zine.clearCache()
+        self.renderCache.put(key, printJob, characters)
+        return printJob, characters
+
+    def printZine(self, zine, ignoreLock=False, start=None, rendered=None, wait=True, worker=None) -> Optional[PrintMetrics]:
+        """
+        ignoreLock - when true, we assert that we have already acquired the print priority and we should skip the locking check (i.e. started the print in printRandomZineFromCategory, or a printer's worker is printing it).
+                     printing is left to the caller
+        start - time.perf_counter() when the print was requested (e.g. the button press), for the press to first byte latency in the print metrics. defaults to now
+        rendered - (PrintMetrics, PrintJob, characters) of the zine rendered ahead with renderZine, e.g. while the previous zine of a batch was printing (see printBatch). the PrintJob and characters are None to render it here
+        wait - wait for the estimated print time before another zine can be printed. a batch sends the next zine right away, and the printer's flow control holds it back
+        worker - PrinterWorker of the printer to print on. defaults to printerManager
+        returns the PrintMetrics of the print, or None if it was ignored
+        """
+        metrics = None
+        profiler = None
+        acquired = False
         try:
             if ignoreLock is False:
                 with self.printLock:
                     if self.printing is True:
-                        print(f"{YELLOW}Printing already in progress. Ignoring request to print '{zine.path}'{ENDC}")
+                        logger.warning(f"Printing already in progress. Ignoring request to print '{zine.path}'", extra={'zine': zine.path})
                         return
 
                     self.printing = True
+                    acquired = True
+
+            fields = {'job': next(self.jobIds), 'zine': zine.path, 'category': zine.category}
+            log = JobLogger(logger, {**fields, **({'printer': worker.name} if worker is not None else {})})
+            metrics, printJob, characters = rendered if rendered is not None else (PrintMetrics(zine.path, zine.category, start=start), None, None)
+            with self.metricsLock:
+                profiler, self.nextPrintProfiler = self.nextPrintProfiler, None
+            if profiler is not None:
+                profiler.start()
 
             # estimate print time, to prevent printing another zine before this one is finished 
-            # printZine automatically initializes markup when needed, but we manually load it here so we can get the length of the text for the time estimate
-            zine.initMarkup()
-            printTime = self.secondsPerCharacter * len(zine.text) + self.basePrintTime
+            streamed = zine.isStreamed()
+            if characters is None:
+                printJob, characters = self.renderZine(zine, metrics=metrics, printerManager=worker.printerManager if worker is not None else None)
+            printTime = self.secondsPerCharacter * characters + self.basePrintTime
             endPrintTime = time.time() + printTime
-            print(f"{len(zine.text)} characters long. Estimated print time: {printTime} seconds.")
-
-            print("Printing...")
-            zine.printZine(self.printerManager.printer)
-            self.printerManager.printer.device.flush()
-
-            while time.time() < endPrintTime:
-                # wait in small incremements to prevent excessive waiting if thread isn't resumed quickly
-                time.sleep(1.0)
-
-            with self.printLock:
-                self.printing = False
-
-            print("Done printing.")
-            zine.clearCache()
+            log.info(f"{characters} characters long. Estimated print time: {printTime:.1f} seconds.", extra={'characters': characters, 'streamed': streamed})
+
+            log.info("Printing...")
+            self.sendToPrinter(lambda printer: zine.printZine(printer, metrics=metrics), metrics, log=log, streamed=streamed, printJob=printJob, worker=worker)
+
+            if wait:
+                with metrics.stage('wait'):
+                    while time.time() < endPrintTime:
+                        # wait in small incremements to prevent excessive waiting if thread isn't resumed quickly
+                        time.sleep(1.0)
+
+            metrics.finish()
+            log.info(f"Done printing. {metrics}", extra={'seconds': metrics.stages['total'], 'bytes': metrics.bytes, 'images': metrics.images})
+            with self.renderLock:
+                zine.clearCache()
+            return metrics
         except Exception as e:
+            if metrics is not None:
+                metrics.error = str(e)
+                metrics.finish()
+                log.error(f"Print failed: {e}", extra={'seconds': metrics.stages['total']})
             raise e
         finally:
-            self.printing = False
+            # an ignored request leaves the flag to the print that holds it
+            if acquired:
+                with self.printLock:
+                    self.printing = False
+            if profiler is not None:
+                for path in profiler.stop(f"print-{os.path.splitext(os.path.basename(zine.path))[0]}"):
+                    logger.info(f"Saved profile '{path}'")
+            if metrics is not None:
+                with self.metricsLock:
+                    self.lastMetrics = metrics
+                if self.metricsLog is not None:
+                    self.metricsLog.record(metrics)
+
+    def printBatch(self, zines) -> dict:
+        """
+        print zines one after the other over the same printer connection. the next zine is rendered on a background thread while the current one is sent,
+        so the printer isn't left idle between zines. a zine that fails to print is logged and the batch goes on.
+        with more than one printer, each zine goes to the next printer the dispatcher chooses for its category, and every printer renders and sends its own zines
+        returns {'zines': printed, 'failed': int, 'bytes': sent, 'seconds': float}
+        """
+        summary = {'zines': 0, 'failed': 0, 'bytes': 0}
+        start = time.perf_counter()
+        if len(self.workers) > 1:
+            summaryLock = Lock()
+
+            def job(zine, worker):
+                metrics = PrintMetrics(zine.path, zine.category)
+                try:
+                    self.printZine(zine, ignoreLock=True, rendered=(metrics, None, None), wait=False, worker=worker)
+                    outcome = 'zines'
+                except Exception:
+                    outcome = 'failed'
+                with summaryLock:
+                    summary[outcome] += 1
+                    summary['bytes'] += metrics.bytes
+
+            for zine in zines:
+                self.dispatcher.dispatch(zine.category, lambda worker, zine=zine: job(zine, worker), wait=True)
+            self.dispatcher.join()
+        else:
+            def render(zine):
+                metrics = PrintMetrics(zine.path, zine.category)
+                try:
+                    return (metrics,) + self.renderZine(zine, metrics=metrics)
+                except Exception:
+                    # printZine renders it again, and records the error
+                    with self.renderLock:
+                        zine.clearCache()
+                    return PrintMetrics(zine.path, zine.category), None, None
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='render') as renderer:
+                rendered = renderer.submit(render, zines[0]) if len(zines) > 0 else None
+                for i, zine in enumerate(zines):
+                    current = rendered.result()
+                    # at most one zine is rendered ahead, so a long batch doesn't hold every rendered zine in memory
+                    rendered = renderer.submit(render, zines[i + 1]) if i + 1 < len(zines) else None
+                    try:
+                        self.printZine(zine, rendered=current, wait=False)
+                        summary['zines'] += 1
+                    except Exception:
+                        summary['failed'] += 1
+                    summary['bytes'] += current[0].bytes
+
+        summary['seconds'] = time.perf_counter() - start
+        logger.info(f"Printed {summary['zines']} zines ({summary['failed']} failed) in {summary['seconds']:.1f}s", extra=summary)
+        return summary
+
+    def profileNextPrint(self, profiler):
+        """profile the next zine print with profiler (see Profiler). the print is profiled on the thread it runs on, so this can be called from any thread, e.g. a signal handler"""
+        self.nextPrintProfiler = profiler
 
     def printRandomZineFromCategory(self, category):
+        start = time.perf_counter()
+        if len(self.workers) > 1:
+            # each printer prints one zine at a time, so the request is only ignored when every printer that could print it is busy.
+            # the zine is picked while the dispatcher is held, so an ignored request doesn't use up a zine of the category
+            with self.dispatcher.condition:
+                worker = self.dispatcher.dispatch(category)
+                if worker is None:
+                    logger.warning(f"Printing already in progress on every printer. Ignoring request to print '{category}'", extra={'category': category})
+                    return
+
+                zine = self.nextRandomZine(category)
+                worker.submit(lambda worker: self.printZine(zine, ignoreLock=True, start=start, worker=worker))
+            return
+
         with self.printLock:
             if self.printing is True:
-                print(f"{YELLOW}Printing already in progress. Ignoring request to print '{category}'{ENDC}")
+                logger.warning(f"Printing already in progress. Ignoring request to print '{category}'", extra={'category': category})
                 return
 
             self.printing = True
 
-        if category not in self.randomZines:
-            # initialize random list
-            c = self.categories.get(category)
-            if c is None or len(c) == 0:
-                raise ValueError("No zines in category '{}'".format(category))
+        try:
+            zine = self.nextRandomZine(category)
+            self.printZine(zine, ignoreLock=True, start=start)
+        finally:
+            with self.printLock:
+                self.printing = False
+
+    def nextRandomZine(self, category) -> Zine:
+        """the next zine of category. the zines of a category are shuffled, and printed in that order before any zine repeats"""
+        with self.randomLock:
+            if category not in self.randomZines:
+                # initialize random list
+                c = self.categories.get(category)
+                if c is None or len(c) == 0:
+                    raise ValueError("No zines in category '{}'".format(category))
 
-            self.randomZines[category] = {'index': 0, 'zines': list(c.values())}
-            print("Shuffling {} zines in category {}".format(len(self.randomZines[category]['zines']), category))
-            random.shuffle(self.randomZines[category]['zines'])
+                self.randomZines[category] = {'index': 0, 'zines': list(c.values())}
+                logger.info(f"Shuffling {len(self.randomZines[category]['zines'])} zines in category {category}", extra={'category': category})
+                random.shuffle(self.randomZines[category]['zines'])
 
-        index = self.randomZines[category]['index']
-        zineCount = len(self.randomZines[category]['zines'])
-        zine = self.randomZines[category]['zines'][index]
-        print(f"Printing random zine ({index+1}/{zineCount}) from category '{category}': {zine.metadata['title']}")
+            index = self.randomZines[category]['index']
+            zineCount = len(self.randomZines[category]['zines'])
+            zine = self.randomZines[category]['zines'][index]
+            logger.info(f"Printing random zine ({index+1}/{zineCount}) from category '{category}': {zine.metadata['title']}", extra={'zine': zine.path, 'category': category})
 
-        self.randomZines[category]['index'] = (index + 1) % zineCount
+            self.randomZines[category]['index'] = (index + 1) % zineCount
+            return zine
 
-        self.printZine(zine, ignoreLock=True)
+    def printerStatus(self) -> dict:
+        """health of every printer (see PrinterWorker.getMetrics) and the render cache"""
+        return {'printers': [worker.getMetrics() for worker in self.workers], 'renderCache': self.renderCache.getMetrics()}
 
     def initIndex(self, path):
         for root, dirs, files in os.walk(path):
@@ -117,30 +440,47 @@ class ZineMachine(object):
             # ignore hidden files
             files = [f for f in files if not f[0] == '.']
             if root != path:
-                p = pathlib.PurePath(root)
-                baseCategory = p.parts[1]
+                # categories are relative to the library, which may be any path (e.g. an absolute one)
+                p = pathlib.PurePath(os.path.relpath(root, path))
+                baseCategory = p.parts[0]
                 if baseCategory not in self.categories:
                     self.categories[baseCategory] = {}
 
-                fullCategory = "/".join(p.parts[1:])
+                fullCategory = "/".join(p.parts)
 
                 for f in files:
-                    zineExts = ['.zine', '.txt']
-                    if os.path.splitext(f)[1] not in zineExts:
+                    if os.path.splitext(f)[1] not in zineExtensions:
                         continue
 
                     p = os.path.join(root, f)
-                    zine = Zine(p, fullCategory)
+                    zine = Zine(p, fullCategory, maxFileSizeKb=self.maxFileSizeKb)
                     zine.loadMetadata()
                     self.categories[baseCategory][p] = zine
 
-    def initPrinter(self):
-        connected = self.printerManager.connect()
-        if(not connected):
-            print("Printer offline. Exiting...")
+    def initPrinter(self, retries=3, timeout=5.0, supervise=True, checkInterval=10.0):
+        """
+        connect to the printers. exits if every printer is offline after all retries
+        supervise - start a ConnectionSupervisor for each printer, which checks the connection every checkInterval seconds and reconnects when the link drops.
+            a printer that is offline on startup gets no jobs until its supervisor reconnects it
+        """
+        connected = [worker.printerManager.connect(retries, timeout) for worker in self.workers]
+        if not any(connected):
+            logger.error("Printer offline. Exiting...")
             sys.exit(1)
 
-        print("Printer ready")
+        if len(self.workers) == 1:
+            logger.info("Printer ready")
+        else:
+            for worker, online in zip(self.workers, connected):
+                if not online:
+                    logger.warning(f"Printer '{worker.name}' offline", extra={'printer': worker.name})
+            logger.info(f"{sum(connected)}/{len(self.workers)} printers ready")
+
+        if supervise:
+            for worker in self.workers:
+                worker.supervisor = ConnectionSupervisor(worker.printerManager, checkInterval=checkInterval)
+                worker.supervisor.start()
+            self.supervisor = self.workers[0].supervisor
 
 
 def printCodepages(p):
@@ -193,18 +533,8 @@ def debugCodepagesUnicode(p):
 
 # returns a set of all the printable characters in all supported codepages
 def getPrintableCharacters(p):
-    cpages = list(p.magic.encoder.codepages.keys())
-
-    # start with printable ascii characters
-    printableChars = set(string.printable)
-
-    unknownEncodings = ["Unknown", "CP851", "CP853", "CP1098", "CP774", "CP772", "RK1048"]
-    for page in cpages:
-        if(page in unknownEncodings):
-            continue
-        printableChars |= set(p.magic.encoder._get_codepage_char_list(page))
-
-    return printableChars
+    """printable ascii characters, and every character the printer's codepages can encode. computed once per set of codepages"""
+    return set(Transliterator.fromProfile(p.profile).printableCharacters)
 
 
 def printFile(p, path):
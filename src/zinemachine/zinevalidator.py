@@ -1,10 +1,15 @@
+import io
 import sys
 import os
 import math
+import re
+from bisect import bisect_right
 from .markup import MarkupError, Parser, Position, MarkupGroup, MarkupText, MarkupImage, StrToken
+from .transliterate import Transliterator
+from .imagecache import ImageProbeCache
+from .profile import LMP201
 from typing import List, Set, Optional, Tuple
 
-from escpos.image import EscposImage
 from PIL import Image
 
 class ZineValidationDiagnostic(object):
@@ -50,10 +55,24 @@ class InvalidHeaderError(ZineValidationError):
 class UnsupportedCharacterError(ZineValidationError):
     character: str
     text: str
-    def __init__(self, text: str, character: str, pos: Optional[Position]=None):
-        super().__init__(f"Unprintable character '{character}'", text, pos=pos)
+    def __init__(self, text: str, character: str, placeholder: str='?', pos: Optional[Position]=None):
+        super().__init__(f"Unprintable character '{character}' (U+{ord(character):04X}), will print as '{placeholder}'", text, pos=pos)
         self.character = character
 
+class TransliteratedCharacterWarning(ZineValidationWarning):
+    character: str
+    replacement: str
+    def __init__(self, text: str, character: str, replacement: str, pos: Optional[Position]=None):
+        super().__init__(f"Unprintable character '{character}' (U+{ord(character):04X}), will print as '{replacement}'", text, pos=pos)
+        self.character = character
+        self.replacement = replacement
+
+class ReplaceCharacterFix(ZineValidationFix):
+    def __init__(self, text: str, character: str, replacement: str, pos: Optional[Position]=None):
+        super().__init__(f"Replace unprintable character '{character}' (U+{ord(character):04X}) with '{replacement}'", text, pos=pos)
+        self.character = character
+        self.replacement = replacement
+
 class InvalidImageError(ZineValidationError):
     def __init__(self, message: str, text: str, src: str, pos: Optional[Position]=None):
         super().__init__(message, text, pos=pos)
@@ -71,16 +90,28 @@ BOLD = '\033[1m'
 ENDC = '\033[0m'
 
 class ZineValidator(object):
-    defaultValidCharacters = {'\t', '\n', '\x0b', '\x0c', '\r', ' ', '!', '"', '#', '$', '%', '&', "'", '(', ')', '*', '+', ',', '-', '.', '/', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', ':', ';', '<', '=', '>', '?', '@', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z', '[', '\\', ']', '^', '_', '`', 'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z', '{', '|', '}', '~', '\x80', '\xa0', '¡', '¢', '£', '¤', '¥', '¦', '§', '¨', '©', 'ª', '«', '¬', '\xad', '®', '¯', '°', '±', '²', '³', '´', 'µ', '¶', '·', '¸', '¹', 'º', '»', '¼', '½', '¾', '¿', 'À', 'Á', 'Â', 'Ã', 'Ä', 'Å', 'Æ', 'Ç', 'È', 'É', 'Ê', 'Ë', 'Ì', 'Í', 'Î', 'Ï', 'Ð', 'Ñ', 'Ò', 'Ó', 'Ô', 'Õ', 'Ö', '×', 'Ø', 'Ù', 'Ú', 'Û', 'Ü', 'Ý', 'Þ', 'ß', 'à', 'á', 'â', 'ã', 'ä', 'å', 'æ', 'ç', 'è', 'é', 'ê', 'ë', 'ì', 'í', 'î', 'ï', 'ð', 'ñ', 'ò', 'ó', 'ô', 'õ', 'ö', '÷', 'ø', 'ù', 'ú', 'û', 'ü', 'ý', 'þ', 'ÿ', 'Ă', 'ă', 'Ą', 'ą', 'Ć', 'ć', 'Č', 'č', 'Ď', 'ď', 'Đ', 'đ', 'Ę', 'ę', 'Ě', 'ě', 'ı', 'Ĺ', 'ĺ', 'Ľ', 'ľ', 'Ł', 'ł', 'Ń', 'ń', 'Ň', 'ň', 'Ő', 'ő', 'Œ', 'œ', 'Ŕ', 'ŕ', 'Ř', 'ř', 'Ś', 'ś', 'Ş', 'ş', 'Š', 'š', 'Ţ', 'ţ', 'Ť', 'ť', 'Ů', 'ů', 'Ű', 'ű', 'Ÿ', 'Ź', 'ź', 'Ż', 'ż', 'Ž', 'ž', 'ƒ', 'ˆ', 'ˇ', '˘', '˙', '˛', '˜', '˝', 'Γ', 'Θ', 'Σ', 'Φ', 'Ω', 'α', 'δ', 'ε', 'π', 'σ', 'τ', 'φ', '–', '—', '‗', '‘', '’', '‚', '“', '”', '„', '†', '‡', '•', '…', '‰', '‹', '›', 'ⁿ', '₧', '€', '™', '∙', '√', '∞', '∩', '≈', '≡', '≤', '≥', '⌐', '⌠', '⌡', '─', '│', '┌', '┐', '└', '┘', '├', '┤', '┬', '┴', '┼', '═', '║', '╒', '╓', '╔', '╕', '╖', '╗', '╘', '╙', '╚', '╛', '╜', '╝', '╞', '╟', '╠', '╡', '╢', '╣', '╤', '╥', '╦', '╧', '╨', '╩', '╪', '╫', '╬', '▀', '▄', '█', '▌', '▐', '░', '▒', '▓', '■', '\uf8f0', '\uf8f1', '\uf8f2', '\uf8f3', '｡', '｢', '｣', '､', '･', 'ｦ', 'ｧ', 'ｨ', 'ｩ', 'ｪ', 'ｫ', 'ｬ', 'ｭ', 'ｮ', 'ｯ', 'ｰ', 'ｱ', 'ｲ', 'ｳ', 'ｴ', 'ｵ', 'ｶ', 'ｷ', 'ｸ', 'ｹ', 'ｺ', 'ｻ', 'ｼ', 'ｽ', 'ｾ', 'ｿ', 'ﾀ', 'ﾁ', 'ﾂ', 'ﾃ', 'ﾄ', 'ﾅ', 'ﾆ', 'ﾇ', 'ﾈ', 'ﾉ', 'ﾊ', 'ﾋ', 'ﾌ', 'ﾍ', 'ﾎ', 'ﾏ', 'ﾐ', 'ﾑ', 'ﾒ', 'ﾓ', 'ﾔ', 'ﾕ', 'ﾖ', 'ﾗ', 'ﾘ', 'ﾙ', 'ﾚ', 'ﾛ', 'ﾜ', 'ﾝ', 'ﾞ', 'ﾟ'}
-    """set of characters printable by the receipt printer"""
     defaultMaxImageWidth = 576
     """maximum width the printer can print"""
 
-    def __init__(self, validCharacters: Set[str]=defaultValidCharacters, maxImageWidth: int=defaultMaxImageWidth, resizeImages=False, resizeFilter=Image.Resampling.LANCZOS):
-        self.validCharacters = validCharacters
+    def __init__(self, validCharacters: Optional[Set[str]]=None, maxImageWidth: int=defaultMaxImageWidth, resizeImages=False, resizeFilter=Image.Resampling.LANCZOS, fixCharacters=False, profile=None, imageCache: Optional[ImageProbeCache]=None):
+        """
+        validCharacters -- set of characters printable by the receipt printer. defaults to every character the profile's codepages can encode
+        profile -- printer profile used for the default validCharacters. defaults to LMP201
+        fixCharacters -- rewrite zines, replacing unprintable characters with their transliteration (see Transliterator). A backup is saved as {FILE}.orig, unless it already exists
+        imageCache -- image facts shared between zines that reference the same images. defaults to a new in-memory cache
+        """
+        if validCharacters is None:
+            # shared by every validator for a profile with the same codepages
+            self.transliterator = Transliterator.fromProfile(profile if profile is not None else LMP201())
+        else:
+            self.transliterator = Transliterator(validCharacters)
+
+        self.validCharacters = self.transliterator.printableCharacters
         self.maxImageWidth = maxImageWidth
         self.resizeImages = resizeImages
         self.resizeFilter = resizeFilter
+        self.fixCharacters = fixCharacters
+        self.imageCache = imageCache if imageCache is not None else ImageProbeCache()
 
     def validateZine(self, path: str) -> List[ZineValidationDiagnostic]:
         """
@@ -89,98 +120,144 @@ class ZineValidator(object):
         A zine is considered invalid for any of the following reasons:
          - it does not contain a well formatted header
          - invalid or incomplete markup
-         - contains any unprintable characters for the selected printer profile
+         - contains unprintable characters with no printable transliteration for the selected printer profile
          - image src missing
          - image too wide for selected printer profile
 
         Warnings are issued for the reasons:
          - Missing header
          - Missing title metadata
+         - unprintable characters that will be transliterated when printed
+
+        With fixCharacters, unprintable characters are fixes instead, and the file is rewritten
         """
 
         errors = []
 
+        # the file is read once. the line buffer serves the header scan, markup parse and error context
         with open(path, encoding="utf-8") as f:
-            foundHeader = False
-            foundText = False
-            textOffset = None
-            textLineOffset = 0
-            text = ""
-            requiredMetadata = set(['title'])
-            metadataKeys = set()
-            for i, line in enumerate(iter(f.readline, '')):
-            # for i, line in enumerate(f, 1):
-                for j, c in enumerate(line, 1):
-                    if c not in self.validCharacters:
-                        errors.append(UnsupportedCharacterError(line, c, pos=(i + 1, j + 1)))
-
-                if foundText is False:
-                    # search for header
-                    if line.strip() == "":
+            content = f.read()
+        lines = io.StringIO(content).readlines()
+
+        characterErrors = self.validateCharacters(content)
+        unprintableCharacters = len(characterErrors) > 0
+        errors += characterErrors
+
+        foundHeader = False
+        foundText = False
+        textLineOffset = None
+        requiredMetadata = set(['title'])
+        metadataKeys = set()
+        for i, line in enumerate(lines):
+            if foundText is False:
+                # search for header
+                if line.strip() == "":
+                    continue
+
+                if foundHeader is False:
+                    if line.strip() == '-----':
+                        foundHeader = True
                         continue
-
-                    if foundHeader is False:
-                        if line.strip() == '-----':
-                            foundHeader = True
-                            continue
-                        else:
-                            # there is no header, consider the entire file text
-                            errors.append(HeaderWarning("Header missing"))
-                            foundText = True
                     else:
-                        # we are in the header
-                        if line.strip() == '-----':
-                            # found the end of the header
-                            foundText = True
-                            continue
+                        # there is no header, consider the entire file text
+                        errors.append(HeaderWarning("Header missing"))
+                        foundText = True
+                else:
+                    # we are in the header
+                    if line.strip() == '-----':
+                        # found the end of the header
+                        foundText = True
+                        continue
+                    else:
+                        splitIndex = line.find(':')
+                        if splitIndex == -1:
+                            errors.append(InvalidHeaderError("Expected ':' in key:value pair", line, pos=(i+1, 1)))
                         else:
-                            splitIndex = line.find(':')
-                            if splitIndex == -1:
-                                errors.append(InvalidHeaderError("Expected ':' in key:value pair", line, pos=(i+1, 1)))
-                            else:
-                                if len(line[0:splitIndex].strip()) == 0:
-                                    errors.append(InvalidHeaderError("Missing key in key:value pair", line, pos=(i+1, 1)))
-                                    continue
-                                if len(line[splitIndex+1:-1].strip()) == 0:
-                                    errors.append(InvalidHeaderError("Missing value in key:value pair", line, pos=(i+1, splitIndex+1)))
-                                    continue
-
-                                metadataKeys.add(line[0:splitIndex].lower())
+                            if len(line[0:splitIndex].strip()) == 0:
+                                errors.append(InvalidHeaderError("Missing key in key:value pair", line, pos=(i+1, 1)))
+                                continue
+                            if len(line[splitIndex+1:-1].strip()) == 0:
+                                errors.append(InvalidHeaderError("Missing value in key:value pair", line, pos=(i+1, splitIndex+1)))
                                 continue
-                                foundText = True
 
-                if textOffset == None:
-                    # found the beginning of the text
-                    textOffset = f.tell()
-                    text = line
-                    textLineOffset = i
+                            metadataKeys.add(line[0:splitIndex].lower())
+                            continue
 
-                # finish processing unsupported characters check
+            if textLineOffset is None:
+                # found the beginning of the text
+                textLineOffset = i
+            if foundText:
+                # the rest of the file is text. (after an invalid header line, keep checking the header)
+                break
 
-            missingMetadata = requiredMetadata - metadataKeys
-            for m in missingMetadata:
-                errors.append(HeaderWarning(f"Missing required metadata field '{m}'"))
-            if textOffset != None:
-                f.seek(textOffset)
-                text += f.read()
+        missingMetadata = requiredMetadata - metadataKeys
+        for m in missingMetadata:
+            errors.append(HeaderWarning(f"Missing required metadata field '{m}'"))
 
-            f.seek(0)
-            lines = f.readlines() #TODO: read all the lines into an array on the first pass
+        if textLineOffset is None:
+            textLineOffset = 0
+            text = ""
+        else:
+            text = "".join(lines[textLineOffset:])
 
-            parser = Parser()
+        parser = Parser()
 
-            parser.feed(text)
-            markup = MarkupGroup(parser.stack, pos=(1,1))
-            for err in parser.errors:
-                filePos = (err.pos[0] + textLineOffset, err.pos[1] + 1)
-                err.pos = filePos
-                err.level = 'error'
-                err.text = lines[filePos[0]-1]
-                errors.append(err)
+        parser.feed(text)
+        markup = MarkupGroup(parser.stack, pos=(1,1))
+        for err in parser.errors:
+            filePos = (err.pos[0] + textLineOffset, err.pos[1] + 1)
+            err.pos = filePos
+            err.level = 'error'
+            err.text = lines[filePos[0]-1]
+            errors.append(err)
 
-            errors += self.validateMarkup(markup, lines, path, textLineOffset)
+        errors += self.validateMarkup(markup, lines, path, textLineOffset)
 
-            return errors
+        if self.fixCharacters and unprintableCharacters:
+            self.rewriteCharacters(path, lines, textLineOffset)
+
+        return errors
+
+    def validateCharacters(self, text: str) -> List[ZineValidationDiagnostic]:
+        """
+        diagnostics for every unprintable character in the text of a zine file.
+        the whole file is scanned with a single regex search, and line/column positions are only computed for the characters it finds
+        """
+        matches = list(self.transliterator.unprintablePattern.finditer(text))
+        if len(matches) == 0:
+            return []
+
+        lineStarts = [0] + [m.end() for m in re.finditer('\n', text)]
+        errors = []
+        for match in matches:
+            c = match.group()
+            lineIndex = bisect_right(lineStarts, match.start()) - 1
+            lineStart = lineStarts[lineIndex]
+            lineEnd = lineStarts[lineIndex + 1] if lineIndex + 1 < len(lineStarts) else len(text)
+            line = text[lineStart:lineEnd]
+            pos = (lineIndex + 1, match.start() - lineStart + 1)
+
+            replacement = self.transliterator.replacement(c)
+            if self.fixCharacters:
+                errors.append(ReplaceCharacterFix(line, c, self.transliterator.replace(c), pos=pos))
+            elif replacement is None:
+                errors.append(UnsupportedCharacterError(line, c, self.transliterator.placeholder, pos=pos))
+            else:
+                errors.append(TransliteratedCharacterWarning(line, c, replacement, pos=pos))
+
+        return errors
+
+    def rewriteCharacters(self, path, lines, textLineOffset):
+        """save a backup of the zine to {path}.orig, unless one already exists, and replace it with a transliterated copy"""
+        header = "".join(lines[:textLineOffset])
+        text = "".join(lines[textLineOffset:])
+        if not os.path.exists(path + '.orig'):
+            # an existing backup is the true original, from an earlier --fix-chars
+            with open(path + '.orig', 'w', encoding="utf-8") as f:
+                f.write("".join(lines))
+        with open(path, 'w', encoding="utf-8") as f:
+            f.write(self.transliterator.transliterate(header))
+            f.write(self.transliterator.transliterateMarkup(text))
 
     def validateMarkup(self, markup, lines, path, lineOffset) -> List[ZineValidationDiagnostic]:
         filePos = (markup.pos[0] + lineOffset, markup.pos[1] + 1)
@@ -197,20 +274,23 @@ class ZineValidator(object):
         if isinstance(markup, MarkupImage):
             try:
                 imagePath = os.path.join(os.path.dirname(path), markup.src)
-                image = EscposImage(imagePath)
-                if image.width > self.maxImageWidth:
+                width, height = self.imageSize(imagePath)
+                if width > self.maxImageWidth:
                     if self.resizeImages == False:
-                        return [InvalidImageError(f"Image too wide for printer ({image.width}px, expecting <={self.maxImageWidth}px)", lines[filePos[0]-1], markup.src, pos=filePos)]
-
-                    # resize
-                    # copy the original file
-                    image.img_original.save(imagePath + '.orig', format=image.img_original.format)
-                    sizeRatio = self.maxImageWidth / image.img_original.width
-                    newSize = (self.maxImageWidth, math.floor(image.img_original.height * sizeRatio))
-                    resized = image.img_original.resize(newSize, resample=self.resizeFilter)
+                        return [InvalidImageError(f"Image too wide for printer ({width}px, expecting <={self.maxImageWidth}px)", lines[filePos[0]-1], markup.src, pos=filePos)]
+
+                    # resize. this is the only case where the image is decoded
+                    with Image.open(imagePath) as original:
+                        original.load()
+                        # copy the original file
+                        original.save(imagePath + '.orig', format=original.format)
+                        sizeRatio = self.maxImageWidth / original.width
+                        newSize = (self.maxImageWidth, math.floor(original.height * sizeRatio))
+                        resized = original.resize(newSize, resample=self.resizeFilter)
                     resized.save(imagePath)
+                    self.imageCache.invalidate(imagePath)
 
-                    return [ResizeImageFix(lines[filePos[0]-1], markup.src, image.img_original.size, newSize, pos=filePos)]
+                    return [ResizeImageFix(lines[filePos[0]-1], markup.src, (width, height), newSize, pos=filePos)]
 
                 return []
             except Exception as err:
@@ -218,6 +298,11 @@ class ZineValidator(object):
 
         return []
 
+    def imageSize(self, imagePath) -> Tuple[int, int]:
+        """(width, height) of an image. each version of an image is only probed once, and only its header is read"""
+        info = self.imageCache.probe(imagePath)
+        return (info['width'], info['height'])
+
     @staticmethod
     def printValidationDiagnostics(path, diagnostics):
         errors = []
@@ -306,6 +391,7 @@ class ZineValidator(object):
                 print(GREEN, end="")
             print(f"Validation complete. {len(invalidZines)} zines failed validation. {len(allErrors)} errors. {len(allWarnings)} warnings. {len(allFixes)} fixes.{ENDC}")
 
+            self.imageCache.save()
             return (allErrors, allWarnings, allFixes)
         else:
             # single file
@@ -319,4 +405,5 @@ class ZineValidator(object):
                 print(GREEN, end="")
             print(f"Validation complete. {len(groupedDiagnostics[0])} errors. {len(groupedDiagnostics[1])} warnings. {len(groupedDiagnostics[2])} fixes.{ENDC}")
 
+            self.imageCache.save()
             return groupedDiagnostics
@@ -0,0 +1,10 @@
+import random
+
+from PIL import Image
+
+
+def noiseImage(mode, size, seed=0):
+    """a reproducible image of random grey levels, converted to mode"""
+    rng = random.Random(seed)
+    image = Image.frombytes('L', size, bytes(rng.randrange(256) for _ in range(size[0] * size[1])))
+    return image.convert(mode)
@@ -0,0 +1,140 @@
+import os
+import tty
+import unittest
+from threading import Thread
+
+from escpos.printer import Serial
+from zinemachine.bufferedserial import SerialWriteBuffer, BufferedSerial
+from zinemachine.profile import LMP201
+from zinemachine.zine import Zine
+
+
+class MockDevice(object):
+    def __init__(self):
+        self.writes = []
+        self.flushes = 0
+        self.is_open = True
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        self.flushes += 1
+
+    def read(self, size=1):
+        return b'\x12'
+
+    def close(self):
+        self.is_open = False
+
+
+class PtyPrinter(object):
+    """fake printer on the other end of a pseudo terminal. records everything written to the serial device
+    status -- if not None, respond to real-time status requests (DLE EOT n) with this byte
+    """
+    def __init__(self, status=None):
+        self.status = status
+        self.master, self.slave = os.openpty()
+        # don't translate newlines
+        tty.setraw(self.slave)
+        self.devfile = os.ttyname(self.slave)
+        self.received = bytearray()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            self.received += data
+            if self.status is not None and b'\x10\x04' in self.received[-len(data) - 2:]:
+                os.write(self.master, bytes([self.status]))
+
+    def close(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+
+class TestSerialWriteBuffer(unittest.TestCase):
+    def setUp(self):
+        self.device = MockDevice()
+        self.buffer = SerialWriteBuffer(self.device, chunkSize=4)
+
+    def test_coalesce(self):
+        self.buffer.write(b'a')
+        self.buffer.write(b'bc')
+        self.assertEqual([], self.device.writes)
+
+        self.buffer.write(b'def')
+        self.assertEqual([b'abcd'], self.device.writes)
+
+        self.buffer.flush()
+        self.assertEqual([b'abcd', b'ef'], self.device.writes)
+        self.assertEqual(1, self.device.flushes)
+
+    def test_large_write(self):
+        self.buffer.write(b'a')
+        self.buffer.write(b'bcdefghijk')
+        self.assertEqual([b'abcd', b'efgh'], self.device.writes)
+
+        self.buffer.flush()
+        self.assertEqual([b'abcd', b'efgh', b'ijk'], self.device.writes)
+
+    def test_read_flushes(self):
+        self.buffer.write(b'ab')
+        self.assertEqual(b'\x12', self.buffer.read(1))
+        self.assertEqual([b'ab'], self.device.writes)
+
+    def test_stats(self):
+        self.buffer.write(b'abcdefghij')
+        self.buffer.flush()
+        self.assertEqual(10, self.buffer.stats['bytes'])
+        self.assertEqual(3, self.buffer.stats['writes'])
+        self.assertEqual(1, self.buffer.stats['flushes'])
+
+        self.buffer.resetStats()
+        self.assertEqual(0, self.buffer.stats['bytes'])
+
+    def test_passthrough(self):
+        self.assertTrue(self.buffer.is_open)
+        self.buffer.write(b'ab')
+        self.buffer.close()
+        self.assertEqual([b'ab'], self.device.writes)
+        self.assertFalse(self.buffer.is_open)
+
+
+class TestBufferedSerial(unittest.TestCase):
+    def setUp(self):
+        self.ptyPrinter = PtyPrinter()
+
+    def tearDown(self):
+        self.ptyPrinter.close()
+
+    def printZine(self, printer):
+        zine = Zine('test-zines/.test/formatted.zine', 'test')
+        zine.printZine(printer)
+        printer.device.flush()
+
+    def test_printZine(self):
+        unbuffered = Serial(devfile=self.ptyPrinter.devfile, profile=LMP201(), baudrate=9600, timeout=1, dsrdtr=True)
+        unbufferedWrites = []
+        write = unbuffered.device.write
+        unbuffered.device.write = lambda data: unbufferedWrites.append(len(data)) or write(data)
+        self.printZine(unbuffered)
+        unbuffered.close()
+
+        printer = BufferedSerial(devfile=self.ptyPrinter.devfile, profile=LMP201(), baudrate=9600, timeout=1, dsrdtr=True, chunkSize=256)
+        self.printZine(printer)
+        stats = dict(printer.device.stats)
+        bytesPerSecond = printer.device.bytesPerSecond()
+        printer.close()
+
+        self.assertEqual(sum(unbufferedWrites), stats['bytes'])
+        self.assertLess(stats['writes'], len(unbufferedWrites))
+        self.assertLessEqual(stats['writes'], stats['bytes'] // 256 + 1)
+        self.assertGreater(bytesPerSecond, 0.0)
@@ -0,0 +1,72 @@
+import unittest
+
+from escpos.printer import Dummy
+from escpos.magicencode import Encoder
+from zinemachine.codepageencoder import CodepagePlan, PlannedMagicEncode
+from zinemachine.profile import LMP201
+
+
+def decode(output, profile):
+    """decode an ESC/POS text stream back to unicode, following codepage changes (ESC t n)"""
+    slots = {int(slot): name for name, slot in profile.get_code_pages().items()}
+    text = ''
+    charList = None
+    i = 0
+    while i < len(output):
+        if output[i:i + 2] == b'\x1bt':
+            charList = Encoder._get_codepage_char_list(slots[output[i + 2]])
+            i += 3
+            continue
+        byte = output[i]
+        text += chr(byte) if byte < 128 else charList[byte - 128]
+        i += 1
+    return text
+
+
+class TestPlannedMagicEncode(unittest.TestCase):
+    def setUp(self):
+        self.profile = LMP201()
+
+    def encode(self, text, planned):
+        printer = Dummy(profile=self.profile)
+        if planned:
+            printer.magic = PlannedMagicEncode(printer)
+        for line in text.splitlines(keepends=True):
+            printer.text(line)
+        return printer.output
+
+    def test_ascii(self):
+        text = 'hello world\nthis is a zine\n'
+        self.assertEqual(self.encode(text, False), self.encode(text, True))
+
+    def test_cp437(self):
+        text = '“Don’t panic” — it’s • 30°\n╔══╗\n'
+        self.assertEqual(self.encode(text, False), self.encode(text, True))
+
+    def test_sample_zine(self):
+        with open('test-zines/.test/formatted.zine', encoding='utf-8') as f:
+            text = f.read()
+        self.assertEqual(self.encode(text, False), self.encode(text, True))
+
+    def test_codepage_switches(self):
+        text = 'Ça démarre: “¿Qué pasó?” — naïve € ▓░ Ωmega\n' * 10
+        escposOutput = self.encode(text, False)
+        plannedOutput = self.encode(text, True)
+
+        self.assertEqual(decode(escposOutput, self.profile), decode(plannedOutput, self.profile))
+        self.assertEqual(text, decode(plannedOutput, self.profile))
+        self.assertLess(plannedOutput.count(b'\x1bt'), escposOutput.count(b'\x1bt'))
+
+    def test_unencodable(self):
+        text = 'snow ☃ and 日本\n'
+        self.assertEqual('snow ? and ??\n', decode(self.encode(text, True), self.profile))
+
+
+class TestCodepagePlan(unittest.TestCase):
+    def test_segment(self):
+        plan = CodepagePlan.fromProfile(LMP201())
+        self.assertEqual([('CP437', 'abc é')], plan.segment('abc é'))
+        self.assertEqual([('CP437', 'abc'), ('CP1252', '€ é')], plan.segment('abc€ é', 'CP437'))
+
+    def test_cache(self):
+        self.assertIs(CodepagePlan.fromProfile(LMP201()), CodepagePlan.fromProfile(LMP201()))
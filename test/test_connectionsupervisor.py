@@ -0,0 +1,118 @@
+import time
+import unittest
+from threading import RLock, Thread
+
+from zinemachine.connectionsupervisor import ConnectionSupervisor
+from zinemachine.zinemachine import ZineMachine
+
+
+class MockPrinter(object):
+    def __init__(self, printerManager):
+        self.printerManager = printerManager
+        self.output = []
+        self.device = self
+
+    def text(self, txt):
+        if not self.printerManager.linkUp:
+            raise OSError('link down')
+        self.output.append(txt)
+
+    def set(self, **styles):
+        pass
+
+    def flush(self):
+        if not self.printerManager.linkUp:
+            raise OSError('link down')
+
+
+class MockPrinterManager(object):
+    """the link can be dropped and restored by setting linkUp"""
+    def __init__(self):
+        self.printerType = 'mock'
+        self.online = True
+        self.deviceLock = RLock()
+        self.linkUp = True
+        self.reopenCount = 0
+        self.printer = MockPrinter(self)
+
+    def connect(self, retries=0, timeout=0.0):
+        return self.checkOnline()
+
+    def checkOnline(self):
+        self.online = self.linkUp
+        return self.online
+
+    def reopen(self):
+        self.reopenCount += 1
+        return self.linkUp
+
+
+def waitFor(condition, timeout=2.0):
+    endTime = time.monotonic() + timeout
+    while time.monotonic() < endTime:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+class TestConnectionSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.printerManager = MockPrinterManager()
+        self.supervisor = ConnectionSupervisor(self.printerManager, checkInterval=0.01, reconnectInterval=0.01, maxReconnectInterval=0.05)
+        self.supervisor.start()
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def test_reconnect(self):
+        self.assertTrue(self.supervisor.online)
+
+        self.printerManager.linkUp = False
+        self.assertTrue(waitFor(lambda: not self.supervisor.online))
+        self.assertFalse(self.supervisor.waitUntilOnline(0.05))
+
+        self.printerManager.linkUp = True
+        self.assertTrue(self.supervisor.waitUntilOnline(2.0))
+
+        metrics = self.supervisor.getMetrics()
+        self.assertEqual(1, metrics['disconnects'])
+        self.assertEqual(1, metrics['reconnects'])
+        self.assertGreater(metrics['reconnectFailures'], 0)
+        self.assertGreater(metrics['lastReconnectSeconds'], 0.0)
+        self.assertLess(metrics['lastReconnectSeconds'], 2.0)
+        self.assertEqual(metrics['lastReconnectSeconds'], metrics['totalDowntimeSeconds'])
+        self.assertGreater(self.printerManager.reopenCount, 0)
+
+    def test_skip_check_while_printing(self):
+        with self.printerManager.deviceLock:
+            self.printerManager.linkUp = False
+            time.sleep(0.1)
+            self.assertTrue(self.supervisor.online)
+
+        self.assertTrue(waitFor(lambda: not self.supervisor.online))
+
+
+class TestZineMachineReconnect(unittest.TestCase):
+    def test_job_held_until_reconnect(self):
+        printerManager = MockPrinterManager()
+        zineMachine = ZineMachine(printerManager, secondsPerCharacter=0.0, basePrintTime=0.0)
+        zineMachine.initPrinter(checkInterval=0.01)
+        zineMachine.supervisor.reconnectInterval = 0.01
+        zineMachine.supervisor.maxReconnectInterval = 0.05
+
+        try:
+            printerManager.linkUp = False
+            thread = Thread(target=zineMachine.printText, args=['hello'])
+            thread.start()
+
+            time.sleep(0.1)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual([], printerManager.printer.output)
+
+            printerManager.linkUp = True
+            thread.join(2.0)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(['hello'], printerManager.printer.output)
+        finally:
+            zineMachine.supervisor.stop()
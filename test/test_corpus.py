@@ -0,0 +1,86 @@
+import contextlib
+import filecmp
+import io
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from zinemachine.consoleprintermanager import ConsolePrinterManager
+from zinemachine.corpus import CorpusGenerator, loadManifest, malformations
+from zinemachine.profile import LMP201
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+from zinemachine.zinevalidator import ZineValidator
+
+
+def smallGenerator(**kwargs):
+    defaults = {'zines': 60, 'medianSizeKb': 1.0, 'maxFileSizeKb': 8, 'images': 3, 'imageWidths': (32, 128)}
+    return CorpusGenerator(**{**defaults, **kwargs})
+
+
+class TestCorpusGenerator(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'corpus')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reproducible(self):
+        manifest = smallGenerator(seed=3).generate(self.path)
+        other = os.path.join(self.directory.name, 'other')
+        self.assertEqual(manifest, smallGenerator(seed=3).generate(other))
+        comparison = filecmp.dircmp(self.path, other)
+        self.assertEqual([], comparison.diff_files)
+        for category in comparison.common_dirs:
+            self.assertEqual([], comparison.subdirs[category].diff_files)
+
+        different = os.path.join(self.directory.name, 'different')
+        smallGenerator(seed=4).generate(different)
+        self.assertFalse(filecmp.cmp(os.path.join(self.path, 'category-0', 'zine-0.zine'), os.path.join(different, 'category-0', 'zine-0.zine'), shallow=False))
+
+    def test_layout(self):
+        manifest = smallGenerator(categories=3, malformedRatio=0.0).generate(self.path)
+        self.assertEqual(manifest, loadManifest(self.path))
+        self.assertEqual(['category-0', 'category-1', 'category-2'], sorted(os.listdir(self.path))[2:])
+
+        sizes = []
+        for category in os.listdir(self.path):
+            if category[0] != '.':
+                sizes += [os.path.getsize(os.path.join(self.path, category, f)) for f in os.listdir(os.path.join(self.path, category))]
+        self.assertEqual(60, len(sizes))
+        self.assertEqual(manifest['bytes'], sum(sizes))
+        self.assertLessEqual(max(sizes), 8 * 1000 + 2000)
+
+        zineMachine = ZineMachine(ConsolePrinterManager())
+        with contextlib.redirect_stdout(io.StringIO()):
+            zineMachine.initIndex(self.path)
+        self.assertEqual({'category-0': 20, 'category-1': 20, 'category-2': 20}, {c: len(z) for c, z in zineMachine.categories.items()})
+
+    def test_not_empty(self):
+        smallGenerator(zines=1).generate(self.path)
+        with self.assertRaises(ValueError):
+            smallGenerator(zines=1).generate(self.path)
+
+    def test_malformed(self):
+        manifest = smallGenerator(zines=120, malformedRatio=0.5).generate(self.path)
+        self.assertEqual(set(malformations), set(manifest['malformed'].values()))
+
+        validator = ZineValidator(profile=LMP201())
+        for category in sorted(os.listdir(self.path)):
+            if category[0] == '.':
+                continue
+            for f in sorted(os.listdir(os.path.join(self.path, category))):
+                relativePath = os.path.join(category, f)
+                malformation = manifest['malformed'].get(relativePath)
+                errors = [d for d in validator.validateZine(os.path.join(self.path, relativePath)) if d.level == 'error']
+                if malformation in [None, 'oversized']:
+                    self.assertEqual([], errors, relativePath)
+                else:
+                    self.assertNotEqual([], errors, f"{relativePath} ({malformation})")
+
+                if malformation == 'oversized':
+                    zine = Zine(os.path.join(self.path, relativePath), category, maxFileSizeKb=8)
+                    with self.assertLogs('zinemachine.zine', 'WARNING') as logs:
+                        zine.initMarkup()
+                    self.assertIn('Exceeded max file size', logs.output[0])
@@ -0,0 +1,285 @@
+import contextlib
+import io
+import os
+import socket
+import threading
+import time
+import unittest
+
+from escpos.constants import RT_STATUS_ONLINE
+from zinemachine.dispatcher import Dispatcher, PrinterWorker
+from zinemachine.emulatedprinter import EmulatedPrinterManager
+from zinemachine.networkprintermanager import NetworkPrinterManager
+from zinemachine.printjob import PrintJob, RenderCache
+from zinemachine.profile import LMP201
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+
+
+class StubPrinterManager(object):
+    def __init__(self, online=True):
+        self.printerType = 'stub'
+        self.online = online
+
+
+def loadZines(names):
+    return [Zine(os.path.join('test-zines', '.test', name), 'test') for name in names]
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = Dispatcher(maxPending=2)
+        for i in range(3):
+            self.dispatcher.add(PrinterWorker(f"printer-{i + 1}", StubPrinterManager()))
+        self.workers = self.dispatcher.workers
+
+    def tearDown(self):
+        self.dispatcher.stop()
+
+    def test_least_pending(self):
+        self.workers[0].pending = 1
+        self.workers[1].pending = 2
+        self.assertIs(self.workers[2], self.dispatcher.choose())
+
+    def test_idle_longest(self):
+        self.workers[0].idleSince = 2.0
+        self.workers[1].idleSince = 1.0
+        self.workers[2].idleSince = 3.0
+        self.assertIs(self.workers[1], self.dispatcher.choose())
+
+    def test_offline(self):
+        self.workers[0].printerManager.online = False
+        self.workers[1].pending = 1
+        self.workers[2].pending = 1
+        self.assertIs(self.workers[1], self.dispatcher.choose())
+
+        # an offline printer only gets jobs when every printer is offline
+        self.workers[1].pending = 2
+        self.workers[2].pending = 2
+        self.assertIsNone(self.dispatcher.choose(maxPending=2))
+        for worker in self.workers:
+            worker.printerManager.online = False
+        self.assertIs(self.workers[0], self.dispatcher.choose(maxPending=2))
+
+    def test_pinned(self):
+        self.workers[0].categories = {'diy'}
+        self.workers[1].pending = 1
+        self.assertIs(self.workers[0], self.dispatcher.choose('diy'))
+        # the pinned printer only prints its categories
+        self.assertIs(self.workers[2], self.dispatcher.choose('poetry'))
+        self.assertIs(self.workers[2], self.dispatcher.choose())
+
+        self.workers[0].pending = 2
+        self.assertIsNone(self.dispatcher.choose('diy', maxPending=2))
+
+    def test_all_pinned(self):
+        self.workers[0].categories = {'diy'}
+        self.workers[1].categories = {'poetry'}
+        self.workers[2].categories = {'poetry'}
+        self.workers[0].pending = 1
+        self.assertIs(self.workers[1], self.dispatcher.choose('poetry'))
+        # categories that aren't pinned go to any printer
+        self.assertIs(self.workers[1], self.dispatcher.choose('zines'))
+
+    def test_dispatch(self):
+        release = threading.Event()
+        printed = []
+        lock = threading.Lock()
+
+        def job(worker):
+            release.wait(5.0)
+            with lock:
+                printed.append(worker.name)
+
+        # every printer takes two jobs, then the dispatcher rejects the rest
+        self.assertEqual(6, len([self.dispatcher.dispatch(job=job) for _ in range(6)]))
+        self.assertIsNone(self.dispatcher.dispatch(job=job))
+        release.set()
+        self.dispatcher.join()
+        self.assertEqual(sorted(['printer-1', 'printer-2', 'printer-3'] * 2), sorted(printed))
+        self.assertEqual(2, self.workers[0].getMetrics()['jobs'])
+
+    def test_dispatch_wait(self):
+        printed = []
+        lock = threading.Lock()
+
+        def job(worker):
+            time.sleep(0.01)
+            with lock:
+                printed.append(worker.name)
+
+        for _ in range(12):
+            self.assertIsNotNone(self.dispatcher.dispatch(job=job, wait=True))
+        self.dispatcher.join()
+        self.assertEqual(12, len(printed))
+        self.assertEqual(12, sum(worker.jobs for worker in self.workers))
+        self.assertTrue(all(worker.pending == 0 for worker in self.workers))
+
+    def test_failed_job(self):
+        def job(worker):
+            raise ValueError('failed')
+
+        self.dispatcher.dispatch(job=job)
+        self.dispatcher.join()
+        self.assertEqual(1, sum(worker.failed for worker in self.workers))
+
+
+class TestRenderCache(unittest.TestCase):
+    def test_hits(self):
+        cache = RenderCache()
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', PrintJob(b'abc', [(0, None, None), (3, None, None)]), 3)
+        printJob, characters = cache.get('a')
+        self.assertEqual(b'abc', printJob.data)
+        self.assertEqual(3, characters)
+        # every hit is a new job, so it is sent from the beginning
+        printJob.confirmedOffset = 3
+        self.assertEqual(0, cache.get('a')[0].confirmedOffset)
+        self.assertEqual({'entries': 1, 'bytes': 3, 'hits': 2, 'misses': 1}, cache.getMetrics())
+
+    def test_least_recently_used(self):
+        cache = RenderCache(maxBytes=10)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, PrintJob(bytes(4), []), 4)
+            if key == 'b':
+                cache.get('a')
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(8, cache.bytes)
+
+        cache.put('d', PrintJob(bytes(11), []), 11)
+        self.assertIsNone(cache.get('d'))
+
+
+class TestMultiplePrinters(unittest.TestCase):
+    def setUp(self):
+        profile = LMP201()
+        self.printerManagers = [EmulatedPrinterManager(profile) for _ in range(2)]
+        self.zineMachine = ZineMachine(self.printerManagers[0], secondsPerCharacter=0.0, basePrintTime=0.0)
+        self.zineMachine.addPrinter(self.printerManagers[1])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.zineMachine.initPrinter(supervise=False)
+
+    def tearDown(self):
+        self.zineMachine.dispatcher.stop()
+
+    def test_print_batch(self):
+        zines = loadZines(['formatted.zine', 'invalid.zine', 'test1.zine', 'first-zine.zine'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = self.zineMachine.printBatch(zines)
+        self.assertEqual({'zines': 3, 'failed': 1}, {k: summary[k] for k in ['zines', 'failed']})
+        self.assertEqual(4, sum(worker.jobs + worker.failed for worker in self.zineMachine.workers))
+        # both printers printed
+        self.assertTrue(all(worker.jobs > 0 for worker in self.zineMachine.workers))
+
+    def test_pinned(self):
+        self.zineMachine.workers[1].categories = {'test'}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.zineMachine.printBatch(loadZines(['formatted.zine', 'test1.zine']))
+        self.assertEqual([0, 2], [worker.jobs for worker in self.zineMachine.workers])
+
+    def test_render_cache(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for worker in self.zineMachine.workers:
+                self.zineMachine.printZine(loadZines(['formatted.zine'])[0], worker=worker)
+
+        # the second printer is sent the stream rendered for the first
+        self.assertEqual(1, self.zineMachine.renderCache.hits)
+        emulators = [printerManager.emulator for printerManager in self.printerManagers]
+        self.assertEqual(emulators[0].received, emulators[1].received)
+        self.assertGreater(len(emulators[0].received), 0)
+
+    def test_random_zine(self):
+        self.zineMachine.initIndex('test-zines')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.zineMachine.printRandomZineFromCategory('test-blue')
+            self.zineMachine.dispatcher.join()
+        self.assertEqual(1, sum(worker.jobs + worker.failed for worker in self.zineMachine.workers))
+
+    def test_random_zine_busy(self):
+        self.zineMachine.initIndex('test-zines')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.zineMachine.printRandomZineFromCategory('test-blue')
+            self.zineMachine.dispatcher.join()
+        index = self.zineMachine.randomZines['test-blue']['index']
+        for worker in self.zineMachine.workers:
+            worker.pending = self.zineMachine.dispatcher.maxPending
+
+        # an ignored press doesn't skip a zine
+        self.zineMachine.printRandomZineFromCategory('test-blue')
+        self.assertEqual(index, self.zineMachine.randomZines['test-blue']['index'])
+        for worker in self.zineMachine.workers:
+            worker.pending = 0
+
+    def test_print_text(self):
+        # the first printer is printing
+        self.zineMachine.workers[0].pending = self.zineMachine.dispatcher.maxPending
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.zineMachine.printText("hello\n")
+        finally:
+            self.zineMachine.workers[0].pending = 0
+        self.zineMachine.dispatcher.join()
+
+        emulators = [printerManager.emulator for printerManager in self.printerManagers]
+        self.assertNotIn(b'hello', emulators[0].received)
+        self.assertIn(b'hello', emulators[1].received)
+        self.assertEqual(1, self.zineMachine.workers[1].jobs)
+
+    def test_status(self):
+        status = self.zineMachine.printerStatus()
+        self.assertEqual(['printer-1', 'printer-2'], [printer['name'] for printer in status['printers']])
+        self.assertTrue(all(printer['online'] for printer in status['printers']))
+        self.assertIn('hits', status['renderCache'])
+
+
+class TestNetworkPrinterManager(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.received = bytearray()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.close()
+        self.thread.join(5.0)
+
+    def serve(self):
+        """a printer that is always online"""
+        try:
+            while True:
+                connection, _ = self.server.accept()
+                with connection:
+                    while True:
+                        data = connection.recv(4096)
+                        if len(data) == 0:
+                            break
+                        self.received += data
+                        for _ in range(data.count(RT_STATUS_ONLINE)):
+                            connection.sendall(b'\x12')
+        except OSError:
+            # the server was closed
+            pass
+
+    def test_print(self):
+        printerManager = NetworkPrinterManager(LMP201(), '127.0.0.1', self.port)
+        self.assertTrue(printerManager.connect(retries=0, timeout=0.0))
+        self.assertTrue(printerManager.online)
+
+        printJob = PrintJob.render(lambda printer: printer.text("hello\nworld\n"), printerManager.profile)
+        printJob.send(printerManager.printer, ackInterval=1)
+        self.assertEqual(printJob.checkpoints[-1][0], printJob.confirmedOffset)
+        printerManager.printer.close()
+        self.thread.join(0.1)
+        # a status query after every line
+        self.assertEqual(printJob.data.replace(b'\n', b'\n' + RT_STATUS_ONLINE), bytes(self.received[len(RT_STATUS_ONLINE):]))
+
+    def test_offline(self):
+        printerManager = NetworkPrinterManager(LMP201(), '127.0.0.1', self.port)
+        self.server.close()
+        self.assertFalse(printerManager.connect(retries=0, timeout=0.0))
+        self.assertFalse(printerManager.checkOnline())
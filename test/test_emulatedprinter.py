@@ -0,0 +1,210 @@
+import contextlib
+import io
+import os
+import threading
+import unittest
+from tempfile import TemporaryDirectory
+
+from escpos.constants import RT_STATUS_ONLINE, RT_STATUS_PAPER
+from PIL import Image
+from zinemachine.emulatedprinter import PrinterEmulator, EmulatedPrinterManager, EmulatedLinkBenchmark, emulatePrint
+from zinemachine.printjob import PrintJob, PrintInterruptedError
+from zinemachine.profile import LMP201
+from zinemachine.receiptrenderer import ReceiptRenderer
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+
+
+def textLines(count):
+    return b''.join(b'line %d\n' % i for i in range(count))
+
+
+class TestPrinterEmulator(unittest.TestCase):
+    def test_transmit(self):
+        emulator = PrinterEmulator(baudrate=9600)
+        emulator.write(bytes(960))
+        self.assertAlmostEqual(1.0, emulator.now)
+        self.assertEqual(bytes(960), emulator.received)
+        self.assertEqual(0.0, emulator.stats['printSeconds'])
+
+    def test_print_speed(self):
+        # 10 lines of 30 dots at 60mm/s * 8 dots/mm
+        emulator = emulatePrint(textLines(10), baudrate=115200)
+        self.assertAlmostEqual(300 / 480, emulator.stats['printSeconds'])
+        self.assertGreaterEqual(emulator.now, emulator.stats['printSeconds'])
+        self.assertEqual(300, emulator.renderer.y)
+
+    def test_flow_control(self):
+        data = textLines(200)
+        emulator = emulatePrint(data, baudrate=115200, bufferSize=256)
+        self.assertEqual(data, emulator.received)
+        self.assertGreater(emulator.stats['stalls'], 0)
+        self.assertEqual(0, emulator.stats['droppedBytes'])
+
+        emulator = emulatePrint(data, baudrate=115200, bufferSize=256, dsrdtr=False)
+        self.assertGreater(emulator.stats['droppedBytes'], 0)
+        self.assertEqual(len(data) - emulator.stats['droppedBytes'], len(emulator.received))
+
+    def test_status(self):
+        emulator = PrinterEmulator()
+        emulator.write(RT_STATUS_ONLINE)
+        self.assertEqual(b'\x12', emulator.read(1))
+        self.assertEqual(b'', emulator.read(1))
+
+        emulator.paper = 'out'
+        emulator.write(RT_STATUS_ONLINE + RT_STATUS_PAPER)
+        self.assertEqual(b'\x1a\x72', emulator.read(2))
+        self.assertEqual(3, emulator.stats['statusQueries'])
+
+    def test_status_after_print(self):
+        # the status is answered once everything before it is printed
+        emulator = PrinterEmulator(baudrate=115200, timeout=10.0)
+        emulator.write(textLines(100) + RT_STATUS_ONLINE)
+        self.assertEqual(b'\x12', emulator.read(1))
+        self.assertAlmostEqual(3000 / 480, emulator.now, places=1)
+
+        emulator = PrinterEmulator(baudrate=115200, timeout=1.0)
+        emulator.write(textLines(100) + RT_STATUS_ONLINE)
+        sentTime = emulator.now
+        self.assertEqual(b'', emulator.read(1))
+        self.assertAlmostEqual(sentTime + 1.0, emulator.now)
+
+    def test_receipt(self):
+        renderer = ReceiptRenderer()
+        data = b'\x1b@\x1b!\x30Title\n' + b'\x1dv0\x00\x02\x00\x02\x00\xff\x00\x00\xff' + b'\x1b!\x00\x1ba\x01text\n'
+        renderer.feed(data)
+        emulator = emulatePrint(data)
+        self.assertEqual(renderer.lines, emulator.renderer.lines)
+        self.assertEqual(renderer.toImage().tobytes(), emulator.renderer.toImage().tobytes())
+        self.assertEqual(48 + 2 + 30, emulator.renderer.y)
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'receipt.png')
+            emulator.saveReceipt(path)
+            with Image.open(path) as image:
+                self.assertEqual((576, 80), image.size)
+
+
+class TestStreamingRenderer(unittest.TestCase):
+    def test_byte_at_a_time(self):
+        data = b'\x1b@text \x1b-\x01underlined\x1b-\x00\n' + b'\x1dv0\x00\x01\x00\x03\x00\xf0\x0f\xaa' + b'\x1bJ\x10\x10\x04\x01end\n'
+        whole = ReceiptRenderer()
+        whole.feed(data)
+        pieces = ReceiptRenderer()
+        for i in range(len(data)):
+            pieces.feed(data[i:i + 1])
+
+        self.assertEqual(whole.lines, pieces.lines)
+        self.assertEqual(whole.y, pieces.y)
+        self.assertEqual(whole.toImage().tobytes(), pieces.toImage().tobytes())
+        self.assertEqual([b'\x10\x04\x01'], pieces.realtimeCommands)
+
+    def test_raster_rows(self):
+        renderer = ReceiptRenderer()
+        renderer.feed(b'\x1dv0\x00\x01\x00\x04\x00\xff\xff')
+        self.assertEqual(2, renderer.y)
+        renderer.feed(b'\xff\xff')
+        self.assertEqual(4, renderer.y)
+        self.assertEqual(1, len(renderer.images))
+
+
+class TestEmulatedPrinterManager(unittest.TestCase):
+    def setUp(self):
+        self.printerManager = EmulatedPrinterManager(LMP201())
+        self.zineMachine = ZineMachine(self.printerManager, secondsPerCharacter=0.0, basePrintTime=0.0)
+
+    def test_print_zine(self):
+        self.assertTrue(self.printerManager.connect())
+        zine = Zine(os.path.join('test-zines', '.test', 'formatted.zine'), 'test')
+        with contextlib.redirect_stdout(io.StringIO()):
+            job = PrintJob.render(zine.printZine, self.printerManager.profile)
+            zine = Zine(os.path.join('test-zines', '.test', 'formatted.zine'), 'test')
+            self.zineMachine.printZine(zine)
+
+        emulator = self.printerManager.emulator
+        # the job, and the status queries sent between its checkpoints
+        self.assertGreater(emulator.stats['statusQueries'], 1)
+        self.assertEqual(len(job.data) + len(RT_STATUS_ONLINE) * emulator.stats['statusQueries'], len(emulator.received))
+        self.assertEqual([], emulator.errors)
+
+        renderer = ReceiptRenderer()
+        renderer.feed(job.data)
+        self.assertEqual(renderer.lines, emulator.renderer.lines)
+        self.assertEqual(renderer.toImage().tobytes(), emulator.renderer.toImage().tobytes())
+
+    def test_ignored_print(self):
+        self.assertTrue(self.printerManager.connect())
+        zine = Zine(os.path.join('test-zines', '.test', 'formatted.zine'), 'test')
+        # another print is in progress
+        self.zineMachine.printing = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(self.zineMachine.printZine(zine))
+            self.assertTrue(self.zineMachine.printing)
+
+            # the caller of a print that skips the check holds the flag
+            self.assertIsNotNone(self.zineMachine.printZine(zine, ignoreLock=True))
+            self.assertTrue(self.zineMachine.printing)
+
+    def test_print_batch(self):
+        paths = [os.path.join('test-zines', '.test', name) for name in ['formatted.zine', 'invalid.zine', 'test1.zine']]
+        expected = EmulatedPrinterManager(LMP201())
+        with contextlib.redirect_stdout(io.StringIO()):
+            for path in paths:
+                try:
+                    ZineMachine(expected, secondsPerCharacter=0.0, basePrintTime=0.0).printZine(Zine(path, 'test'))
+                except Exception:
+                    pass
+            summary = self.zineMachine.printBatch([Zine(path, 'test') for path in paths])
+
+        # the invalid zine fails, and the rest of the batch prints the same as printing each zine
+        self.assertEqual({'zines': 2, 'failed': 1}, {k: summary[k] for k in ['zines', 'failed']})
+        self.assertEqual(expected.emulator.received, self.printerManager.emulator.received)
+        self.assertEqual(len(self.printerManager.emulator.received) - len(RT_STATUS_ONLINE) * self.printerManager.emulator.stats['statusQueries'], summary['bytes'])
+
+    def test_batch_renders_ahead(self):
+        zines = [Zine(os.path.join('test-zines', '.test', name), 'test') for name in ['formatted.zine', 'test1.zine']]
+        renderZine = self.zineMachine.renderZine
+        sendToPrinter = self.zineMachine.sendToPrinter
+        renderedNext = threading.Event()
+        overlapped = []
+
+        def render(zine, metrics=None):
+            printJob = renderZine(zine, metrics=metrics)
+            if zine is zines[1]:
+                renderedNext.set()
+            return printJob
+
+        def send(*args, **kwargs):
+            # the second zine is rendered while the first is being sent
+            if not renderedNext.is_set():
+                overlapped.append(renderedNext.wait(5.0))
+            sendToPrinter(*args, **kwargs)
+
+        self.zineMachine.renderZine = render
+        self.zineMachine.sendToPrinter = send
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = self.zineMachine.printBatch(zines)
+        self.assertEqual([True], overlapped)
+        self.assertEqual(2, summary['zines'])
+
+    def test_offline(self):
+        self.printerManager.emulator.online = False
+        self.assertFalse(self.printerManager.checkOnline())
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(PrintInterruptedError):
+                self.zineMachine.printText("text\n")
+
+
+class TestEmulatedLinkBenchmark(unittest.TestCase):
+    def test_run(self):
+        benchmark = EmulatedLinkBenchmark(baudrates=[9600, 115200], chunkSizes=[256], flowControls=['dsrdtr'], payload=bytes(2048))
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmark.run()
+
+        # NUL bytes don't print, so the link is the bottleneck
+        self.assertAlmostEqual(960, results[0]['bytesPerSecond'])
+        self.assertAlmostEqual(11520, results[1]['bytesPerSecond'])
+        for result in results:
+            self.assertIsNone(result['error'])
+            self.assertEqual(0, result['stalls'])
+            self.assertIsNotNone(result['drainLatency'])
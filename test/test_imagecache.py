@@ -0,0 +1,106 @@
+import contextlib
+import io
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from PIL import Image
+from zinemachine.imagecache import ImageProbeCache
+from zinemachine.zinevalidator import ZineValidator
+
+
+class TestImageProbeCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.imagePath = os.path.join(self.dir.name, 'image.png')
+        Image.new('L', (300, 200)).save(self.imagePath)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_probe(self):
+        cache = ImageProbeCache()
+        info = cache.probe(self.imagePath)
+        self.assertEqual((300, 200, 'L', 'PNG'), (info['width'], info['height'], info['mode'], info['format']))
+        self.assertIsNone(info['hash'])
+
+        cache.probe(self.imagePath)
+        self.assertEqual({'hits': 1, 'misses': 1}, cache.stats)
+
+    def test_changed_file(self):
+        cache = ImageProbeCache()
+        cache.probe(self.imagePath)
+        Image.new('1', (100, 50)).save(self.imagePath)
+        os.utime(self.imagePath, ns=(0, 0))
+
+        info = cache.probe(self.imagePath)
+        self.assertEqual((100, 50, '1'), (info['width'], info['height'], info['mode']))
+        self.assertEqual({'hits': 0, 'misses': 2}, cache.stats)
+
+    def test_hash(self):
+        cache = ImageProbeCache()
+        other = os.path.join(self.dir.name, 'copy.png')
+        with open(self.imagePath, 'rb') as src, open(other, 'wb') as dst:
+            dst.write(src.read())
+
+        self.assertEqual(cache.contentHash(self.imagePath), cache.contentHash(other))
+        self.assertEqual(64, len(cache.contentHash(self.imagePath)))
+
+    def test_printer_ready(self):
+        cache = ImageProbeCache()
+        self.assertFalse(cache.printerReady(self.imagePath, 576))
+
+        Image.new('1', (576, 10)).save(self.imagePath)
+        self.assertTrue(cache.printerReady(self.imagePath, 576))
+        self.assertFalse(cache.printerReady(self.imagePath, 384))
+
+    def test_persistent(self):
+        cachePath = os.path.join(self.dir.name, 'cache.json')
+        cache = ImageProbeCache(cachePath)
+        cache.contentHash(self.imagePath)
+        cache.save()
+
+        cache = ImageProbeCache(cachePath)
+        info = cache.probe(self.imagePath)
+        self.assertIsNotNone(info['hash'])
+        self.assertEqual({'hits': 1, 'misses': 0}, cache.stats)
+
+    def test_corrupt(self):
+        cachePath = os.path.join(self.dir.name, 'cache.json')
+        with open(cachePath, 'w') as f:
+            f.write('{')
+        cache = ImageProbeCache(cachePath)
+        self.assertEqual({}, cache.entries)
+
+
+class TestValidatorImageCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        Image.new('1', (100, 100)).save(os.path.join(self.dir.name, 'shared.png'))
+        Image.new('1', (800, 100)).save(os.path.join(self.dir.name, 'wide.png'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def writeZines(self, count, src):
+        for i in range(count):
+            with open(os.path.join(self.dir.name, f'{i}.zine'), 'w', encoding='utf-8') as f:
+                f.write(f'-----\ntitle:{i}\n-----\n<img src="{src}"></img>\n')
+
+    def validate(self, validator):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return validator.validateDirectory(self.dir.name)
+
+    def test_shared_image(self):
+        self.writeZines(10, 'shared.png')
+        validator = ZineValidator()
+        self.validate(validator)
+        self.assertEqual({'hits': 9, 'misses': 1}, validator.imageCache.stats)
+
+    def test_resize_shared_image(self):
+        self.writeZines(3, 'wide.png')
+        validator = ZineValidator(resizeImages=True)
+        errors, warnings, fixes = self.validate(validator)
+        # resized once, the other zines see the resized image
+        self.assertEqual(1, len(fixes))
+        self.assertEqual(0, len(errors))
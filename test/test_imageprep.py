@@ -0,0 +1,139 @@
+import contextlib
+import io
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from PIL import Image
+from escpos.printer import Dummy
+from zinemachine.imageprep import ImagePreparer, ditherMethods
+from zinemachine.raster import printImage
+from zinemachine.profile import LMP201
+from test.images import noiseImage
+
+
+class TestImagePreparer(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def prepare(self, preparer, path):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return preparer.prepareDirectory(path)
+
+    def test_convert(self):
+        preparer = ImagePreparer(width=576)
+        for size, expected in [((100, 50), (576, 50)), ((576, 20), (576, 20)), ((1535, 2244), (576, 842))]:
+            prepared = preparer.convert(noiseImage('RGB', size))
+            self.assertEqual('1', prepared.mode)
+            self.assertEqual(expected, prepared.size)
+
+    def test_centered(self):
+        prepared = ImagePreparer(width=64).convert(Image.new('L', (16, 4), 0))
+        # black image in the middle of white padding
+        self.assertEqual(255, prepared.getpixel((23, 0)))
+        self.assertEqual(0, prepared.getpixel((24, 0)))
+        self.assertEqual(0, prepared.getpixel((39, 0)))
+        self.assertEqual(255, prepared.getpixel((40, 0)))
+
+    def test_alpha(self):
+        # transparent pixels are white
+        prepared = ImagePreparer(width=8).convert(Image.new('RGBA', (8, 8), (0, 0, 0, 0)))
+        self.assertEqual((255, 255), prepared.getextrema())
+
+    def test_dither(self):
+        grey = Image.new('L', (64, 64), 128)
+        for method in ditherMethods:
+            dithered = ImagePreparer.ditherImage(grey, method)
+            self.assertEqual('1', dithered.mode)
+            whitePixels = dithered.histogram()[255]
+            if method == 'threshold':
+                self.assertEqual(64 * 64, whitePixels)
+            else:
+                # 50% grey is about half white
+                self.assertAlmostEqual(0.5, whitePixels / (64 * 64), delta=0.05)
+
+    def test_prepare_directory(self):
+        noiseImage('RGB', (800, 300)).save(self.path('wide.png'))
+        noiseImage('RGB', (700, 200)).save(self.path('photo.jpg'))
+        with open(self.path('a.zine'), 'w', encoding='utf-8') as f:
+            f.write('-----\ntitle:a\n-----\n<img src="wide.png"></img>\n<img src="./photo.jpg">caption</img>\n')
+        with open(self.path('b.zine'), 'w', encoding='utf-8') as f:
+            f.write('-----\ntitle:b\n-----\n<img src="photo.jpg"></img>\n')
+
+        results = self.prepare(ImagePreparer(width=576), self.dir.name)
+        self.assertEqual(2, len(results))
+        self.assertTrue(all(r['error'] is None for r in results))
+
+        with Image.open(self.path('wide.png')) as image:
+            self.assertEqual(('1', (576, 216)), (image.mode, image.size))
+        with Image.open(self.path('wide.png.orig')) as image:
+            self.assertEqual((800, 300), image.size)
+
+        # JPEG can't store the prepared image, so it's saved as PNG and the zines are updated
+        with Image.open(self.path('photo.jpg.png')) as image:
+            self.assertEqual(('1', (576, 165)), (image.mode, image.size))
+        with open(self.path('a.zine'), encoding='utf-8') as f:
+            self.assertIn('<img src="./photo.jpg.png">caption</img>', f.read())
+        with open(self.path('b.zine'), encoding='utf-8') as f:
+            self.assertIn('<img src="photo.jpg.png"></img>', f.read())
+
+        # already prepared
+        results = self.prepare(ImagePreparer(width=576), self.dir.name)
+        self.assertTrue(all(r['preparedPath'] is None and r['error'] is None for r in results))
+
+    def test_keep_original(self):
+        noiseImage('RGB', (1000, 400)).save(self.path('wide.png.orig'), format='PNG')
+        noiseImage('RGB', (800, 300)).save(self.path('wide.png'))
+        with open(self.path('a.zine'), 'w', encoding='utf-8') as f:
+            f.write('-----\ntitle:a\n-----\n<img src="wide.png"></img>\n')
+
+        # the second prepare converts the image again, at another width
+        for width in [576, 384]:
+            results = self.prepare(ImagePreparer(width=width), self.dir.name)
+            self.assertEqual(self.path('wide.png'), results[0]['preparedPath'])
+            with Image.open(self.path('wide.png.orig')) as image:
+                self.assertEqual((1000, 400), image.size)
+
+    def test_missing_image(self):
+        with open(self.path('a.zine'), 'w', encoding='utf-8') as f:
+            f.write('-----\ntitle:a\n-----\n<img src="missing.png"></img>\n')
+        results = self.prepare(ImagePreparer(), self.dir.name)
+        self.assertIsNotNone(results[0]['error'])
+
+
+class TestPrintImage(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def printBoth(self, image, **imageOptions):
+        path = os.path.join(self.dir.name, 'image.png')
+        image.save(path)
+
+        escposPrinter = Dummy(profile=LMP201())
+        escposPrinter.image(path, **imageOptions)
+        printer = Dummy(profile=LMP201())
+        printImage(printer, path, compact=False, **imageOptions)
+        return escposPrinter.output, printer.output
+
+    def test_prepared_image(self):
+        prepared = ImagePreparer(width=576).convert(noiseImage('L', (300, 200)))
+        expected, output = self.printBoth(prepared, fragment_height=960, center=True)
+        self.assertEqual(expected, output)
+
+    def test_prepared_image_fragments(self):
+        prepared = noiseImage('1', (576, 1000))
+        expected, output = self.printBoth(prepared, fragment_height=300, center=True)
+        self.assertEqual(expected, output)
+
+    def test_unprepared_image(self):
+        expected, output = self.printBoth(noiseImage('RGB', (300, 200)), fragment_height=960, center=True)
+        self.assertEqual(expected, output)
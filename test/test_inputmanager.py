@@ -0,0 +1,86 @@
+import sys
+import time
+import unittest
+from threading import Event
+from types import SimpleNamespace
+from unittest import mock
+
+# RPi.GPIO can only be imported on a Raspberry Pi
+with mock.patch.dict(sys.modules, {'RPi': mock.MagicMock(), 'RPi.GPIO': mock.MagicMock()}):
+    from zinemachine.inputmanager import InputManager
+
+
+class TestInputManager(unittest.TestCase):
+    def setUp(self):
+        self.inputManager = InputManager(waitTime=0.01)
+        self.button1 = SimpleNamespace(pin=1)
+        self.button2 = SimpleNamespace(pin=2)
+
+    def tearDown(self):
+        self.inputManager.shutdown()
+
+    def test_pressRelease(self):
+        called = Event()
+        self.inputManager.addChord(frozenset([1]), lambda chord, holdTime: called.set())
+
+        self.inputManager.onPressed(self.button1)
+        self.inputManager.onReleased(self.button1)
+
+        self.assertTrue(called.wait(1.0))
+
+    def test_pressHold(self):
+        called = Event()
+        self.inputManager.addChord(frozenset([1]), lambda chord, holdTime: called.set(), holdTime=0.05)
+
+        self.inputManager.onPressed(self.button1)
+        self.assertTrue(called.wait(1.0))
+        self.inputManager.onReleased(self.button1)
+
+    def test_pressHold_multiple(self):
+        calls = []
+        self.inputManager.addChord(frozenset([1]), lambda chord, holdTime: calls.append('short'), holdTime=0.02)
+        self.inputManager.addChord(frozenset([1]), lambda chord, holdTime: calls.append('long'), holdTime=0.05)
+
+        self.inputManager.onPressed(self.button1)
+        time.sleep(0.2)
+        self.inputManager.onReleased(self.button1)
+        self.inputManager.shutdown()
+
+        self.assertEqual(['short', 'long'], calls)
+
+    def test_slow_pressHold_does_not_block_input(self):
+        started = Event()
+        finish = Event()
+        pressReleased = Event()
+
+        def slowCommand(chord, holdTime):
+            started.set()
+            finish.wait(5.0)
+
+        self.inputManager.addChord(frozenset([1]), slowCommand, holdTime=0.02)
+        self.inputManager.addChord(frozenset([2]), lambda chord, holdTime: pressReleased.set())
+
+        self.inputManager.onPressed(self.button1)
+        self.assertTrue(started.wait(1.0))
+
+        try:
+            startTime = time.perf_counter()
+            self.inputManager.onReleased(self.button1)
+            self.inputManager.onPressed(self.button2)
+            self.inputManager.onReleased(self.button2)
+            elapsed = time.perf_counter() - startTime
+
+            self.assertLess(elapsed, 0.05)
+            # the pressRelease command runs while the slow command is still in progress
+            self.assertTrue(pressReleased.wait(1.0))
+        finally:
+            finish.set()
+
+    def test_hold_cancelled_by_release(self):
+        called = Event()
+        self.inputManager.addChord(frozenset([1]), lambda chord, holdTime: called.set(), holdTime=0.1)
+
+        self.inputManager.onPressed(self.button1)
+        self.inputManager.onReleased(self.button1)
+
+        self.assertFalse(called.wait(0.2))
@@ -0,0 +1,77 @@
+import json
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from zinemachine.linkbenchmark import LinkBenchmark
+from zinemachine.profile import loadProfile, saveProfileSettings
+from zinemachine.bluetoothprintermanager import BluetoothPrinterManager
+from test.test_bufferedserial import PtyPrinter
+
+
+class TestLinkBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.ptyPrinter = PtyPrinter(status=0x12)
+
+    def tearDown(self):
+        self.ptyPrinter.close()
+
+    def test_run(self):
+        benchmark = LinkBenchmark(self.ptyPrinter.devfile, baudrates=[9600, 115200], chunkSizes=[64, 1024], flowControls=['dsrdtr', 'none'], payload=bytes(2048))
+        results = benchmark.run()
+
+        self.assertEqual(8, len(results))
+        for result in results:
+            self.assertIsNone(result['error'])
+            self.assertEqual(2048, result['bytes'])
+            self.assertGreater(result['bytesPerSecond'], 0.0)
+            self.assertIsNotNone(result['idleLatency'])
+            self.assertIsNotNone(result['drainLatency'])
+
+        self.assertEqual(2048 // 64, results[0]['writes'])
+
+        best = LinkBenchmark.bestResult(results)
+        self.assertEqual(max(r['bytesPerSecond'] for r in results), best['bytesPerSecond'])
+
+    def test_missing_device(self):
+        benchmark = LinkBenchmark('/dev/does-not-exist', payload=bytes(16))
+        results = benchmark.run()
+        self.assertIsNotNone(results[0]['error'])
+        self.assertIsNone(LinkBenchmark.bestResult(results))
+
+    def test_bestResult_prefers_responding(self):
+        results = [
+            {'error': None, 'bytesPerSecond': 2000.0, 'stalls': 0, 'idleLatency': None, 'drainLatency': None},
+            {'error': None, 'bytesPerSecond': 900.0, 'stalls': 0, 'idleLatency': 0.1, 'drainLatency': 0.2},
+            {'error': 'failed', 'bytesPerSecond': 0.0, 'stalls': 0, 'idleLatency': None, 'drainLatency': None},
+        ]
+        self.assertIs(results[1], LinkBenchmark.bestResult(results))
+
+
+class TestProfileSerialSettings(unittest.TestCase):
+    def test_save_and_load(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'printer-profile.json')
+            saveProfileSettings(path, 'serial', {'baudrate': 115200, 'chunkSize': 1024})
+            saveProfileSettings(path, 'serial', {'dsrdtr': False})
+
+            with open(path) as f:
+                self.assertEqual({'serial': {'baudrate': 115200, 'chunkSize': 1024, 'dsrdtr': False}}, json.load(f))
+
+            profile = loadProfile(path)
+            self.assertEqual(115200, profile.profile_data['serial']['baudrate'])
+            self.assertEqual(8, profile.profile_data['serial']['bytesize'])
+            self.assertEqual(576, profile.profile_data['media']['width']['pixels'])
+
+    def test_printerManager_uses_profile(self):
+        ptyPrinter = PtyPrinter()
+        try:
+            profile = loadProfile()
+            profile.profile_data['serial'].update({'devfile': ptyPrinter.devfile, 'baudrate': 19200, 'chunkSize': 32})
+            printerManager = BluetoothPrinterManager(profile)
+
+            self.assertEqual(19200, printerManager.printer.device.baudrate)
+            self.assertEqual(32, printerManager.printer.device.chunkSize)
+            printerManager.printer.close()
+        finally:
+            ptyPrinter.close()
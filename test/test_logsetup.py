@@ -0,0 +1,54 @@
+import io
+import json
+import logging
+import unittest
+
+from zinemachine.logsetup import setupLogging, stopLogging, JobLogger
+
+
+class TestLogSetup(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger('zinemachine.test')
+
+    def tearDown(self):
+        stopLogging()
+        root = logging.getLogger('zinemachine')
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.setLevel(logging.NOTSET)
+        root.propagate = True
+
+    def test_text(self):
+        setupLogging('INFO', 'text', stream=self.stream)
+        self.logger.debug("hidden")
+        JobLogger(self.logger, {'job': 1, 'zine': 'zines/a b.zine'}).warning("Done printing", extra={'seconds': 1.23456})
+        stopLogging()
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertTrue(lines[0].endswith('WARNING zinemachine.test: Done printing job=1 zine="zines/a b.zine" seconds=1.235'), lines[0])
+        # not a terminal, so no colors
+        self.assertNotIn('\033', lines[0])
+
+    def test_json(self):
+        setupLogging('DEBUG', 'json', stream=self.stream)
+        self.logger.info("Loading zine", extra={'zine': 'zines/a.zine'})
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            self.logger.exception("failed")
+        stopLogging()
+
+        entries = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual(2, len(entries))
+        self.assertEqual({'level': 'INFO', 'logger': 'zinemachine.test', 'message': 'Loading zine', 'zine': 'zines/a.zine'}, {k: v for k, v in entries[0].items() if k != 'time'})
+        self.assertIn('ValueError: bad', entries[1]['message'])
+
+    def test_queued(self):
+        # records are written by the listener thread, not the caller
+        listener = setupLogging('INFO', 'text', stream=self.stream)
+        self.assertIsInstance(logging.getLogger('zinemachine').handlers[0], logging.handlers.QueueHandler)
+        self.logger.info("queued")
+        listener.stop()
+        self.assertIn('queued', self.stream.getvalue())
@@ -1,6 +1,6 @@
 import unittest
 
-from zinemachine.markup import Parser, MarkupText, MarkupImage, StrToken
+from zinemachine.markup import Parser, MarkupText, MarkupImage, StrToken, StartTag
 
 
 class TestParser(unittest.TestCase):
@@ -167,3 +167,48 @@ class TestParser(unittest.TestCase):
     def test_mismatchedTag(self):
         with self.assertRaises(Exception):
             self.parser.feed('<u>hello</b>')
+
+
+class TestParserTakeComplete(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_take(self):
+        self.parser.feed('hello <b>world</b>\n')
+        taken = self.parser.takeComplete()
+        self.assertEqual(3, len(taken))
+        self.assertEqual([], self.parser.stack)
+        self.assertEqual('', self.parser.text)
+
+    def test_open_tag(self):
+        self.parser.feed('<u>hello\n')
+        expected = [
+            MarkupText(MarkupText(StrToken('hello\n', pos=(1, 3)), pos=(1, 3)), {'underline': 1}, pos=(1, 0))
+        ]
+        self.assertEqual(expected, self.parser.takeComplete())
+        self.assertEqual([StartTag('u', {}, pos=(1, 0))], self.parser.stack)
+
+        # text parsed later is still in the tag
+        self.parser.feed('world</u>\n')
+        self.assertEqual(MarkupText(StrToken('world', pos=(2, 0)), {'underline': 1}, pos=(1, 0)), self.parser.takeComplete()[0])
+        self.assertEqual([], self.parser.errors)
+
+    def test_open_image(self):
+        self.parser.feed('hello\n<img src="a.png">caption\n')
+        taken = self.parser.takeComplete()
+        self.assertEqual([MarkupText(StrToken('hello\n', pos=(1, 0)), pos=(1, 0))], taken)
+        self.assertEqual('caption\n', self.parser.text)
+
+        self.parser.feed('</img>\n')
+        self.assertIsInstance(self.parser.takeComplete()[0], MarkupImage)
+
+    def test_line_boundary(self):
+        self.parser.feed('hello <img src="a.png">')
+        self.assertEqual([], self.parser.takeComplete(lineBoundary=True))
+        self.assertEqual(2, len(self.parser.stack))
+        self.assertEqual(1, len(self.parser.takeComplete()))
+
+    def test_end(self):
+        self.parser.feed('hello <img src="a.png">caption')
+        taken = self.parser.takeComplete(end=True)
+        self.assertEqual(['hello ', 'caption'], [t.text[0].text for t in taken])
@@ -0,0 +1,100 @@
+import contextlib
+import io
+import os
+import shutil
+from tempfile import TemporaryDirectory
+import unittest
+
+from PIL import Image
+from zinemachine.nvgraphics import NVGraphicsTable, defineGraphicsCommand, printGraphicsCommand, footerEmblemKey
+from zinemachine.printjob import PrintJob
+from zinemachine.profile import LMP201
+from zinemachine.receiptrenderer import ReceiptRenderer
+from zinemachine.zine import Zine
+from test.images import noiseImage
+
+
+def nvProfile():
+    profile = LMP201()
+    profile.profile_data['features'] = dict(profile.profile_data['features'], nvGraphics=True)
+    return profile
+
+
+class TestNVGraphicsCommands(unittest.TestCase):
+    def test_commands(self):
+        image = Image.new('1', (16, 2), 255)
+        self.assertEqual(b'\x1d(L\x0f\x000C0G0\x01\x10\x00\x02\x001' + bytes(4), defineGraphicsCommand('G0', image))
+        self.assertEqual(b'\x1d(L\x06\x000EG0\x01\x01', printGraphicsCommand('G0'))
+
+    def test_long_command(self):
+        image = Image.new('1', (576, 1000), 255)
+        command = defineGraphicsCommand('G0', image)
+        self.assertEqual(b'\x1d8L', command[:3])
+        self.assertEqual(72 * 1000 + 13, int.from_bytes(command[3:7], 'little') + 2)
+
+
+class TestNVGraphicsTable(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.imagePath = self.path('logo.png')
+        noiseImage('L', (200, 60)).save(self.imagePath)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_unsupported(self):
+        profile = LMP201()
+        profile.profile_data['nvGraphics'] = {'G0': {}}
+        self.assertEqual({}, NVGraphicsTable(profile).entries)
+        self.assertEqual({}, NVGraphicsTable.forPrinter(object()).entries)
+
+    def test_lookup(self):
+        profile = nvProfile()
+        table = NVGraphicsTable(profile)
+        key, command = table.add(self.imagePath)
+        self.assertEqual('G0', key)
+        self.assertEqual((576, 60), (table.entries[key]['width'], table.entries[key]['height']))
+        self.assertEqual(('G0', command), table.add(self.imagePath))
+
+        profile.profile_data['nvGraphics'] = table.entries
+        table = NVGraphicsTable(profile)
+        # found by content
+        shutil.copyfile(self.imagePath, self.path('copy.png'))
+        self.assertEqual('G0', table.imageKey(self.path('copy.png')))
+        self.assertIsNone(table.imageKey(self.imagePath, dither='ordered'))
+        self.assertIsNone(table.imageKey(self.path('missing.png')))
+
+        noiseImage('L', (200, 60), seed=1).save(self.imagePath)
+        os.utime(self.imagePath, ns=(0, 0))
+        self.assertIsNone(table.imageKey(self.imagePath))
+
+    def test_print_zine(self):
+        with open(self.path('a.zine'), 'w', encoding='utf-8') as f:
+            f.write('-----\ntitle:a\n-----\ntext\n<img src="logo.png"></img>\n')
+
+        profile = nvProfile()
+        table = NVGraphicsTable(profile)
+        uploads = table.add(self.imagePath)[1] + table.add(self.imagePath, key=footerEmblemKey)[1]
+        profile.profile_data['nvGraphics'] = table.entries
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            rasterJob = PrintJob.render(Zine(self.path('a.zine'), 'test').printZine, LMP201())
+            nvJob = PrintJob.render(Zine(self.path('a.zine'), 'test').printZine, profile)
+
+        self.assertIn(printGraphicsCommand('G0'), nvJob.data)
+        self.assertIn(printGraphicsCommand(footerEmblemKey), nvJob.data)
+        self.assertNotIn('╔╤'.encode('cp437'), nvJob.data)
+        self.assertLess(len(nvJob.data), len(rasterJob.data) - 1000)
+
+        # the stored image prints the same dots as the raster image
+        rasterRenderer = ReceiptRenderer()
+        rasterRenderer.feed(rasterJob.data)
+        nvRenderer = ReceiptRenderer()
+        nvRenderer.feed(uploads)
+        nvRenderer.feed(nvJob.data)
+        y = [y for x, y, image in rasterRenderer.images if image.height == 60][0]
+        self.assertEqual(y, nvRenderer.images[0][1])
+        self.assertEqual(rasterRenderer.toImage().crop((0, y, 576, y + 60)).tobytes(), nvRenderer.toImage().crop((0, y, 576, y + 60)).tobytes())
@@ -0,0 +1,279 @@
+import time
+import unittest
+from threading import RLock, Thread
+
+from escpos.escpos import Escpos
+from zinemachine.printjob import PrintJob, JobRecorder, PrintInterruptedError, StreamingPrintJob
+from zinemachine.profile import LMP201
+from zinemachine.receiptrenderer import ReceiptRenderer
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+
+
+class FakePrinter(Escpos):
+    """ESC/POS printer that drops the link after receiving dropAt bytes, or runs out of paper after paperOutAt bytes. a silent printer doesn't respond to status queries"""
+    def __init__(self, dropAt=None, paperOutAt=None, silent=False, **kwargs):
+        Escpos.__init__(self, **kwargs)
+        self.received = bytearray()
+        self.dropAt = dropAt
+        self.paperOutAt = paperOutAt
+        self.linkUp = True
+        self.paperOut = False
+        self.silent = silent
+        self.statusQueries = 0
+        self.device = self
+
+    def _raw(self, msg):
+        if not self.linkUp:
+            raise OSError('link down')
+
+        if self.dropAt is not None and len(self.received) + len(msg) > self.dropAt:
+            self.received += msg[:self.dropAt - len(self.received)]
+            self.dropAt = None
+            self.linkUp = False
+            raise OSError('link down')
+
+        self.received += msg
+        if self.paperOutAt is not None and len(self.received) >= self.paperOutAt:
+            self.paperOutAt = None
+            self.paperOut = True
+
+    def query_status(self, mode):
+        if not self.linkUp:
+            raise OSError('link down')
+        self.statusQueries += 1
+        if self.silent:
+            return b''
+        return [0x1a] if self.paperOut else [0x12]
+
+    def flush(self):
+        if not self.linkUp:
+            raise OSError('link down')
+
+    def close(self):
+        pass
+
+
+class FakePrinterManager(object):
+    def __init__(self, printer):
+        self.printerType = 'fake'
+        self.printer = printer
+        self.online = True
+        self.deviceLock = RLock()
+
+    def connect(self, retries=0, timeout=0.0):
+        return True
+
+    def checkOnline(self):
+        self.online = self.printer.linkUp and not self.printer.paperOut
+        return self.online
+
+    def reopen(self):
+        return self.printer.linkUp
+
+
+def printLines(printer):
+    printer.set(bold=True)
+    for i in range(100):
+        printer.text(f"line {i}\n")
+
+
+class TestPrintJob(unittest.TestCase):
+    def test_render(self):
+        job = PrintJob.render(printLines, LMP201())
+        recorder = JobRecorder(profile=LMP201())
+        printLines(recorder)
+
+        self.assertEqual(bytes(recorder.data), job.data)
+        self.assertEqual(101, len(job.checkpoints))
+        self.assertEqual(len(job.data), job.checkpoints[-1][0])
+        self.assertEqual({'bold': True}, job.checkpoints[-1][1])
+
+    def test_send(self):
+        job = PrintJob.render(printLines, LMP201())
+        printer = FakePrinter(profile=LMP201())
+        job.send(printer, ackInterval=256)
+
+        self.assertEqual(job.data, bytes(printer.received))
+        self.assertEqual(len(job.data), job.confirmedOffset)
+        self.assertGreater(printer.statusQueries, 1)
+
+    def test_resume(self):
+        job = PrintJob.render(printLines, LMP201())
+        printer = FakePrinter(dropAt=600, profile=LMP201())
+        with self.assertRaises(OSError):
+            job.send(printer, ackInterval=128)
+
+        checkpoint = job.resumeCheckpoint()
+        self.assertGreater(checkpoint[0], 0)
+        self.assertLessEqual(checkpoint[0], 600)
+        self.assertIn(checkpoint[0], [c[0] for c in job.checkpoints])
+
+        printer.linkUp = True
+        printer.received.clear()
+        job.resume(printer, '- continued -\n')
+
+        self.assertTrue(printer.received.endswith(job.data[checkpoint[0]:]))
+        self.assertIn(b'- continued -\n', printer.received)
+
+    def test_paper_out(self):
+        job = PrintJob.render(printLines, LMP201())
+        printer = FakePrinter(paperOutAt=600, profile=LMP201())
+        with self.assertRaises(PrintInterruptedError):
+            job.send(printer, ackInterval=128)
+        self.assertLess(job.confirmedOffset, 600)
+
+    def test_silent(self):
+        job = PrintJob.render(printLines, LMP201())
+        printer = FakePrinter(dropAt=600, silent=True, profile=LMP201())
+        with self.assertRaises(OSError):
+            job.send(printer, ackInterval=128)
+
+        printer.linkUp = True
+        printer.received.clear()
+        job.resume(printer, '- continued -\n')
+        # every query would wait for the read timeout, so the printer is only queried once
+        self.assertEqual(1, printer.statusQueries)
+        self.assertEqual(0, job.confirmedOffset)
+        self.assertEqual(job.data, bytes(printer.received))
+
+
+class TestStreamingPrintJob(unittest.TestCase):
+    def test_send(self):
+        expected = PrintJob.render(printLines, LMP201())
+        job = StreamingPrintJob(printLines, LMP201(), windowSize=128)
+        printer = FakePrinter(profile=LMP201())
+        job.send(printer, ackInterval=256)
+
+        self.assertEqual(expected.data, bytes(printer.received))
+        self.assertEqual(len(expected.data), job.confirmedOffset)
+        self.assertEqual(len(expected.data), job.sentBytes)
+        self.assertEqual(2, len(job.checkpoints))
+
+    def test_silent(self):
+        job = StreamingPrintJob(printLines, LMP201(), windowSize=128)
+        printer = FakePrinter(silent=True, profile=LMP201())
+        job.send(printer, ackInterval=128)
+        self.assertEqual(1, printer.statusQueries)
+        self.assertEqual(0, job.confirmedOffset)
+
+    def test_resume(self):
+        expected = PrintJob.render(printLines, LMP201())
+        job = StreamingPrintJob(printLines, LMP201(), windowSize=128)
+        printer = FakePrinter(dropAt=600, profile=LMP201())
+        with self.assertRaises(OSError):
+            job.send(printer, ackInterval=128)
+
+        checkpoint = job.resumeCheckpoint()
+        self.assertGreater(checkpoint[0], 0)
+        self.assertLessEqual(checkpoint[0], 600)
+        self.assertIn(checkpoint, expected.checkpoints)
+
+        printer.linkUp = True
+        printer.received.clear()
+        job.resume(printer, '- continued -\n')
+
+        # the job is rendered again, but only the part after the checkpoint is sent
+        self.assertTrue(printer.received.endswith(expected.data[checkpoint[0]:]))
+        self.assertLess(len(printer.received), len(expected.data) - checkpoint[0] + 100)
+        self.assertIn(b'- continued -\n', printer.received)
+
+
+def render(data):
+    renderer = ReceiptRenderer()
+    renderer.feed(data)
+    return renderer.lines, renderer.y
+
+
+class TestCompactText(unittest.TestCase):
+    def renderBoth(self, job):
+        return PrintJob.render(job, LMP201(), compact=False), PrintJob.render(job, LMP201())
+
+    def test_blank_lines(self):
+        def job(printer):
+            printer.text("title\n")
+            printer.text("\n\n\n")
+            printer.text("\n\n   \n")
+            printer.text("text  \n\n")
+            printer.text("end\n\n\n\n\n\n")
+
+        plain, compact = self.renderBoth(job)
+        expected = b'title\n\x1bd\x06text\n\nend\n\x1bd\x05'
+        self.assertTrue(compact.data.endswith(expected))
+        self.assertEqual(render(plain.data), render(compact.data))
+        # every checkpoint is still a line boundary
+        start = len(compact.data) - len(expected)
+        self.assertEqual([6, 9, 14, 15, 19, 22], [c[0] - start for c in compact.checkpoints[1:]])
+
+    def test_visible_spaces(self):
+        def job(printer):
+            printer.set(underline=1)
+            printer.text("underlined   \n")
+            printer.set(invert=True)
+            printer.text("inverted   \n")
+            printer.set()
+            printer.text("trailing ")
+            printer.set(underline=1)
+            printer.text("spaces\n")
+
+        plain, compact = self.renderBoth(job)
+        self.assertEqual(plain.data, compact.data)
+
+    def test_aligned_spaces(self):
+        def job(printer):
+            printer.set(align='center')
+            printer.text("centered   \n")
+            printer.set(align='right')
+            printer.text("right   \n")
+            printer.set(align='left')
+            printer.text("left   \n")
+
+        plain, compact = self.renderBoth(job)
+        self.assertTrue(compact.data.endswith(b'left\n'))
+        self.assertIn(b'centered   \n', compact.data)
+        self.assertIn(b'right   \n', compact.data)
+        self.assertEqual(render(plain.data), render(compact.data))
+
+    def test_zine(self):
+        zine = Zine('test-zines/.test/formatted.zine', 'test')
+        plain, compact = self.renderBoth(zine.printZine)
+        self.assertLess(len(compact.data), len(plain.data))
+        self.assertEqual(render(plain.data), render(compact.data))
+
+
+class TestZineMachineResume(unittest.TestCase):
+    def test_resume_after_link_drop(self):
+        zine = Zine('test-zines/.test/lorem-ipsum-2500.zine', 'test')
+        expected = PrintJob.render(zine.printZine, LMP201())
+        zine.clearCache()
+
+        printer = FakePrinter(dropAt=2000, profile=LMP201())
+        zineMachine = ZineMachine(FakePrinterManager(printer), secondsPerCharacter=0.0, basePrintTime=0.0)
+        zineMachine.ackInterval = 256
+        zineMachine.initPrinter(checkInterval=0.01)
+        zineMachine.supervisor.reconnectInterval = 0.01
+        zineMachine.supervisor.maxReconnectInterval = 0.05
+
+        def restoreLink():
+            time.sleep(0.1)
+            printer.linkUp = True
+
+        thread = Thread(target=restoreLink)
+        thread.start()
+        try:
+            zineMachine.printZine(zine)
+        finally:
+            thread.join()
+            zineMachine.supervisor.stop()
+
+        received = bytes(printer.received)
+        self.assertEqual(expected.data[:2000], received[:2000])
+
+        # after the drop: the marker, then the rest of the job from a line boundary less than one ack interval (plus a line) before the drop
+        resumed = received[2000:]
+        marker = ZineMachine.continuedMarker.encode()
+        self.assertIn(marker, resumed)
+        resumedFrom = [c[0] for c in expected.checkpoints if resumed.endswith(expected.data[c[0]:])]
+        self.assertGreater(min(resumedFrom), 2000 - 256 - 100)
+        self.assertLessEqual(min(resumedFrom), 2000)
+        self.assertEqual(1, zineMachine.supervisor.getMetrics()['reconnects'])
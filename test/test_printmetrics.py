@@ -0,0 +1,127 @@
+import contextlib
+import io
+import json
+import os
+import threading
+import unittest
+from tempfile import TemporaryDirectory
+
+from zinemachine.emulatedprinter import EmulatedPrinterManager
+from zinemachine.printmetrics import PrintMetrics, MetricsLog, loadMetrics, summarize, percentile
+from zinemachine.profile import LMP201
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+
+
+def record(total, **stages):
+    metrics = PrintMetrics('zine.zine', 'test')
+    metrics.stages = dict(stages, total=total)
+    metrics.bytes = 100
+    return metrics
+
+
+class TestPrintMetrics(unittest.TestCase):
+    def test_stage(self):
+        metrics = PrintMetrics()
+        with metrics.stage('images'):
+            pass
+        first = metrics.stages['images']
+        with metrics.stage('images'):
+            pass
+        self.assertGreater(metrics.stages['images'], first)
+
+        with self.assertRaises(ValueError):
+            with metrics.stage('render'):
+                raise ValueError()
+        self.assertIn('render', metrics.stages)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 0.5))
+        self.assertEqual(99, percentile(values, 0.99))
+        self.assertEqual(7, percentile([7], 0.9))
+
+    def test_summarize(self):
+        records = [record(float(i), read=0.1) for i in range(1, 11)] + [record(20.0)]
+        summary = summarize([r.toDict() for r in records])
+        self.assertEqual(11, summary['prints'])
+        self.assertEqual(1100, summary['bytes'])
+        self.assertEqual({'count': 10, 0.5: 0.1, 0.9: 0.1, 0.99: 0.1, 'max': 0.1}, summary['stages']['read'])
+        self.assertEqual(6.0, summary['stages']['total'][0.5])
+        self.assertEqual(20.0, summary['stages']['total']['max'])
+        self.assertIsNone(summary['pressToFirstByte'])
+
+
+class TestMetricsLog(unittest.TestCase):
+    def test_export(self):
+        with TemporaryDirectory() as directory:
+            jsonPath = os.path.join(directory, 'metrics.jsonl')
+            textfilePath = os.path.join(directory, 'zinemachine.prom')
+            log = MetricsLog(jsonPath=jsonPath, textfilePath=textfilePath)
+            log.record(record(1.0, read=0.5))
+            log.record(record(3.0))
+            with open(jsonPath, 'a', encoding='utf-8') as f:
+                # a line cut off by a power loss
+                f.write('{"time": ')
+
+            records = loadMetrics(jsonPath)
+            self.assertEqual([1.0, 3.0], [r['stages']['total'] for r in records])
+            self.assertEqual(1, len(loadMetrics(jsonPath, last=1)))
+
+            with open(textfilePath, encoding='utf-8') as f:
+                text = f.read()
+            self.assertIn('zinemachine_prints_total 2\n', text)
+            self.assertIn('zinemachine_print_bytes_total 200\n', text)
+            self.assertIn('zinemachine_print_stage_seconds_sum{stage="total"} 4.0\n', text)
+            self.assertIn('zinemachine_print_stage_seconds_count{stage="read"} 1\n', text)
+            self.assertIn('zinemachine_print_stage_seconds{stage="total",quantile="0.9"} 3.0\n', text)
+            self.assertFalse(os.path.exists(textfilePath + '.tmp'))
+
+    def test_threads(self):
+        with TemporaryDirectory() as directory:
+            textfilePath = os.path.join(directory, 'zinemachine.prom')
+            log = MetricsLog(jsonPath=os.path.join(directory, 'metrics.jsonl'), textfilePath=textfilePath)
+            errors = []
+
+            def printer():
+                try:
+                    for _ in range(300):
+                        log.record(record(1.0))
+                except Exception as e:
+                    errors.append(e)
+
+            # e.g. the printers of a ZineMachine with several printers
+            threads = [threading.Thread(target=printer) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual([], errors)
+            self.assertEqual(900, len(loadMetrics(log.jsonPath)))
+            with open(textfilePath, encoding='utf-8') as f:
+                self.assertIn('zinemachine_prints_total 900\n', f.read())
+            self.assertEqual(['metrics.jsonl', 'zinemachine.prom'], sorted(os.listdir(directory)))
+
+
+class TestZineMachineMetrics(unittest.TestCase):
+    def test_print_zine(self):
+        printerManager = EmulatedPrinterManager(LMP201())
+        self.assertTrue(printerManager.connect())
+        log = MetricsLog()
+        zineMachine = ZineMachine(printerManager, secondsPerCharacter=0.0, basePrintTime=0.0, metricsLog=log)
+        with contextlib.redirect_stdout(io.StringIO()):
+            zineMachine.printZine(Zine(os.path.join('test-zines', '.test', 'formatted.zine'), 'test'))
+
+        metrics = zineMachine.lastMetrics
+        self.assertEqual([metrics.toDict()], list(log.recent))
+        for stage in ['read', 'parse', 'wrap', 'render', 'images', 'transmit', 'total']:
+            self.assertIn(stage, metrics.stages)
+        self.assertLessEqual(metrics.stages['images'], metrics.stages['render'])
+        self.assertEqual(1, metrics.images)
+        self.assertEqual(0, metrics.imageCacheHits)
+        # everything but the status queries
+        self.assertEqual(len(printerManager.emulator.received) - 3 * printerManager.emulator.stats['statusQueries'], metrics.bytes)
+        self.assertLessEqual(metrics.pressToFirstByte, metrics.stages['total'])
+        self.assertIsNone(metrics.error)
+        json.dumps(metrics.toDict())
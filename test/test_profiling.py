@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import pstats
+import tracemalloc
+import unittest
+from tempfile import TemporaryDirectory
+
+from zinemachine.emulatedprinter import EmulatedPrinterManager
+from zinemachine.profile import LMP201
+from zinemachine.profiling import Profiler
+from zinemachine.zine import Zine
+from zinemachine.zinemachine import ZineMachine
+
+
+class TestProfiler(unittest.TestCase):
+    def test_capture(self):
+        with TemporaryDirectory() as directory:
+            profiler = Profiler(os.path.join(directory, 'profiles'), cpu=True, mem=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                with profiler.capture('test'):
+                    data = [bytes(1000) for _ in range(100)]
+
+            files = sorted(os.listdir(os.path.join(directory, 'profiles')))
+            self.assertEqual(['-cpu.prof', '-cpu.txt', '-mem.tracemalloc', '-mem.txt'], [f[len('test-YYYYmmdd-HHMMSS'):] for f in files])
+            self.assertTrue(all(f.startswith('test-') for f in files))
+            pstats.Stats(os.path.join(directory, 'profiles', files[0]))
+            snapshot = tracemalloc.Snapshot.load(os.path.join(directory, 'profiles', files[2]))
+            self.assertGreater(len(snapshot.traces), 0)
+            self.assertFalse(tracemalloc.is_tracing())
+            self.assertEqual(100, len(data))
+
+    def test_peak_without_reset(self):
+        # Python 3.8 and older have no reset_peak
+        resetPeak = tracemalloc.reset_peak
+        del tracemalloc.reset_peak
+        tracemalloc.start()
+        try:
+            with TemporaryDirectory() as directory:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    with Profiler(directory, cpu=False, mem=True).capture('mem'):
+                        pass
+
+                path = [f for f in os.listdir(directory) if f.endswith('-mem.txt')][0]
+                with open(os.path.join(directory, path), encoding='utf-8') as f:
+                    self.assertIn('(since tracing started)', f.readline())
+        finally:
+            tracemalloc.stop()
+            tracemalloc.reset_peak = resetPeak
+
+    def test_capture_error(self):
+        with TemporaryDirectory() as directory:
+            profiler = Profiler(directory, cpu=True, mem=False)
+            with contextlib.redirect_stdout(io.StringIO()):
+                with self.assertRaises(SystemExit):
+                    with profiler.capture('exit'):
+                        raise SystemExit(1)
+            self.assertEqual(2, len(os.listdir(directory)))
+
+
+class TestProfileNextPrint(unittest.TestCase):
+    def test_single_print(self):
+        printerManager = EmulatedPrinterManager(LMP201())
+        self.assertTrue(printerManager.connect())
+        zineMachine = ZineMachine(printerManager, secondsPerCharacter=0.0, basePrintTime=0.0)
+        path = os.path.join('test-zines', '.test', 'formatted.zine')
+        with TemporaryDirectory() as directory:
+            zineMachine.profileNextPrint(Profiler(directory, cpu=True, mem=False))
+            with contextlib.redirect_stdout(io.StringIO()):
+                zineMachine.printZine(Zine(path, 'test'))
+                zineMachine.printZine(Zine(path, 'test'))
+
+            files = sorted(os.listdir(directory))
+            self.assertEqual(2, len(files))
+            self.assertTrue(files[0].startswith('print-formatted-'))
+            self.assertIsNone(zineMachine.nextPrintProfiler)
@@ -0,0 +1,238 @@
+import os
+from tempfile import TemporaryDirectory
+import tracemalloc
+import unittest
+from unittest import mock
+
+from PIL import Image
+from escpos.image import EscposImage
+from escpos.printer import Dummy
+from escpos.exceptions import ImageWidthError
+from zinemachine.raster import numpy, RasterImage, StripDitherer, printImage, printRaster, rasterStrips, ditherMethods, feedCommands
+from zinemachine.receiptrenderer import renderReceipt
+from zinemachine.imageprep import ImagePreparer
+from zinemachine.profile import LMP201
+from test.images import noiseImage
+
+
+def rasterDots(output, width):
+    """unpack the dots of a stream of GS v 0 commands into a (height, width) array"""
+    rows = []
+    i = 0
+    while i < len(output):
+        widthBytes = output[i + 4] | output[i + 5] << 8
+        height = output[i + 6] | output[i + 7] << 8
+        rows.append(numpy.frombuffer(output[i + 8:i + 8 + widthBytes * height], dtype=numpy.uint8).reshape(height, widthBytes))
+        i += 8 + widthBytes * height
+    return numpy.unpackbits(numpy.concatenate(rows), axis=1)[:, :width]
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestRasterImage(unittest.TestCase):
+    def test_matches_escpos(self):
+        for mode in ['L', 'RGB', 'RGBA', '1']:
+            image = noiseImage(mode, (300, 200))
+            escposImage = EscposImage(image)
+            rasterImage = RasterImage.fromImage(image)
+            self.assertEqual((escposImage.width, escposImage.height), (rasterImage.width, rasterImage.height))
+            self.assertEqual(escposImage.to_raster_format(), rasterImage.rows.tobytes())
+
+    def test_centered_matches_escpos(self):
+        image = noiseImage('L', (301, 20))
+        escposImage = EscposImage(image)
+        escposImage.center(576)
+        self.assertEqual(escposImage.to_raster_format(), RasterImage.fromImage(image, width=576).rows.tobytes())
+
+    def test_dither_matches_preparer(self):
+        grey = noiseImage('L', (101, 37))
+        for method in ditherMethods:
+            expected = ImagePreparer.ditherImage(grey, method)
+            self.assertEqual(expected.tobytes(), RasterImage.fromImage(grey, dither=method).toImage().tobytes(), method)
+
+    def test_fragments_are_views(self):
+        rasterImage = RasterImage.fromImage(noiseImage('L', (64, 25)))
+        fragments = rasterImage.fragments(10)
+        self.assertEqual([10, 10, 5], [f.shape[0] for f in fragments])
+        for fragment in fragments:
+            self.assertIs(rasterImage.rows, fragment.base)
+
+    def test_tall_image(self):
+        # escpos dithers each fragment separately and we dither the whole image, so the dots differ, but the tone should match
+        image = Image.linear_gradient('L').resize((576, 496))
+        escposPrinter = Dummy(profile=LMP201())
+        escposPrinter.image(image, fragment_height=200)
+        printer = Dummy(profile=LMP201())
+        RasterImage.fromImage(image).print(printer, fragmentHeight=200, compact=False)
+
+        self.assertEqual(len(escposPrinter.output), len(printer.output))
+        expectedTone = rasterDots(escposPrinter.output, 576).reshape(62, 8, 72, 8).mean(axis=(1, 3))
+        tone = rasterDots(printer.output, 576).reshape(62, 8, 72, 8).mean(axis=(1, 3))
+        self.assertLess(abs(expectedTone - tone).mean(), 0.02)
+        self.assertLess(abs(expectedTone - tone).max(), 0.15)
+
+    def test_too_wide(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'wide.png')
+            noiseImage('L', (600, 10)).save(path)
+            with self.assertRaises(ImageWidthError):
+                printImage(Dummy(profile=LMP201()), path)
+
+
+def sparseImage():
+    """a white receipt with a small drawing off center, a gap, and a full width bar"""
+    image = Image.new('L', (576, 700), 255)
+    image.paste(noiseImage('L', (100, 80)), (50, 20))
+    image.paste(noiseImage('L', (200, 40), seed=1), (200, 400))
+    image.paste(0, (0, 600, 576, 610))
+    return image
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestCompactRaster(unittest.TestCase):
+    def printBoth(self, rasterImage, fragmentHeight=960):
+        plainPrinter = Dummy(profile=LMP201())
+        plainStats = rasterImage.print(plainPrinter, fragmentHeight=fragmentHeight, compact=False)
+        printer = Dummy(profile=LMP201())
+        stats = rasterImage.print(printer, fragmentHeight=fragmentHeight)
+        self.assertEqual(len(plainPrinter.output), plainStats['bytes'])
+        self.assertEqual(len(printer.output), stats['bytes'])
+        self.assertEqual(plainStats['bytes'], stats['rasterBytes'])
+        return plainPrinter.output, printer.output
+
+    def assertSameReceipt(self, expected, output):
+        self.assertEqual(renderReceipt(expected).tobytes(), renderReceipt(output).tobytes())
+
+    def test_pixel_identical(self):
+        for fragmentHeight in [960, 100, 7]:
+            expected, output = self.printBoth(RasterImage.fromImage(sparseImage(), dither='threshold'), fragmentHeight)
+            self.assertSameReceipt(expected, output)
+            self.assertLess(len(output), len(expected) / 4, fragmentHeight)
+
+    def test_narrow_image(self):
+        # images that aren't as wide as the paper keep their columns, since their position depends on the alignment
+        image = Image.new('L', (300, 100), 255)
+        image.paste(0, (100, 50, 120, 60))
+        rasterImage = RasterImage.fromImage(image)
+        expected, output = self.printBoth(rasterImage)
+        self.assertSameReceipt(expected, output)
+        self.assertNotIn(b'\x1ba', output)
+        self.assertIn(bytes([0x1d, ord('v'), ord('0'), 0, rasterImage.widthBytes, 0, 10, 0]), output)
+
+    def test_feeds(self):
+        self.assertEqual(b'', feedCommands(0))
+        self.assertEqual(b'\x1bJ\xff\x1bJ\x01', feedCommands(256))
+
+        # a blank image is only a feed
+        expected, output = self.printBoth(RasterImage.fromImage(Image.new('L', (576, 300), 255)))
+        self.assertEqual(feedCommands(300), output)
+        self.assertSameReceipt(expected, output)
+
+        # short gaps are cheaper to print than to feed
+        image = Image.new('L', (16, 5), 0)
+        image.paste(255, (0, 2, 16, 3))
+        expected, output = self.printBoth(RasterImage.fromImage(image))
+        self.assertEqual(expected, output)
+
+    def test_centered(self):
+        image = Image.new('L', (576, 10), 255)
+        image.paste(0, (200, 0, 376, 10))
+        expected, output = self.printBoth(RasterImage.fromImage(image))
+        self.assertSameReceipt(expected, output)
+        # 200 dots is 25 blank bytes on each side
+        self.assertEqual(b'\x1ba\x01' + bytes([0x1d, ord('v'), ord('0'), 0, 22, 0, 10, 0]), output[:11])
+
+    def test_print_image(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sparse.png')
+            sparseImage().save(path)
+            plainPrinter = Dummy(profile=LMP201())
+            printImage(plainPrinter, path, compact=False, center=True)
+            printer = Dummy(profile=LMP201())
+            stats = printImage(printer, path, center=True)
+
+        self.assertSameReceipt(plainPrinter.output, printer.output)
+        self.assertEqual(len(plainPrinter.output), stats['rasterBytes'])
+        self.assertEqual(len(printer.output), stats['bytes'])
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestRasterStrips(unittest.TestCase):
+    def test_matches_whole(self):
+        image = Image.linear_gradient('L').resize((150, 90))
+        image.paste(noiseImage('L', (100, 40)), (20, 30))
+        for mode in ['L', 'RGBA', 'P', '1']:
+            for method in ditherMethods:
+                whole = RasterImage.fromImage(image.convert(mode), dither=method, width=160)
+                with mock.patch.object(StripDitherer, 'blockRows', 8):
+                    strips = list(rasterStrips(image.convert(mode), dither=method, width=160, stripHeight=25))
+                self.assertEqual([25, 25, 25, 15], [strip.height for strip in strips])
+                self.assertEqual(whole.rows.tobytes(), numpy.concatenate([strip.rows for strip in strips]).tobytes(), (mode, method))
+
+    def printTall(self, path, stripAboveRows, **options):
+        printer = Dummy(profile=LMP201())
+        with mock.patch.object(RasterImage, 'stripAboveRows', stripAboveRows):
+            stats = printImage(printer, path, fragment_height=100, **options)
+        self.assertEqual(len(printer.output), stats['bytes'])
+        return printer.output
+
+    def test_print_image(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tall.png')
+            image = sparseImage()
+            image.paste(Image.linear_gradient('L').resize((300, 300)), (100, 150))
+            image.save(path)
+            for method in ditherMethods:
+                self.assertEqual(self.printTall(path, None, dither=method, compact=False), self.printTall(path, 200, dither=method, compact=False), method)
+            # blank runs across strips are split into a feed per strip, so compact commands can differ, but not the dots
+            self.assertEqual(renderReceipt(self.printTall(path, None)).tobytes(), renderReceipt(self.printTall(path, 200)).tobytes())
+
+    def test_print_prepared(self):
+        image = noiseImage('1', (576, 250))
+        expected = Dummy(profile=LMP201())
+        printRaster(expected, image, fragmentHeight=100, compact=False)
+        printer = Dummy(profile=LMP201())
+        with mock.patch.object(RasterImage, 'stripAboveRows', 100):
+            stats = printRaster(printer, image, fragmentHeight=100, compact=False)
+        self.assertEqual(expected.output, printer.output)
+        self.assertEqual(len(printer.output), stats['bytes'])
+
+    def test_sent_before_converted(self):
+        class Printer(Dummy):
+            def _raw(self, data):
+                dithered.append(ditherer.top)
+                super()._raw(data)
+
+        dithered = []
+        ditherer = None
+        originalInit = StripDitherer.__init__
+
+        def init(self, *args, **kwargs):
+            nonlocal ditherer
+            originalInit(self, *args, **kwargs)
+            ditherer = self
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tall.png')
+            noiseImage('L', (576, 500)).save(path)
+            with mock.patch.object(StripDitherer, '__init__', init), mock.patch.object(RasterImage, 'stripAboveRows', 200):
+                printImage(Printer(profile=LMP201()), path, fragment_height=100)
+        # the first fragment is sent after only the first strip has been dithered
+        self.assertEqual(100, dithered[0])
+        self.assertEqual(500, dithered[-1])
+
+    def test_memory(self):
+        # PIL's memory isn't traced, so this is the memory used by dithering and packing, which depends on the strip height and not on the image height
+        for method in ditherMethods:
+            peaks = []
+            for height in [500, 2000]:
+                image = Image.linear_gradient('L').resize((576, height))
+                tracemalloc.start()
+                try:
+                    for strip in rasterStrips(image, dither=method, stripHeight=100):
+                        pass
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+            self.assertLess(peaks[1], peaks[0] * 1.1, method)
+            # converting the whole image takes at least a byte per dot
+            self.assertLess(peaks[1], 576 * 2000, method)
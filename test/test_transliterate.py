@@ -0,0 +1,79 @@
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from zinemachine.transliterate import Transliterator
+from zinemachine.zinevalidator import ZineValidator, TransliteratedCharacterWarning, UnsupportedCharacterError, ReplaceCharacterFix
+from zinemachine.markup import Parser, MarkupText, StrToken
+from zinemachine.profile import LMP201
+
+
+class TestTransliterator(unittest.TestCase):
+    def setUp(self):
+        self.transliterator = Transliterator(set())
+
+    def test_printable(self):
+        text = 'hello world\n\tthis is a zine\n'
+        self.assertIs(self.transliterator.transliterate(text), text)
+
+    def test_table(self):
+        self.assertEqual('"quoted" - it\'s...', self.transliterator.transliterate('“quoted” — it’s…'))
+        self.assertEqual('office', self.transliterator.transliterate('oﬃce'))
+        self.assertEqual('nobreak', self.transliterator.transliterate('no​break'))
+
+    def test_decomposition(self):
+        self.assertEqual('cafe', self.transliterator.transliterate('café'))
+        self.assertEqual('AB', self.transliterator.transliterate('ＡＢ'))
+
+    def test_placeholder(self):
+        self.assertEqual('?', self.transliterator.transliterate('猫'))
+        self.assertIsNone(self.transliterator.replacement('猫'))
+
+    def test_printable_characters_are_kept(self):
+        transliterator = Transliterator({'é', '“', '”'})
+        self.assertEqual('“café”', transliterator.transliterate('“café”'))
+
+    def test_markup(self):
+        text = '<img src="café.png">“café”</img>'
+        self.assertEqual('<img src="café.png">"cafe"</img>', self.transliterator.transliterateMarkup(text))
+
+    def test_parser(self):
+        parser = Parser(transliterate=self.transliterator.transliterate)
+        parser.feed('<u>“underlined”</u>')
+        expected = [
+            MarkupText(StrToken('"underlined"', pos=(1, 3)), {'underline': 1}, pos=(1, 0))
+        ]
+        self.assertEqual(expected, parser.stack)
+
+    def test_profile(self):
+        transliterator = Transliterator.fromProfile(LMP201())
+        self.assertEqual('café “quoted”', transliterator.transliterate('café “quoted”'))
+        self.assertEqual('m?', transliterator.transliterate('ṃ猫'))
+
+
+class TestValidatorTransliteration(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.zine')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('title:ﬁsh\n---\n<img src="ﬁsh.png"></img>ﬁsh 猫\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_diagnostics(self):
+        validator = ZineValidator(validCharacters=set(ZineValidator().validCharacters) - {'ﬁ'})
+        diagnostics = validator.validateZine(self.path)
+        characters = [(type(d), d.character) for d in diagnostics if hasattr(d, 'character')]
+        self.assertIn((TransliteratedCharacterWarning, 'ﬁ'), characters)
+        self.assertIn((UnsupportedCharacterError, '猫'), characters)
+
+    def test_fix(self):
+        validator = ZineValidator(fixCharacters=True)
+        diagnostics = validator.validateZine(self.path)
+        self.assertTrue(all(isinstance(d, ReplaceCharacterFix) for d in diagnostics if hasattr(d, 'character')))
+
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual('title:fish\n---\n<img src="ﬁsh.png"></img>fish ?\n', f.read())
+        with open(self.path + '.orig', encoding='utf-8') as f:
+            self.assertIn('猫', f.read())
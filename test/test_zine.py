@@ -1,12 +1,14 @@
 from copy import deepcopy
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+import os
+import tracemalloc
 import textwrap
 import unittest
 from unittest import mock
 
 from escpos.printer import Serial
 from zinemachine.zine import Zine
-from zinemachine.markup import MarkupText, StrToken, Parser, MarkupGroup
+from zinemachine.markup import MarkupText, StrToken, Parser, MarkupGroup, plainText
 
 
 class TestZineWrapMarkup(unittest.TestCase):
@@ -111,3 +113,95 @@ class TestZinePrint(unittest.TestCase):
                                                mock.call('this is a test\ndo not be alarmed'),
                                                mock.call('\n\nthank you, goodbye\n\n'),
                                                ])
+
+
+class RecordingPrinter(object):
+    """records every character printed with the styles it was printed with"""
+    def __init__(self):
+        self.styles = {}
+        self.printed = []
+
+    def set(self, **styles):
+        self.styles = styles
+
+    def text(self, txt):
+        self.printed += [(c, self.styles) for c in txt]
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class TestZineStreaming(unittest.TestCase):
+    def printBoth(self, path, **kwargs):
+        whole = RecordingPrinter()
+        Zine(path, 'test', streaming=False, **kwargs).printZine(whole)
+        streamed = RecordingPrinter()
+        Zine(path, 'test', streaming=True, **kwargs).printZine(streamed)
+        return whole.printed, streamed.printed
+
+    @mock.patch.object(Zine, 'streamWindowKb', 0.05)
+    def test_formatted(self):
+        # tags and wrapped lines cross the 50 character windows
+        whole, streamed = self.printBoth(os.path.join('test-zines', '.test', 'formatted.zine'))
+        self.assertEqual(whole, streamed)
+
+    @mock.patch.object(Zine, 'streamWindowKb', 0.2)
+    def test_long(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'long.zine')
+            with open(path, 'w') as f:
+                f.write('-----\nTitle: long\n-----\n')
+                for i in range(200):
+                    f.write(f"Paragraph {i} is <b>long enough to wrap onto another line, and has a bold\nline break</b> in it.\n\n")
+
+            whole, streamed = self.printBoth(path, maxFileSizeKb=None)
+            self.assertEqual(whole, streamed)
+            self.assertIn('Paragraph 199', ''.join(c for c, _ in streamed))
+
+            with self.assertLogs('zinemachine.zine', 'WARNING'):
+                whole, streamed = self.printBoth(path, maxFileSizeKb=2)
+            self.assertEqual(whole, streamed)
+
+    def test_windows(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'long.zine')
+            with open(path, 'w') as f:
+                f.write('<u>' + 'underlined text\n' * 1000 + '</u>')
+
+            windows = list(Zine(path, 'test').markupWindows(windowKb=1))
+            self.assertGreater(len(windows), 10)
+            # the text of the open tag is printed as it is read, not when the tag is closed
+            for window in windows:
+                self.assertLess(len(plainText(window)), 1100)
+                self.assertEqual({'underline': 1}, window.children[0].styles)
+
+    def test_memory(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'long.zine')
+            with open(path, 'w') as f:
+                for i in range(5000):
+                    f.write(f"Line {i} of a zine <b>too long</b> to keep in memory.\n")
+
+            zine = Zine(path, 'test', maxFileSizeKb=None)
+            tracemalloc.start()
+            try:
+                characters = sum(len(plainText(window)) for window in zine.markupWindows(windowKb=4))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            self.assertGreater(characters, 200000)
+            self.assertLess(peak, 200000)
+
+    def test_markup_error(self):
+        # the beginning of a streamed zine may already be printed, so errors are logged instead of raised
+        with self.assertLogs('zinemachine.zine', 'ERROR'):
+            list(Zine(os.path.join('test-zines', '.test', 'invalid.zine'), 'test').markupWindows())
+
+    def test_auto(self):
+        path = os.path.join('test-zines', '.test', 'lorem-ipsum-2500.zine')
+        with mock.patch.object(Zine, 'streamAboveKb', 1):
+            self.assertTrue(Zine(path, 'test').isStreamed())
+        with mock.patch.object(Zine, 'streamAboveKb', None):
+            self.assertFalse(Zine(path, 'test').isStreamed())
+        self.assertFalse(Zine(path, 'test').isStreamed())
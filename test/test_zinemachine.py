@@ -12,3 +12,31 @@
 
 #     def test_printZineMarkup(self):
 #         self.zinemachine.printZineMarkup(self.zinemachine.categories['test']['test/test1.zine'])
+
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from zinemachine.zinemachine import findZines, categoryOf
+
+
+class TestFindZines(unittest.TestCase):
+    def test_find(self):
+        with TemporaryDirectory() as directory:
+            for name in ['a/1.zine', 'a/2.txt', 'a/image.png', 'a/.hidden.zine', 'a/.drafts/3.zine', 'a/b/4.zine', 'c/5.zine']:
+                path = os.path.join(directory, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write('zine')
+
+            def relative(paths):
+                return [os.path.relpath(path, directory) for path in paths]
+
+            self.assertEqual(['a/1.zine', 'a/2.txt', 'a/b/4.zine'], relative(findZines([os.path.join(directory, 'a')])))
+            # in the order given, without duplicates
+            self.assertEqual(['c/5.zine', 'a/1.zine', 'a/b/4.zine'], relative(findZines([os.path.join(directory, 'c', '5.zine'), os.path.join(directory, '**', '*.zine')])))
+            self.assertEqual([], findZines([os.path.join(directory, '*.md')]))
+
+    def test_category(self):
+        self.assertEqual('diy', categoryOf(os.path.join('zines', 'diy', 'solder.zine')))
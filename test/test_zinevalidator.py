@@ -0,0 +1,111 @@
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from PIL import Image
+
+from escpos.printer import Dummy
+from zinemachine.zinevalidator import ZineValidator, UnsupportedCharacterError, TransliteratedCharacterWarning, InvalidImageError, ResizeImageFix, InvalidHeaderError, HeaderWarning
+from zinemachine.zinemachine import getPrintableCharacters
+from zinemachine.profile import LMP201
+
+
+class TestValidateCharacters(unittest.TestCase):
+    def setUp(self):
+        self.validator = ZineValidator()
+
+    def test_profile_characters(self):
+        self.assertEqual(getPrintableCharacters(Dummy(profile=LMP201())), set(self.validator.validCharacters))
+        self.assertIn('é', self.validator.validCharacters)
+        self.assertNotIn('猫', self.validator.validCharacters)
+
+    def test_shared_between_validators(self):
+        self.assertIs(self.validator.transliterator, ZineValidator(profile=LMP201()).transliterator)
+
+    def test_printable(self):
+        self.assertEqual([], self.validator.validateCharacters('title:café\n-----\nhello world\n'))
+
+    def test_positions(self):
+        text = 'hello\n猫 and ṃ\nend'
+        diagnostics = self.validator.validateCharacters(text)
+        self.assertEqual(2, len(diagnostics))
+
+        self.assertIsInstance(diagnostics[0], UnsupportedCharacterError)
+        self.assertEqual((2, 1), diagnostics[0].pos)
+        self.assertEqual('猫 and ṃ\n', diagnostics[0].text)
+
+        self.assertIsInstance(diagnostics[1], TransliteratedCharacterWarning)
+        self.assertEqual((2, 7), diagnostics[1].pos)
+        self.assertEqual('m', diagnostics[1].replacement)
+
+    def test_last_line(self):
+        diagnostics = self.validator.validateCharacters('hello\nend 猫')
+        self.assertEqual((2, 5), diagnostics[0].pos)
+        self.assertEqual('end 猫', diagnostics[0].text)
+
+
+class TestValidateZine(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        Image.new('1', (800, 100)).save(os.path.join(self.dir.name, 'wide.png'))
+        Image.new('1', (100, 100)).save(os.path.join(self.dir.name, 'narrow.png'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def writeZine(self, text):
+        path = os.path.join(self.dir.name, 'test.zine')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_valid(self):
+        path = self.writeZine('-----\ntitle:test\n-----\nhello\n<img src="narrow.png"></img>\n')
+        self.assertEqual([], ZineValidator().validateZine(path))
+
+    def test_header(self):
+        path = self.writeZine('-----\ntitle\nauthor:me\n-----\nhello\n')
+        diagnostics = ZineValidator().validateZine(path)
+        self.assertEqual([InvalidHeaderError, HeaderWarning], [type(d) for d in diagnostics])
+        self.assertEqual((2, 1), diagnostics[0].pos)
+
+    def test_markup_error_position(self):
+        path = self.writeZine('-----\ntitle:test\n-----\nhello\n<img></img>\n')
+        diagnostics = ZineValidator().validateZine(path)
+        self.assertEqual(1, len(diagnostics))
+        self.assertEqual(5, diagnostics[0].pos[0])
+        self.assertEqual('<img></img>\n', diagnostics[0].text)
+
+    def test_image_too_wide(self):
+        path = self.writeZine('-----\ntitle:test\n-----\n<img src="wide.png"></img>\n')
+        diagnostics = ZineValidator().validateZine(path)
+        self.assertEqual([InvalidImageError], [type(d) for d in diagnostics])
+        self.assertIn('800px', diagnostics[0].message)
+
+    def test_image_missing(self):
+        path = self.writeZine('-----\ntitle:test\n-----\n<img src="missing.png"></img>\n')
+        diagnostics = ZineValidator().validateZine(path)
+        self.assertEqual([InvalidImageError], [type(d) for d in diagnostics])
+
+    def test_resize(self):
+        path = self.writeZine('-----\ntitle:test\n-----\n<img src="wide.png"></img>\n')
+        diagnostics = ZineValidator(resizeImages=True, maxImageWidth=400).validateZine(path)
+        self.assertEqual([ResizeImageFix], [type(d) for d in diagnostics])
+
+        with Image.open(os.path.join(self.dir.name, 'wide.png')) as image:
+            self.assertEqual((400, 50), image.size)
+        with Image.open(os.path.join(self.dir.name, 'wide.png.orig')) as image:
+            self.assertEqual((800, 100), image.size)
+
+    def test_fix_characters(self):
+        original = '-----\ntitle:test\n-----\nhṃm\n'
+        path = self.writeZine(original)
+        ZineValidator(fixCharacters=True).validateZine(path)
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual('-----\ntitle:test\n-----\nhmm\n', f.read())
+
+        # the zine is edited and fixed again. the backup is still the original
+        self.writeZine('-----\ntitle:test\n-----\nhmm ṃ\n')
+        ZineValidator(fixCharacters=True).validateZine(path)
+        with open(path + '.orig', encoding='utf-8') as f:
+            self.assertEqual(original, f.read())